@@ -119,16 +119,72 @@ STATICFILES_DIRS = [
 MEDIA_ROOT = env.str("DJANGO_MEDIA_ROOT", default="media/")
 
 RQ_ENABLED = env.bool("RQ_ENABLED", default=True)
+RQ_CONNECTION = {
+    "HOST": env.str("REDIS_HOST", default="localhost"),
+    "PORT": env.int("REDIS_PORT", default=6379),
+    "DB": env.int("REDIS_DB", default=0),
+    "PASSWORD": env.str("REDIS_PASSWORD", default=""),
+}
 RQ_QUEUES = {
-    "default": {
-        "HOST": env.str("REDIS_HOST", default="localhost"),
-        "PORT": env.int("REDIS_PORT", default=6379),
-        "DB": env.int("REDIS_DB", default=0),
-        "PASSWORD": env.str("REDIS_PASSWORD", default=""),
-        "DEFAULT_TIMEOUT": 360,
-    }
+    "default": {**RQ_CONNECTION, "DEFAULT_TIMEOUT": 360},
+    # article enrichment runs on its own pool of workers, see `rqworker enrichment`
+    "enrichment": {
+        **RQ_CONNECTION,
+        "DEFAULT_TIMEOUT": env.int("ENRICHMENT_TIMEOUT", default=60),
+    },
 }
 
+# pooled outbound requests, see feedzero.ingest.http, timeouts in seconds
+HTTP_CONNECT_TIMEOUT = env.float("HTTP_CONNECT_TIMEOUT", default=5)
+HTTP_READ_TIMEOUT = env.float("HTTP_READ_TIMEOUT", default=30)
+HTTP_RETRIES = env.int("HTTP_RETRIES", default=2)
+HTTP_RETRY_BACKOFF = env.float("HTTP_RETRY_BACKOFF", default=0.5)
+# connections kept open to each host, and the number of hosts kept per worker
+HTTP_POOL_SIZE = env.int("HTTP_POOL_SIZE", default=4)
+HTTP_MAX_SESSIONS = env.int("HTTP_MAX_SESSIONS", default=100)
+
+# requests a second each host gets across every worker, see feedzero.ingest.throttle
+INGEST_THROTTLE_RATE = env.float("INGEST_THROTTLE_RATE", default=1)
+INGEST_THROTTLE_BURST = env.int("INGEST_THROTTLE_BURST", default=5)
+# seconds to back off from a host which throttled us without saying for how long
+INGEST_THROTTLE_BACKOFF = env.int("INGEST_THROTTLE_BACKOFF", default=60)
+
+# concurrent feed fetching, see feedzero.ingest.fetcher
+INGEST_FETCH_BATCH_SIZE = env.int("INGEST_FETCH_BATCH_SIZE", default=200)
+INGEST_FETCH_CONCURRENCY = env.int("INGEST_FETCH_CONCURRENCY", default=100)
+INGEST_FETCH_PER_HOST = env.int("INGEST_FETCH_PER_HOST", default=4)
+INGEST_FETCH_TIMEOUT = env.int("INGEST_FETCH_TIMEOUT", default=30)
+# feed bodies beyond this many bytes are abandoned mid download
+INGEST_FETCH_MAX_BYTES = env.int("INGEST_FETCH_MAX_BYTES", default=5 * 1024 * 1024)
+# characters of a response body kept on ingest logs and error reports
+INGEST_LOG_MAX_BODY = env.int("INGEST_LOG_MAX_BODY", default=64 * 1024)
+# days ingest logs are kept, see the rollup_ingest_metrics command
+INGEST_LOG_RETENTION = env.int("INGEST_LOG_RETENTION", default=30)
+# days hourly ingest metrics are kept before being rolled up into days, and days those
+# are kept for
+INGEST_METRICS_HOURLY_RETENTION = env.int("INGEST_METRICS_HOURLY_RETENTION", default=7)
+INGEST_METRICS_RETENTION = env.int("INGEST_METRICS_RETENTION", default=90)
+# write new entries for a feed with bulk inserts rather than saving each in turn
+INGEST_BULK_CREATE = env.bool("INGEST_BULK_CREATE", default=True)
+# processes a batch of feed bodies is parsed in, see feedzero.ingest.pipeline, 0 parses
+# them in the worker itself. Each worker starts its own, so keep workers x this <= cores
+INGEST_PARSE_PROCESSES = env.int("INGEST_PARSE_PROCESSES", default=2)
+# adaptive scrape scheduling, see feedzero.ingest.scheduling, intervals in minutes
+INGEST_SCHEDULE_DEFAULT_INTERVAL = env.int(
+    "INGEST_SCHEDULE_DEFAULT_INTERVAL", default=60
+)
+INGEST_SCHEDULE_MIN_INTERVAL = env.int("INGEST_SCHEDULE_MIN_INTERVAL", default=15)
+INGEST_SCHEDULE_MAX_INTERVAL = env.int("INGEST_SCHEDULE_MAX_INTERVAL", default=24 * 60)
+INGEST_SCHEDULE_DEAD_INTERVAL = env.int(
+    "INGEST_SCHEDULE_DEAD_INTERVAL", default=7 * 24 * 60
+)
+# number of recent publish dates the cadence of a feed is estimated from
+INGEST_SCHEDULE_SAMPLE_SIZE = env.int("INGEST_SCHEDULE_SAMPLE_SIZE", default=10)
+
+# whether rules are evaluated by the database, "sql", or by the worker, "python"
+RULES_EXECUTION_MODE = env.str("RULES_EXECUTION_MODE", default="sql")
+# seconds a user's cached rules are kept, rule changes also invalidate them
+RULES_SNAPSHOT_TIMEOUT = env.int("RULES_SNAPSHOT_TIMEOUT", default=300)
 
 POCKET_CONSUMER_KEY = env.str("POCKET_CONSUMER_KEY", default="")
 
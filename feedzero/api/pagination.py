@@ -0,0 +1,93 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class EntryKeysetPagination(BasePagination):
+    """Paginate entries by seeking past the last (date_published, id) served.
+
+    Page number pagination needs an OFFSET and a COUNT, both of which get slower the
+    deeper a user reads into their inbox. Seeking from a cursor costs the same on
+    every page, at the expense of only offering a link to the next one.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    page_size = api_settings.PAGE_SIZE
+    ordering = ("-date_published", "-pk")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(*position))
+
+        # fetch an extra entry to find out whether there's a page after this one
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_seek_filter(self, date_published, pk):
+        """Filter to the entries ordered after the given position.
+
+        Postgres orders nulls first when descending, so entries without a publish
+        date come before any that have one.
+        """
+        if date_published is None:
+            return Q(date_published__isnull=False) | Q(
+                date_published__isnull=True, pk__lt=pk
+            )
+        return Q(date_published__lt=date_published) | Q(
+            date_published=date_published, pk__lt=pk
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict([("next", self.get_next_link()), ("results", data)])
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(last.date_published, last.pk)
+
+    def encode_cursor(self, date_published, pk) -> str:
+        """Build the link to the page following the given position."""
+        position = {"i": pk}
+        if date_published is not None:
+            position["p"] = date_published.isoformat()
+        querystring = parse.urlencode(position)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """Return the (date_published, id) position in the request, if there is one."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            position = parse.parse_qs(querystring, keep_blank_values=True)
+            pk = int(position["i"][0])
+            date_published = None
+            if "p" in position:
+                date_published = parse_datetime(position["p"][0])
+                if date_published is None:
+                    raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return (date_published, pk)
@@ -1,27 +1,68 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from typing import List
 
-from feedzero.feeds.models import EnrichedContent, Entry, EntryState, Feed
+from rest_framework.serializers import (
+    ListSerializer,
+    ModelSerializer,
+    SerializerMethodField,
+)
+
+from feedzero.feeds.models import EnrichedContent, Entry, EntryState, Feed, UnreadCount
 
 
 class FeedSerializer(ModelSerializer):
     unread = SerializerMethodField()
 
     def get_unread(self, obj):
-        """If appropriate, return the amount of unread entries for the feed."""
+        """If appropriate, return the amount of unread entries for the feed.
+
+        Counts are only maintained for watched feeds, so no count means not watched.
+        Views and list serializers may annotate the count on to the feed to avoid a
+        query per feed.
+        """
         if "request" not in self.context:
             return None
 
-        user = self.context["request"].user
-        if not obj.is_watched_by(user):
-            return None
+        if hasattr(obj, "unread_count"):
+            return obj.unread_count
 
-        return Entry.user_state.unread(user).filter(feed=obj).count()
+        user = self.context["request"].user
+        return (
+            UnreadCount.objects.filter(user=user, feed=obj)
+            .values_list("count", flat=True)
+            .first()
+        )
 
     class Meta:
         model = Feed
         fields = ["id", "title", "slug", "link", "date_last_scraped", "unread"]
 
 
+def annotate_unread_counts(feeds: List[Feed], user):
+    """Set the user's unread count on each feed in a single query.
+
+    Feeds the user doesn't watch have no count, and are annotated with None.
+    """
+    counts = dict(
+        UnreadCount.objects.filter(
+            user=user, feed__in={feed.pk for feed in feeds}
+        ).values_list("feed_id", "count")
+    )
+    for feed in feeds:
+        feed.unread_count = counts.get(feed.pk)
+
+
+class EntryListSerializer(ListSerializer):
+    """Resolve feed data once for a list of entries, rather than once per entry."""
+
+    def to_representation(self, data):
+        entries = list(data.all() if hasattr(data, "all") else data)
+        if "request" in self.context:
+            annotate_unread_counts(
+                [entry.feed for entry in entries], self.context["request"].user
+            )
+        return super().to_representation(entries)
+
+
 class EnrichedContentSerializer(ModelSerializer):
     class Meta:
         model = EnrichedContent
@@ -46,6 +87,7 @@ class EntrySerializer(ModelSerializer):
             "slug",
             "enriched",
         ]
+        list_serializer_class = EntryListSerializer
 
 
 class EntryStateSerializer(ModelSerializer):
@@ -62,15 +104,17 @@ class EntryWithStateSerializer(EntrySerializer):
         if "request" not in self.context:
             return []
 
-        user = self.context["request"].user
-        return [
-            EntryStateSerializer(state).data
-            for state in EntryState.objects.filter(user=user, entry=obj)
-        ]
+        if hasattr(obj, "user_states"):
+            states = obj.user_states
+        else:
+            user = self.context["request"].user
+            states = EntryState.objects.filter(user=user, entry=obj)
+        return [EntryStateSerializer(state).data for state in states]
 
     class Meta:
         fields = EntrySerializer.Meta.fields + ["states"]
         model = EntrySerializer.Meta.model
+        list_serializer_class = EntryListSerializer
 
 
 class EntryDetailSerializer(EntrySerializer):
@@ -1,7 +1,11 @@
+from datetime import timedelta
+
 from django.urls import reverse
+from django.utils import timezone
+from model_mommy import mommy
 import pytest
 
-from feedzero.feeds.models import EntryState
+from feedzero.feeds.models import EntryState, UnreadCount
 
 
 @pytest.mark.django_db
@@ -30,7 +34,7 @@ class TestEntryListView:
         for entry in entries[:3]:
             entry.mark_deleted(auth_api_client.user)
         response = auth_api_client.get(self.url)
-        assert response.json()["count"] == 2
+        assert len(response.json()["results"]) == 2
 
     def test_omits_state(self, auth_api_client, entry_factory, watched_feed):
         """Should not include any state information in this payload."""
@@ -57,13 +61,102 @@ class TestEntryListView:
         response = auth_api_client.get(url)
 
         data = response.json()
-        assert data["count"] == 2
+        assert len(data["results"]) == 2
 
         guids = [entry["guid"] for entry in data["results"]]
         assert want_entry_1.guid in guids
         assert want_entry_2.guid in guids
         assert omit_entry.guid not in guids
 
+    @pytest.fixture
+    def paged_entries(self, auth_api_client, entry_factory, feed):
+        """Enough entries for two pages, including shared and missing publish dates."""
+        auth_api_client.user.watch(feed)
+        published = timezone.now()
+        entries = [entry_factory(feed=feed, date_published=published) for _ in range(6)]
+        entries += [entry_factory(feed=feed, date_published=None) for _ in range(4)]
+        entries += [
+            entry_factory(feed=feed, date_published=published - timedelta(days=i))
+            for i in range(1, 6)
+        ]
+        return entries
+
+    def test_paginates_by_cursor(self, auth_api_client, paged_entries):
+        """Should serve every entry exactly once across pages, newest first."""
+        ids = []
+        url = self.url
+        while url:
+            data = auth_api_client.get(url).json()
+            ids += [entry["id"] for entry in data["results"]]
+            url = data["next"]
+
+        expected = sorted(
+            paged_entries,
+            key=lambda entry: (
+                entry.date_published is None,
+                entry.date_published or timezone.now(),
+                entry.pk,
+            ),
+            reverse=True,
+        )
+        assert ids == [entry.pk for entry in expected]
+
+    def test_omits_count(self, auth_api_client, paged_entries):
+        """Should not count the unread entries to paginate."""
+        data = auth_api_client.get(self.url).json()
+        assert "count" not in data
+        assert data["next"] is not None
+
+    def test_last_page_has_no_next(self, auth_api_client, entry_factory, watched_feed):
+        """Should not link to a next page when there are no more entries."""
+        (feed, user) = watched_feed
+        entry_factory(feed=feed)
+        assert auth_api_client.get(self.url).json()["next"] is None
+
+    def test_invalid_cursor_raises_404(self, auth_api_client):
+        """Should respond 404 if the cursor cannot be decoded."""
+        response = auth_api_client.get(f"{self.url}?cursor=notacursor")
+        assert response.status_code == 404
+
+    def test_deep_page_does_not_count_or_offset(
+        self, auth_api_client, paged_entries, django_assert_max_num_queries
+    ):
+        """Should seek to a later page rather than counting and offsetting into it."""
+        next_url = auth_api_client.get(self.url).json()["next"]
+        with django_assert_max_num_queries(100) as context:
+            auth_api_client.get(next_url)
+        for query in context.captured_queries:
+            assert "COUNT(" not in query["sql"]
+            assert "OFFSET" not in query["sql"]
+
+    @pytest.fixture
+    def full_page(
+        self, auth_api_client, entry_factory, feed_factory, enriched_content_factory
+    ):
+        """A page of entries spread over several feeds, some with enriched content."""
+        user = auth_api_client.user
+        feeds = [feed_factory() for _ in range(4)]
+        [user.watch(feed) for feed in feeds]
+        entries = [entry_factory(feed=feeds[i % 4]) for i in range(12)]
+        for entry in entries[:6]:
+            enriched_content_factory(entry=entry)
+        return entries
+
+    def test_page_constant_queries(
+        self, auth_api_client, full_page, django_assert_num_queries
+    ):
+        """Should not query per entry or per feed to serialize a page."""
+        # the request savepoint and its release, the page and the unread counts
+        with django_assert_num_queries(4):
+            response = auth_api_client.get(self.url)
+        assert len(response.json()["results"]) == 12
+
+    def test_includes_feed_unread_count(self, auth_api_client, full_page):
+        """Should include the unread count of each entry's feed."""
+        data = auth_api_client.get(self.url).json()
+        for entry in data["results"]:
+            assert entry["feed"]["unread"] == 3
+
 
 @pytest.mark.django_db
 class TestPinnedEntryListView:
@@ -93,6 +186,30 @@ class TestPinnedEntryListView:
         response = auth_api_client.get(self.url)
         assert response.json()["count"] == 3
 
+    def test_includes_user_states(self, auth_api_client, entry_factory, watched_feed):
+        """Should include the request user's states for each entry."""
+        (feed, user) = watched_feed
+        entry = entry_factory(feed=feed)
+        entry.mark_pinned(user)
+        entry.mark_pinned(mommy.make("users.FeedZeroUser"))
+        data = auth_api_client.get(self.url).json()
+        assert [state["state"] for state in data["results"][0]["states"]] == ["pinned"]
+
+    def test_page_constant_queries(
+        self, auth_api_client, entry_factory, feed_factory, django_assert_num_queries
+    ):
+        """Should not query per entry or per feed to serialize a page."""
+        user = auth_api_client.user
+        feeds = [feed_factory() for _ in range(4)]
+        [user.watch(feed) for feed in feeds]
+        entries = [entry_factory(feed=feeds[i % 4]) for i in range(12)]
+        [entry.mark_pinned(user) for entry in entries]
+        # the request savepoint and its release, the page count, the page, the
+        # user's states and the unread counts
+        with django_assert_num_queries(6):
+            response = auth_api_client.get(self.url)
+        assert len(response.json()["results"]) == 12
+
 
 @pytest.mark.django_db
 class TestFeedListView:
@@ -109,6 +226,25 @@ class TestFeedListView:
         response = auth_api_client.get(self.url)
         assert response.status_code == 200
 
+    def test_unread_count(self, auth_api_client, entry_factory, feed, watched_feed):
+        """Should include the unread count for watched feeds only."""
+        (watched, user) = watched_feed
+        entries = [entry_factory(feed=watched) for _ in range(3)]
+        entries[0].mark_read_by(user)
+        entry_factory(feed=feed)
+        data = auth_api_client.get(self.url).json()
+        unread = {result["id"]: result["unread"] for result in data["results"]}
+        assert unread == {watched.pk: 2, feed.pk: None}
+
+    def test_unread_count_constant_queries(
+        self, auth_api_client, feed_factory, django_assert_num_queries
+    ):
+        """Should not query per feed for unread counts."""
+        [feed_factory(watched_by=auth_api_client.user) for _ in range(10)]
+        # the request savepoint and its release, the page count and the page itself
+        with django_assert_num_queries(4):
+            auth_api_client.get(self.url)
+
     def test_filter_only_watched_feeds(self, auth_api_client, feed, watched_feed):
         """Should only return watched feeds if passed only=user as a GET param."""
         url = f"{self.url}?only_watched=true"
@@ -202,3 +338,111 @@ class TestEntryStateCreationView:
                 state=action["state"],
                 user=auth_api_client.user,
             ).exists()
+
+    def test_invalid_entry_id_raises_400(self, auth_api_client):
+        """An entry_id which isn't an integer should raise a 400 error."""
+        response = auth_api_client.post(
+            self.url,
+            {"actions": [{"state": "pinned", "entry_id": "abc"}]},
+            format="json",
+        )
+        assert response.status_code == 400
+
+    def test_missing_entry_applies_nothing(self, auth_api_client, entry):
+        """Without partial mode, one missing entry should reject every action."""
+        actions = [
+            {"state": EntryState.STATE_PINNED, "entry_id": entry.id},
+            {"state": EntryState.STATE_PINNED, "entry_id": -1},
+        ]
+        response = auth_api_client.post(self.url, {"actions": actions}, format="json")
+        assert response.status_code == 404
+        assert not EntryState.objects.filter(entry=entry).exists()
+
+    def test_partial_applies_valid_actions(self, auth_api_client, entry):
+        """In partial mode, valid actions should be applied despite invalid ones."""
+        actions = [
+            {"state": EntryState.STATE_PINNED, "entry_id": -1},
+            {"state": "notastate", "entry_id": entry.id},
+            {"state": EntryState.STATE_PINNED, "entry_id": entry.id},
+        ]
+        response = auth_api_client.post(
+            self.url, {"actions": actions, "partial": True}, format="json"
+        )
+        assert response.status_code == 200
+        assert [error["index"] for error in response.json()["errors"]] == [0, 1]
+        assert EntryState.objects.filter(
+            entry=entry, state=EntryState.STATE_PINNED, user=auth_api_client.user
+        ).exists()
+
+    def test_partial_without_errors(self, auth_api_client, entry):
+        """In partial mode, a request without invalid actions reports no errors."""
+        actions = [{"state": EntryState.STATE_READ, "entry_id": entry.id}]
+        response = auth_api_client.post(
+            self.url, {"actions": actions, "partial": True}, format="json"
+        )
+        assert response.json() == {"errors": []}
+
+    def test_partial_false_string(self, auth_api_client, entry):
+        """A partial of "false", as form clients send it, should not be partial mode."""
+        actions = [{"state": EntryState.STATE_PINNED, "entry_id": -1}]
+        response = auth_api_client.post(
+            self.url, {"actions": actions, "partial": "false"}, format="json"
+        )
+        assert response.status_code == 404
+
+    def test_invalid_partial_raises_400(self, auth_api_client, entry):
+        """A partial which isn't a boolean should raise a 400 error."""
+        actions = [{"state": EntryState.STATE_READ, "entry_id": entry.id}]
+        response = auth_api_client.post(
+            self.url, {"actions": actions, "partial": "maybe"}, format="json"
+        )
+        assert response.status_code == 400
+
+    def test_delete_replaces_pin_in_same_request(self, auth_api_client, entry):
+        """Deleting and pinning an entry together should leave it only deleted."""
+        actions = [
+            {"state": EntryState.STATE_DELETED, "entry_id": entry.id},
+            {"state": EntryState.STATE_PINNED, "entry_id": entry.id},
+        ]
+        auth_api_client.post(self.url, {"actions": actions}, format="json")
+        states = EntryState.objects.filter(entry=entry, user=auth_api_client.user)
+        assert [state.state for state in states] == [EntryState.STATE_DELETED]
+
+    def test_adjusts_unread_counts(self, auth_api_client, entry_factory, watched_feed):
+        """Should decrement the unread count once for each newly stated entry."""
+        (feed, user) = watched_feed
+        entries = [entry_factory(feed=feed) for _ in range(5)]
+        entries[0].mark_read_by(user)
+        actions = [
+            {"state": EntryState.STATE_DELETED, "entry_id": entry.id}
+            for entry in entries[:3]
+        ]
+        auth_api_client.post(self.url, {"actions": actions}, format="json")
+        assert UnreadCount.objects.get(user=user, feed=feed).count == 2
+
+    def test_bulk_constant_queries(
+        self, auth_api_client, entry_factory, feed_factory, django_assert_num_queries
+    ):
+        """Marking a screenful of entries should not query per entry."""
+        user = auth_api_client.user
+        feeds = [feed_factory() for _ in range(2)]
+        [user.watch(feed) for feed in feeds]
+        entries = [entry_factory(feed=feeds[i % 2]) for i in range(50)]
+        entries[0].mark_pinned(user)
+        actions = [
+            {"state": EntryState.STATE_DELETED, "entry_id": entry.id}
+            for entry in entries
+        ]
+        # the request savepoint and its release, loading the entries, the bulk
+        # transaction's savepoint and release, finding unread entries, one count
+        # adjustment per feed, removing replaced states, then listing the entry ids
+        # and inserting their states
+        with django_assert_num_queries(11):
+            response = auth_api_client.post(
+                self.url, {"actions": actions}, format="json"
+            )
+        assert response.status_code == 200
+        assert (
+            EntryState.objects.filter(user=user, state=EntryState.STATE_DELETED).count()
+            == 50
+        )
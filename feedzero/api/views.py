@@ -1,18 +1,23 @@
-from rest_framework.exceptions import NotFound, ParseError
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.serializers import BooleanField
 from rest_framework.views import APIView
 
 from feedzero.api.filters import FeedListFilterSet
+from feedzero.api.pagination import EntryKeysetPagination
 from feedzero.api.serializers import (
     EntryDetailSerializer,
     EntrySerializer,
     EntryWithStateSerializer,
     FeedSerializer,
 )
-from feedzero.feeds.models import Entry, EntryState, Feed
-from feedzero.feeds.utils import apply_state_to_entry
+from feedzero.feeds.models import Entry, EntryState, Feed, UnreadCount
 
 
 class EntryListView(ListAPIView):
@@ -20,9 +25,12 @@ class EntryListView(ListAPIView):
 
     serializer_class = EntrySerializer
     filterset_fields = ["feed"]
+    pagination_class = EntryKeysetPagination
 
     def get_queryset(self):
-        return Entry.user_state.unread(self.request.user).order_by("-date_published")
+        return Entry.user_state.unread(self.request.user).select_related(
+            "feed", "enriched"
+        )
 
 
 class PinnedEntryListView(ListAPIView):
@@ -31,8 +39,17 @@ class PinnedEntryListView(ListAPIView):
     serializer_class = EntryWithStateSerializer
 
     def get_queryset(self):
-        return Entry.user_state.pinned(self.request.user).order_by(
-            "-states__date_created"
+        user = self.request.user
+        states = Prefetch(
+            "states",
+            queryset=EntryState.objects.filter(user=user),
+            to_attr="user_states",
+        )
+        return (
+            Entry.user_state.pinned(user)
+            .select_related("feed", "enriched")
+            .prefetch_related(states)
+            .order_by("-states__date_created")
         )
 
 
@@ -48,24 +65,40 @@ class FeedListView(ListAPIView):
 
     serializer_class = FeedSerializer
     filterset_class = FeedListFilterSet
-    queryset = Feed.objects.all()
     page_size = 30
 
+    def get_queryset(self):
+        unread_count = UnreadCount.objects.filter(
+            feed=OuterRef("pk"), user=self.request.user
+        ).values("count")
+        return Feed.objects.annotate(unread_count=Subquery(unread_count)).order_by("pk")
+
 
 class EntryStateCreationView(APIView):
-    """Manage multiple state amends simultaneously."""
+    """Manage multiple state amends simultaneously.
+
+    Actions are grouped by state and each group is applied in bulk. Groups are
+    applied in the order of bulk_states, so an entry given several states in one
+    request ends up as it would had the actions been sent in that order.
+
+    By default one invalid action rejects the whole request. If "partial" is set,
+    valid actions are applied and the invalid ones are reported in the response.
+    """
+
+    bulk_states = [
+        EntryState.STATE_READ,
+        EntryState.STATE_PINNED,
+        EntryState.STATE_SAVED,
+        EntryState.STATE_DELETED,
+    ]
 
     def __init__(self):
         super().__init__()
         self.valid_states = dict(EntryState.STATE_CHOICES).keys()
 
-    def _get_entry(self, entry_id):
-        try:
-            return Entry.objects.get(pk=entry_id)
-        except Entry.DoesNotExist:
-            raise NotFound("entry corresponding to entry_id does not exist")
-
     def validate_action(self, action: dict):
+        if not isinstance(action, dict):
+            raise ParseError("each action must be an object")
         if "state" not in action:
             raise ParseError("state is a required parameter of each action")
         if "entry_id" not in action:
@@ -74,22 +107,60 @@ class EntryStateCreationView(APIView):
         if action["state"] not in self.valid_states:
             raise ParseError(f"{action['state']} is not a valid state")
 
+        try:
+            int(action["entry_id"])
+        except (TypeError, ValueError):
+            raise ParseError(f"{action['entry_id']} is not a valid entry_id")
+
+    def validate_actions(self, actions: list, partial: bool):
+        """Return the valid actions as (index, state, entry_id), and any errors."""
+        valid = []
+        errors = []
+        for index, action in enumerate(actions):
+            try:
+                self.validate_action(action)
+            except ParseError as e:
+                if not partial:
+                    raise
+                errors.append({"index": index, "detail": e.detail})
+                continue
+            valid.append((index, action["state"], int(action["entry_id"])))
+        return valid, errors
+
     def post(self, request: Request, format=None):
         """Accept an array of state changes."""
         if "actions" not in request.data:
             raise ParseError("No actions supplied")
 
-        # TODO at some point may want this to continue even if one of them fails
-        for action in request.data["actions"]:
-            self.validate_action(action)
-
-            try:
-                entry_id = action["entry_id"]
-                entry = Entry.objects.get(pk=entry_id)
-            except Entry.DoesNotExist:
-                raise NotFound("entry corresponding to entry_id does not exist")
-
-            desired_state = action["state"]
-            apply_state_to_entry(entry, desired_state, self.request.user)
-
-        return Response(status=200)
+        try:
+            partial = BooleanField().to_internal_value(
+                request.data.get("partial", False)
+            )
+        except ValidationError:
+            raise ParseError("partial must be a boolean")
+        valid, errors = self.validate_actions(request.data["actions"], partial)
+
+        existing_ids = set(
+            Entry.objects.filter(
+                pk__in={entry_id for (_, _, entry_id) in valid}
+            ).values_list("pk", flat=True)
+        )
+        grouped = defaultdict(set)
+        for (index, state, entry_id) in valid:
+            if entry_id not in existing_ids:
+                message = "entry corresponding to entry_id does not exist"
+                if not partial:
+                    raise NotFound(message)
+                errors.append({"index": index, "detail": message})
+                continue
+            grouped[state].add(entry_id)
+
+        with transaction.atomic():
+            for state in self.bulk_states:
+                if grouped[state]:
+                    entries = Entry.objects.filter(pk__in=grouped[state])
+                    EntryState.objects.bulk_mark(entries, request.user, state)
+
+        if not partial:
+            return Response(status=200)
+        return Response({"errors": sorted(errors, key=lambda e: e["index"])})
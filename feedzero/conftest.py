@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.test import Client
+import fakeredis
 from model_mommy import mommy
 import pytest
 from rest_framework.test import APIClient
@@ -9,6 +10,20 @@ from feedzero.rules.models import FeedRule, Rule, TextMatchRule
 from feedzero.users.models import ThirdPartyTokens
 
 
+@pytest.fixture(autouse=True)
+def fake_redis(mocker):
+    """Stand in for the Redis shared by workers, e.g. to throttle requests per host.
+
+    Queues are backed by it too. Each test gets an empty server, so cached rule
+    snapshots and queued jobs don't leak between them.
+    """
+    connection = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+    mocker.patch("feedzero.ingest.throttle.get_redis", return_value=connection)
+    mocker.patch("feedzero.rules.snapshot.get_redis", return_value=connection)
+    mocker.patch("django_rq.queues.get_redis_connection", return_value=connection)
+    return connection
+
+
 @pytest.fixture
 def user():
     return mommy.make(settings.AUTH_USER_MODEL, username="BadUser")
@@ -0,0 +1,25 @@
+from django.db import models
+from django.db.models import Lookup
+
+
+class ConditionField(models.BooleanField):
+    """Output field for boolean expressions, e.g. Exists, which are filtered upon."""
+
+
+@ConditionField.register_lookup
+class Holds(Lookup):
+    """Filter on a condition itself, rather than comparing it with a boolean.
+
+    Django 2.2 filters annotations with `= true` or `= false`, which stops Postgres
+    planning an EXISTS as a semi or anti join. Unlike raw SQL, the expression is
+    still relabeled when the queryset is used as a subquery.
+    """
+
+    lookup_name = "holds"
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.lhs)
+        if self.rhs:
+            return sql, params
+        return f"NOT {sql}", params
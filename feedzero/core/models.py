@@ -1,23 +1,76 @@
+import re
+from typing import Set
+
 from django.db import models
-from slugify import UniqueSlugify
+from django.db.models import Q
+from slugify import Slugify
 
 
 class SlugifiedMixin(models.Model):
     """Adds a slug field to the subclassed model."""
 
-    slug = models.SlugField(blank=True, max_length=200)
+    SLUG_MAX_LENGTH = 200
+    # characters kept free when a long slug is shortened to fit a "-n" suffix
+    SLUG_SUFFIX_ROOM = 10
+
+    slug = models.SlugField(blank=True, max_length=SLUG_MAX_LENGTH)
 
     def save(self, *args, **kwargs):
         """Override save method to populate slug field on class."""
         # TODO change slug if title changes?
-        slug_attr = self.get_slug_attr()
-        if not self.slug and slug_attr:
-            checker = UniqueSlugify(
-                unique_check=self.slug_uniqueness_check, to_lower=True, max_length=200
-            )
-            self.slug = checker(slug_attr, uids=self.get_initial_slug_uids())
+        if not self.slug:
+            self.assign_slugs([self])
         return super().save(*args, **kwargs)
 
+    @classmethod
+    def assign_slugs(cls, instances):
+        """Populate slugs for many unsaved instances, using a single query."""
+        slugify = Slugify(to_lower=True, max_length=cls.SLUG_MAX_LENGTH)
+        pending = []
+        for instance in instances:
+            slug_attr = instance.get_slug_attr()
+            base = slugify(slug_attr) if slug_attr else ""
+            if instance.slug or not base:
+                continue
+            pending.append((instance, base))
+        if not pending:
+            return
+
+        taken = cls.get_taken_slugs({base for _, base in pending})
+        for instance, base in pending:
+            slug = base
+            count = 0
+            while slug in taken:
+                count += 1
+                suffix = f"-{count}"
+                slug = base[: cls.SLUG_MAX_LENGTH - len(suffix)].rstrip("-") + suffix
+            taken.add(slug)
+            instance.slug = slug
+
+    @classmethod
+    def get_taken_slugs(cls, bases: Set[str]) -> Set[str]:
+        """Load the existing slugs which new slugs from the bases could collide with.
+
+        Taken slugs are suffixed with a counter, so only a base or the base with a
+        "-n" suffix can collide. The prefix is matched first, served by the index on
+        slug, and the pattern then leaves out longer slugs sharing the prefix. A base
+        too long to fit a suffix is shortened to make room, so any slug starting with
+        the shortened stem may collide.
+        """
+        stem_length = cls.SLUG_MAX_LENGTH - cls.SLUG_SUFFIX_ROOM
+        candidates = Q()
+        for base in bases:
+            stem = base[:stem_length]
+            if stem == base:
+                candidates |= Q(slug__startswith=stem) & Q(
+                    slug__regex=rf"^{re.escape(base)}(-[0-9]+)?$"
+                )
+            else:
+                candidates |= Q(slug__startswith=stem)
+        return set(
+            cls._default_manager.filter(candidates).values_list("slug", flat=True)
+        )
+
     def get_slug_attr(self):
         """Get the attribute to use as the base for the slug.
 
@@ -25,14 +78,5 @@ class SlugifiedMixin(models.Model):
         """
         return self.title
 
-    def get_initial_slug_uids(self):
-        """Populate a list of unique values for the slugify function to start from."""
-        return []
-
-    @staticmethod
-    def slug_uniqueness_check(text, uids):
-        """Default uniqueness check."""
-        return text not in uids
-
     class Meta:
         abstract = True
@@ -0,0 +1,50 @@
+from collections import namedtuple
+import re
+import threading
+
+from bleach.sanitizer import Cleaner
+
+ARTICLE_TAGS = ["b", "i", "a", "img", "p", "div"]
+ARTICLE_ATTRIBUTES = {"a": ["href", "title"], "img": ["src"]}
+
+CLEANER_OPTIONS = {
+    "article": {
+        "tags": ARTICLE_TAGS,
+        "attributes": ARTICLE_ATTRIBUTES,
+        "styles": [],
+        "strip": True,
+    },
+    "text": {"tags": [], "strip": True},
+}
+
+# sanitized html is serializer output, so attribute values are always quoted
+TAG_PATTERN = re.compile(r"""<(?:"[^"]*"|'[^']*'|[^'">])*>""")
+
+SanitizedContent = namedtuple("SanitizedContent", ["article", "text"])
+
+_cleaners = threading.local()
+
+
+def get_cleaner(kind: str) -> Cleaner:
+    """Get the thread's cleaner of the kind, they're costly to build and not thread safe."""
+    cleaner = getattr(_cleaners, kind, None)
+    if cleaner is None:
+        cleaner = Cleaner(**CLEANER_OPTIONS[kind])
+        setattr(_cleaners, kind, cleaner)
+    return cleaner
+
+
+def sanitize(content: str) -> SanitizedContent:
+    """Sanitize html into article markup and plain text, parsing it only once.
+
+    The plain text is the sanitized article with its remaining tags removed, the
+    same escaped text stripping every tag with bleach would give.
+    """
+    article = get_cleaner("article").clean(content).strip()
+    text = TAG_PATTERN.sub("", article).strip()
+    return SanitizedContent(article=article, text=text)
+
+
+def strip_markup(content: str) -> str:
+    """Remove all markup from html, leaving its escaped text."""
+    return get_cleaner("text").clean(content)
@@ -0,0 +1,18 @@
+from django.db import close_old_connections
+import rq
+
+
+class SimpleWorker(rq.SimpleWorker):
+    """Run jobs in the worker process rather than a fork per job.
+
+    State kept by a process, such as the pooled HTTP sessions used for enrichment,
+    then lasts from one job to the next. The database connection does too, so it's
+    checked around each job as Django does around each request.
+    """
+
+    def perform_job(self, job, queue, *args, **kwargs):
+        close_old_connections()
+        try:
+            return super().perform_job(job, queue, *args, **kwargs)
+        finally:
+            close_old_connections()
@@ -10,6 +10,7 @@ from feedzero.feeds.models import (
     EntryState,
     Feed,
     Tag,
+    UnreadCount,
 )
 from feedzero.ingest.jobs import sync_feed
 
@@ -21,6 +22,7 @@ class FeedAdmin(admin.ModelAdmin):
         "slug",
         "link",
         "date_last_scraped",
+        "next_scrape_at",
         "date_created",
         "date_modified",
     )
@@ -32,9 +34,9 @@ class FeedAdmin(admin.ModelAdmin):
         """Manual action to sync the requested feeds."""
         for feed in queryset:
             if settings.RQ_ENABLED:
-                sync_feed.delay(feed)
+                sync_feed.delay(feed.pk)
             else:
-                sync_feed(feed)
+                sync_feed(feed.pk)
 
     sync_feeds.short_description = "Queue sync."
 
@@ -64,6 +66,12 @@ class EnrichedContentAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(UnreadCount)
+class UnreadCountAdmin(admin.ModelAdmin):
+    list_display = ("user", "feed", "count")
+    list_filter = ("user",)
+
+
 @admin.register(Enclosure)
 class EnclosureAdmin(admin.ModelAdmin):
     list_display = ("href", "file_type", "entry")
@@ -1,11 +1,10 @@
 from django import forms
 from django.conf import settings
 import feedparser
-import requests
 
 from feedzero.feeds.jobs import enrich_feed_with_favicon
 from feedzero.feeds.models import Feed
-from feedzero.ingest.constants import REQUESTS_USER_AGENT
+from feedzero.ingest import http
 
 
 class FeedAddForm(forms.Form):
@@ -16,7 +15,7 @@ class FeedAddForm(forms.Form):
         if Feed.objects.filter(link=url).exists():
             raise forms.ValidationError("Feed already exists with that URL.")
 
-        response = requests.get(url, headers={"User-Agent": REQUESTS_USER_AGENT})
+        response = http.get(url)
         if response.status_code != 200:
             raise forms.ValidationError(
                 f"URL responded with status code {response.status_code}"
@@ -4,8 +4,8 @@ from urllib.parse import urlparse
 from django.core import files
 from django_rq import job
 import favicon
-import requests
 
+from feedzero.ingest import http
 from feedzero.ingest.constants import REQUESTS_USER_AGENT
 
 
@@ -20,13 +20,18 @@ def enrich_feed_with_favicon(feed):
 
     icons = []
     if link:
-        icons = favicon.get(link, headers={"User-Agent": REQUESTS_USER_AGENT})
+        # the favicon library makes its own requests, so only shares our timeouts
+        icons = favicon.get(
+            link,
+            headers={"User-Agent": REQUESTS_USER_AGENT},
+            timeout=http.get_timeout(),
+        )
     if len(icons) == 0:
         # TODO log unable to get favicon?
         return
 
     icon = icons[0]
-    response = requests.get(icon.url, stream=True)
+    response = http.get(icon.url, stream=True)
     filename = f"{feed.slug}.{icon.format}"
     lf = tempfile.NamedTemporaryFile()
     for chunk in response.iter_content(1024):
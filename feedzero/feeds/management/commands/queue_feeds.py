@@ -2,7 +2,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from feedzero.feeds.models import Feed
-from feedzero.ingest.jobs import sync_feed
+from feedzero.ingest.jobs import sync_feeds
 
 
 class Command(BaseCommand):
@@ -10,12 +10,28 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         # TODO: pass in specific feeds
-        pass
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Enqueue every enabled feed, whether or not it is due.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.INGEST_FETCH_BATCH_SIZE,
+            help="Number of feeds fetched concurrently by each job.",
+        )
 
     def handle(self, *args, **options):
-        # TODO: limit to ones due for update when development is further
-        for feed in Feed.objects.filter(scraping_enabled=True):
+        if options["all"]:
+            feeds = Feed.objects.filter(scraping_enabled=True)
+        else:
+            feeds = Feed.objects.due()
+        feed_ids = list(feeds.order_by("next_scrape_at").values_list("pk", flat=True))
+        batch_size = max(options["batch_size"], 1)
+        for i in range(0, len(feed_ids), batch_size):
+            batch = feed_ids[i : i + batch_size]
             if settings.RQ_ENABLED:
-                sync_feed.delay(feed)
+                sync_feeds.delay(batch)
             else:
-                sync_feed(feed)
+                sync_feeds(batch)
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from feedzero.feeds.models import UnreadCount
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalised unread counts from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*", help="Only rebuild counts for these users."
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        for user in users:
+            with transaction.atomic():
+                UnreadCount.objects.rebuild(user)
+            self.stdout.write(f"Rebuilt unread counts for {user}")
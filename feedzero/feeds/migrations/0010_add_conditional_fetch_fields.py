@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("feeds", "0009_add_logo_field")]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="etag",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="last_modified",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_unread_counts(apps, schema_editor):
+    """Count the unread entries of every feed currently being watched."""
+    Entry = apps.get_model("feeds", "Entry")
+    UnreadCount = apps.get_model("feeds", "UnreadCount")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    counts = []
+    for watch in User.watching.through.objects.all():
+        count = (
+            Entry.objects.filter(feed_id=watch.feed_id)
+            .exclude(states__user_id=watch.feedzerouser_id)
+            .count()
+        )
+        counts.append(
+            UnreadCount(
+                user_id=watch.feedzerouser_id, feed_id=watch.feed_id, count=count
+            )
+        )
+    UnreadCount.objects.bulk_create(counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("feeds", "0010_add_conditional_fetch_fields"),
+        ("users", "0003_third_party_tokens"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UnreadCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="unread_counts",
+                        to="feeds.Feed",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="unread_counts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={"unique_together": {("user", "feed")}},
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
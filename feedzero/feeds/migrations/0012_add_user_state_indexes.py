@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("feeds", "0011_add_unread_count")]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(
+                fields=["feed", "-date_published"], name="entry_feed_published_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entrystate",
+            index=models.Index(
+                fields=["user", "entry"], name="entrystate_user_entry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entrystate",
+            index=models.Index(
+                condition=models.Q(state="pinned"),
+                fields=["user", "-date_created"],
+                name="entrystate_pinned_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entrystate",
+            index=models.Index(
+                condition=models.Q(state="saved"),
+                fields=["user", "-date_created"],
+                name="entrystate_saved_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("feeds", "0012_add_user_state_indexes")]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="next_scrape_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="unchanged_scrapes",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
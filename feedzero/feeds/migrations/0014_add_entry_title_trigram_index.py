@@ -0,0 +1,30 @@
+from django.db import migrations
+from loguru import logger
+
+
+def create_trigram_index(apps, schema_editor):
+    """Index entry titles by trigram, backing case insensitive LIKE rule matching.
+
+    The index is an optimisation, so it's skipped where pg_trgm isn't available.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            logger.warning("pg_trgm is not available, skipping the title index")
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS entry_title_trgm_idx ON feeds_entry "
+        "USING gin (UPPER(title::text) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS entry_title_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("feeds", "0013_add_feed_schedule")]
+
+    operations = [migrations.RunPython(create_trigram_index, drop_trigram_index)]
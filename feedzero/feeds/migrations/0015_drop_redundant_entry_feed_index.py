@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("feeds", "0014_add_entry_title_trigram_index")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="entry",
+            name="feed",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="entries",
+                to="feeds.Feed",
+            ),
+        )
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("feeds", "0015_drop_redundant_entry_feed_index")]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        )
+    ]
@@ -1,13 +1,15 @@
-import bleach
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from django.db.models import Q
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils import timezone
 from django.utils.text import Truncator
 from loguru import logger
 import maya
 
+from feedzero.core.lookups import ConditionField
 from feedzero.core.models import SlugifiedMixin
+from feedzero.core.sanitize import strip_markup
 
 
 class FeedManager(models.Manager):
@@ -17,6 +19,12 @@ class FeedManager(models.Manager):
         """Return feeds watched by the given user."""
         return self.filter(watched_by=user)
 
+    def due(self):
+        """Return feeds enabled for scraping which are due to be scraped."""
+        return self.filter(scraping_enabled=True).filter(
+            Q(next_scrape_at__isnull=True) | Q(next_scrape_at__lte=timezone.now())
+        )
+
 
 class Feed(SlugifiedMixin, models.Model):
     """A feed of content."""
@@ -32,18 +40,21 @@ class Feed(SlugifiedMixin, models.Model):
     date_modified = models.DateTimeField(auto_now=True)
     date_last_scraped = models.DateTimeField(blank=True, null=True)
 
+    # validators from the last scrape, sent back to the server as conditional headers
+    etag = models.CharField(max_length=255, blank=True, null=True)
+    last_modified = models.CharField(max_length=255, blank=True, null=True)
+    # hash of the last body parsed successfully, identical bodies aren't parsed again
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+
+    # maintained by feedzero.ingest.scheduling, feeds without a time are due now
+    next_scrape_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    unchanged_scrapes = models.PositiveIntegerField(default=0)
+
     objects = FeedManager()
 
     def __str__(self):
-        """Str representation of feed."""
-        return self.title
-
-    @staticmethod
-    def slug_uniqueness_check(text, uids):
-        """Check for other feeds with this slug."""
-        if text in uids:
-            return False
-        return not Feed.objects.filter(slug=text).exists()
+        """Str representation of feed, its link until it has a title."""
+        return self.title or self.link
 
     def is_watched_by(self, user) -> bool:
         """Assert user is contained within watched_by m2m field."""
@@ -52,9 +63,7 @@ class Feed(SlugifiedMixin, models.Model):
     def mark_entries_archived(self, user):
         """Will archive all current unread entries."""
         entries = self.entries.all().exclude(states__isnull=False, states__user=user)
-        # TODO this may be expensive, consider a bulk operation?
-        for entry in entries:
-            entry.mark_deleted(user)
+        EntryState.objects.bulk_mark_deleted(entries, user)
 
 
 class Author(models.Model):
@@ -88,8 +97,11 @@ class EntryUserStateManager(models.Manager):
     def unread(self, user):
         """Get all entries that haven't been read by the user yet."""
         feeds = Feed.objects.watched_by(user)
-        entries = self.filter(feed__in=feeds).exclude(
-            states__isnull=False, states__user=user
+        states = EntryState.objects.filter(entry=OuterRef("pk"), user=user)
+        entries = (
+            self.filter(feed__in=feeds)
+            .annotate(has_state=Exists(states, output_field=ConditionField()))
+            .filter(has_state__holds=False)
         )
         return entries.order_by("-date_published")
 
@@ -119,7 +131,10 @@ class Entry(SlugifiedMixin, models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
-    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name="entries")
+    # indexed by entry_feed_published_idx, which leads with the feed
+    feed = models.ForeignKey(
+        Feed, on_delete=models.CASCADE, related_name="entries", db_index=False
+    )
 
     author = models.ForeignKey(
         Author, on_delete=models.SET_NULL, blank=True, null=True, related_name="entries"
@@ -133,51 +148,26 @@ class Entry(SlugifiedMixin, models.Model):
     objects = models.Manager()
     user_state = EntryUserStateManager()
 
-    def get_initial_slug_uids(self):
-        """Prepopulate slug uids with titles for entries in this feed.
-
-        This is required due to the `unique_together` constraint of the model.
-        """
-        return [
-            entry.title for entry in Entry.objects.filter(feed=self.feed).only("title")
-        ]
-
-    @staticmethod
-    def slug_uniqueness_check(text, uids) -> bool:
-        """Ensure no other entries with this slug exist."""
-        if text in uids:
-            return False
-        return not Entry.objects.filter(slug=text).exists()
-
     def archive_older_than_this(self, user):
         """Mark all entries older than this entry, for this feed, as archived."""
         older_entries = Entry.objects.filter(
             date_created__lt=self.date_created, feed=self.feed
         )
-        for entry in older_entries:
-            entry.mark_deleted(user)
+        EntryState.objects.bulk_mark_deleted(older_entries, user)
 
     def mark_read_by(self, user):
         """Create an entrystate object marking this entry as having been read."""
-        return EntryState.objects.get_or_create(
-            state=EntryState.STATE_READ, entry=self, user=user
-        )
+        return self._create_state(EntryState.STATE_READ, user)
 
     def mark_pinned(self, user):
         """Pin the entry for the user if not already pinned."""
-        return EntryState.objects.get_or_create(
-            state=EntryState.STATE_PINNED, entry=self, user=user
-        )
+        return self._create_state(EntryState.STATE_PINNED, user)
 
     def mark_unpinned(self, user):
         """Unpin the entry for the user."""
-        try:
-            state = EntryState.objects.get(
-                state=EntryState.STATE_PINNED, entry=self, user=user
-            )
-            state.delete()
-        except EntryState.DoesNotExist as e:
-            logger.exception("Attempted to unpin an unpinned entry.", exc_info=e)
+        self._remove_state(
+            EntryState.STATE_PINNED, user, "Attempted to unpin an unpinned entry."
+        )
 
     def mark_deleted(self, user):
         """Pin the entry for the user if not already deleted.
@@ -185,22 +175,17 @@ class Entry(SlugifiedMixin, models.Model):
         By marking for deletion, we also delete all other states.
         TODO consider moving this to the entry state model?
         """
-        EntryState.objects.filter(entry=self, user=user).filter(
-            Q(state=EntryState.STATE_PINNED) | Q(state=EntryState.STATE_SAVED)
-        ).delete()
-        return EntryState.objects.get_or_create(
-            state=EntryState.STATE_DELETED, entry=self, user=user
+        return self._create_state(
+            EntryState.STATE_DELETED,
+            user,
+            replacing=EntryState.REPLACED_STATES[EntryState.STATE_DELETED],
         )
 
     def mark_undeleted(self, user):
         """Undelete the entry for the user."""
-        try:
-            state = EntryState.objects.get(
-                state=EntryState.STATE_DELETED, entry=self, user=user
-            )
-            state.delete()
-        except EntryState.DoesNotExist as e:
-            logger.exception("Attempted to undelete an undeleted entry.", exc_info=e)
+        self._remove_state(
+            EntryState.STATE_DELETED, user, "Attempted to undelete an undeleted entry."
+        )
 
     def mark_saved(self, user):
         """Save the entry for the user if not already saved.
@@ -208,23 +193,48 @@ class Entry(SlugifiedMixin, models.Model):
         If the entry has been pinned, delete the pin state.
         TODO consider moving this to the entry state model?
         """
-        if self.is_pinned_by(user):
-            EntryState.objects.filter(
-                state=EntryState.STATE_PINNED, entry=self, user=user
-            ).delete()
-        return EntryState.objects.get_or_create(
-            state=EntryState.STATE_SAVED, entry=self, user=user
+        return self._create_state(
+            EntryState.STATE_SAVED,
+            user,
+            replacing=EntryState.REPLACED_STATES[EntryState.STATE_SAVED],
         )
 
     def mark_unsaved(self, user):
         """Remove the saved state of an entry."""
+        self._remove_state(
+            EntryState.STATE_SAVED, user, "Attempted to undelete an undeleted entry."
+        )
+
+    def _create_state(self, state, user, replacing=()):
+        """Get or create a state for the user, removing any states it replaces.
+
+        The user's unread count for the feed is decremented if this is the first
+        state the user has for the entry.
+        """
+        was_unread = self.is_unread_by(user)
+        if replacing:
+            EntryState.objects.filter(
+                entry=self, user=user, state__in=replacing
+            ).delete()
+        result = EntryState.objects.get_or_create(state=state, entry=self, user=user)
+        if was_unread:
+            UnreadCount.objects.adjust(user, self.feed_id, -1)
+        return result
+
+    def _remove_state(self, state, user, missing_message):
+        """Remove a state for the user, the entry is unread again if none remain."""
         try:
-            state = EntryState.objects.get(
-                state=EntryState.STATE_SAVED, entry=self, user=user
-            )
-            state.delete()
+            entry_state = EntryState.objects.get(state=state, entry=self, user=user)
+            entry_state.delete()
         except EntryState.DoesNotExist as e:
-            logger.exception("Attempted to undelete an undeleted entry.", exc_info=e)
+            logger.exception(missing_message, exc_info=e)
+            return
+        if self.is_unread_by(user):
+            UnreadCount.objects.adjust(user, self.feed_id, 1)
+
+    def is_unread_by(self, user) -> bool:
+        """Check if the user has yet to apply any state to the entry."""
+        return not EntryState.objects.filter(entry=self, user=user).exists()
 
     def is_pinned_by(self, user) -> bool:
         """Check if the given entry has been pinned by the given user."""
@@ -261,11 +271,23 @@ class Entry(SlugifiedMixin, models.Model):
         truncated_text = Truncator(text).words(self.TEASER_WORDS)
         return truncated_text
 
-    def save(self, *args, **kwargs):
-        """Ensure certain data mutations always occur."""
+    def sanitize(self):
+        """Strip any markup from fields which should only contain text."""
         if self.summary:
-            self.summary = bleach.clean(self.summary, strip=True)
-        return super().save(*args, **kwargs)
+            self.summary = strip_markup(self.summary)
+
+    def save(self, *args, sanitize=True, **kwargs):
+        """Ensure certain data mutations always occur.
+
+        Sanitizing can be skipped where the fields are known to be clean already.
+        """
+        if sanitize:
+            self.sanitize()
+        adding = self._state.adding
+        result = super().save(*args, **kwargs)
+        if adding:
+            UnreadCount.objects.increment_feed(self.feed_id, 1)
+        return result
 
     def __str__(self):
         """Str dunder implementation."""
@@ -274,6 +296,45 @@ class Entry(SlugifiedMixin, models.Model):
     class Meta:
         verbose_name_plural = "entries"
         unique_together = (("guid", "feed"),)
+        indexes = [
+            # unread entries for a set of feeds, newest first
+            models.Index(
+                fields=["feed", "-date_published"], name="entry_feed_published_idx"
+            )
+        ]
+
+
+class EntryStateManager(models.Manager):
+    def bulk_mark(self, entries, user, state):
+        """Mark all of the given entries with the state for the user.
+
+        Performs the same transition as the Entry.mark_* methods, removing any states
+        the new one replaces, but in a constant number of queries however many
+        entries. Unread counts are adjusted once per feed for entries that were unread.
+        """
+        unread_counts = (
+            entries.exclude(states__user=user)
+            .order_by()
+            .values_list("feed_id")
+            .annotate(count=Count("pk"))
+        )
+        for feed_id, count in unread_counts:
+            UnreadCount.objects.adjust(user, feed_id, -count)
+
+        replacing = EntryState.REPLACED_STATES.get(state)
+        if replacing:
+            self.filter(entry__in=entries, user=user, state__in=replacing).delete()
+        self.bulk_create(
+            [
+                EntryState(state=state, entry_id=entry_id, user=user)
+                for entry_id in entries.values_list("pk", flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+
+    def bulk_mark_deleted(self, entries, user):
+        """Mark all of the given entries as deleted for the user."""
+        self.bulk_mark(entries, user, EntryState.STATE_DELETED)
 
 
 class EntryState(models.Model):
@@ -297,6 +358,11 @@ class EntryState(models.Model):
         (STATE_DELETED, "Deleted"),
         (STATE_PINNED, "Pinned"),
     ]
+    # states removed from an entry when it is moved into the keyed state
+    REPLACED_STATES = {
+        STATE_DELETED: [STATE_PINNED, STATE_SAVED],
+        STATE_SAVED: [STATE_PINNED],
+    }
     state = models.CharField(choices=STATE_CHOICES, max_length=50)
 
     date_created = models.DateTimeField(auto_now_add=True)
@@ -307,6 +373,8 @@ class EntryState(models.Model):
         settings.AUTH_USER_MODEL, related_name="entry_states", on_delete=models.CASCADE
     )
 
+    objects = EntryStateManager()
+
     @staticmethod
     def is_valid_state(state):
         """Check if the provided state is present within the available state choices."""
@@ -314,6 +382,89 @@ class EntryState(models.Model):
 
     class Meta:
         unique_together = (("state", "user", "entry"),)
+        indexes = [
+            # whether the user has any state for an entry, i.e. the unread anti-join
+            models.Index(fields=["user", "entry"], name="entrystate_user_entry_idx"),
+            # pinned and saved entries for a user, most recently stated first
+            models.Index(
+                fields=["user", "-date_created"],
+                name="entrystate_pinned_idx",
+                condition=Q(state="pinned"),
+            ),
+            models.Index(
+                fields=["user", "-date_created"],
+                name="entrystate_saved_idx",
+                condition=Q(state="saved"),
+            ),
+        ]
+
+
+class UnreadCountManager(models.Manager):
+    def adjust(self, user, feed_id, delta: int):
+        """Apply a change to the user's unread count for the feed, if they watch it."""
+        return self.filter(user=user, feed_id=feed_id).update(count=F("count") + delta)
+
+    def increment_feed(self, feed_id, delta: int):
+        """Add new entries to the unread count of every user watching the feed."""
+        return self.filter(feed_id=feed_id).update(count=F("count") + delta)
+
+    def remove_entry(self, entry):
+        """Take an entry about to be deleted out of the counts of users yet to read it."""
+        stated = EntryState.objects.filter(entry=entry).values("user_id")
+        return (
+            self.filter(feed_id=entry.feed_id)
+            .exclude(user_id__in=stated)
+            .update(count=F("count") - 1)
+        )
+
+    def track(self, user, feed_ids):
+        """Start counting unread entries for feeds the user has started watching."""
+        counts = dict(
+            Entry.user_state.unread(user)
+            .filter(feed_id__in=feed_ids)
+            .order_by()
+            .values_list("feed_id")
+            .annotate(count=Count("pk"))
+        )
+        self.bulk_create(
+            [
+                UnreadCount(user=user, feed_id=feed_id, count=counts.get(feed_id, 0))
+                for feed_id in feed_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    def rebuild(self, user):
+        """Recompute the counts for every feed the user watches from scratch."""
+        self.filter(user=user).delete()
+        feed_ids = Feed.objects.watched_by(user).values_list("pk", flat=True)
+        self.track(user, list(feed_ids))
+
+
+class UnreadCount(models.Model):
+    """Denormalised count of the unread entries in a feed, for a user watching it.
+
+    A row exists for every feed a user watches. It is maintained as entries are
+    ingested, deleted and change state, see `rebuild_unread_counts` to correct drift.
+    """
+
+    count = models.IntegerField(default=0)
+
+    feed = models.ForeignKey(
+        Feed, related_name="unread_counts", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="unread_counts", on_delete=models.CASCADE
+    )
+
+    objects = UnreadCountManager()
+
+    def __str__(self):
+        """Str representation of unread count."""
+        return f"{self.user} {self.feed} {self.count}"
+
+    class Meta:
+        unique_together = (("user", "feed"),)
 
 
 class Enclosure(models.Model):
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+import pytest
+
+from feedzero.feeds.models import UnreadCount
+
+
+@pytest.mark.django_db
+class TestRebuildUnreadCounts:
+    def test_rebuilds_counts(self, watched_feed, entry_factory):
+        """Should recompute the unread count of every watched feed."""
+        (feed, user) = watched_feed
+        [entry_factory(feed=feed) for _ in range(2)]
+        UnreadCount.objects.all().delete()
+        call_command("rebuild_unread_counts")
+        assert UnreadCount.objects.get(user=user, feed=feed).count == 2
+
+    def test_limits_to_given_users(self, watched_feed, entry_factory):
+        """Should only rebuild the counts of the given users."""
+        (feed, user) = watched_feed
+        UnreadCount.objects.all().delete()
+        call_command("rebuild_unread_counts", "someone-else")
+        assert not UnreadCount.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db
+class TestQueueFeeds:
+    @pytest.fixture
+    def mocked_sync(self, mocker):
+        return mocker.patch("feedzero.feeds.management.commands.queue_feeds.sync_feeds")
+
+    @pytest.fixture
+    def scheduled_feeds(self, feed_factory):
+        now = timezone.now()
+        return {
+            "unscheduled": feed_factory(next_scrape_at=None),
+            "due": feed_factory(next_scrape_at=now - timedelta(minutes=1)),
+            "later": feed_factory(next_scrape_at=now + timedelta(hours=1)),
+            "disabled": feed_factory(next_scrape_at=None, scraping_enabled=False),
+        }
+
+    def queued(self, mocked_sync):
+        return {pk for call in mocked_sync.call_args_list for pk in call[0][0]}
+
+    def test_enqueues_only_due_feeds(self, settings, mocked_sync, scheduled_feeds):
+        """Should only enqueue enabled feeds whose next scrape time has passed."""
+        settings.RQ_ENABLED = False
+        call_command("queue_feeds")
+        assert self.queued(mocked_sync) == {
+            scheduled_feeds["unscheduled"].pk,
+            scheduled_feeds["due"].pk,
+        }
+
+    def test_all_ignores_schedule(self, settings, mocked_sync, scheduled_feeds):
+        """Should enqueue every enabled feed if asked to."""
+        settings.RQ_ENABLED = False
+        call_command("queue_feeds", "--all")
+        assert scheduled_feeds["later"].pk in self.queued(mocked_sync)
+        assert scheduled_feeds["disabled"].pk not in self.queued(mocked_sync)
@@ -1,8 +1,9 @@
+from django.db import connection
 from django.db.utils import IntegrityError
 from model_mommy import mommy
 import pytest
 
-from feedzero.feeds.models import Entry, EntryState, Feed, FeedManager
+from feedzero.feeds.models import Entry, EntryState, Feed, FeedManager, UnreadCount
 
 
 @pytest.mark.django_db
@@ -11,6 +12,11 @@ class TestFeedModel:
         """The model should render the name as the string."""
         assert str(feed) == feed.title
 
+    def test_dunder_str_without_title(self):
+        """The model should render the link until the feed has a title."""
+        feed = mommy.make(Feed, title=None, link="https://example.com/rss")
+        assert str(feed) == "https://example.com/rss"
+
     def test_generated_slug(self, feed):
         """The model should generate an appropriate slug."""
         assert feed.slug == "my-amazing-feed"
@@ -38,6 +44,28 @@ class TestFeedModel:
         """The feed model should default to scraping."""
         assert Feed._meta.get_field("scraping_enabled").default is True
 
+    def test_mark_entries_archived(self, feed, user, entry_factory):
+        """Should mark every unread entry in the feed as deleted."""
+        entries = [entry_factory(feed=feed) for _ in range(5)]
+        feed.mark_entries_archived(user)
+        for entry in entries:
+            assert entry.is_deleted_by(user)
+
+    def test_mark_entries_archived_leaves_read_entries(self, feed, user, entry_factory):
+        """Entries the user already has a state for should be left alone."""
+        read_entry = entry_factory(feed=feed)
+        read_entry.mark_read_by(user)
+        feed.mark_entries_archived(user)
+        assert not read_entry.is_deleted_by(user)
+
+    def test_mark_entries_archived_constant_queries(
+        self, feed, user, entry_factory, django_assert_num_queries
+    ):
+        """Should archive in the same number of queries, however many entries."""
+        [entry_factory(feed=feed) for _ in range(25)]
+        with django_assert_num_queries(5):
+            feed.mark_entries_archived(user)
+
 
 @pytest.mark.django_db
 class TestFeedManager:
@@ -49,6 +77,25 @@ class TestFeedManager:
         assert unwatched not in Feed.objects.watched_by(user).all()
 
 
+@pytest.mark.django_db
+class TestEntryUserStateManager:
+    def test_unread_excludes_stated_entries(self, watched_feed, entry_factory):
+        """Should only return entries the user has no state for."""
+        (feed, user) = watched_feed
+        entries = [entry_factory(feed=feed) for _ in range(3)]
+        entries[0].mark_read_by(user)
+        entries[1].mark_pinned(mommy.make("users.FeedZeroUser"))
+        assert set(Entry.user_state.unread(user)) == set(entries[1:])
+
+    def test_unread_usable_as_subquery(self, watched_feed, entry_factory):
+        """Should remain valid SQL when nested in another query."""
+        (feed, user) = watched_feed
+        entries = [entry_factory(feed=feed) for _ in range(2)]
+        entries[0].mark_pinned(mommy.make("users.FeedZeroUser"))
+        unread = Entry.user_state.unread(user)
+        assert EntryState.objects.filter(entry__in=unread).count() == 1
+
+
 @pytest.mark.django_db
 class TestEntryStateModel:
     def test_unique_together_constraint(self, entry, user):
@@ -87,6 +134,34 @@ class TestEntryModel:
         entry_dup = mommy.make(Entry, feed=entry.feed, title=entry.title)
         assert entry_dup.slug == "my-amazing-entry-1"
 
+    def test_slug_queries_dont_grow_with_feed(
+        self, feed, entry_factory, django_assert_num_queries
+    ):
+        """Should allocate a slug with a single query, however large the feed."""
+        entry_factory(_quantity=20, title="Unrelated")
+        entry_factory(title="My Amazing Entry!")
+        entry = Entry(feed=feed, guid="new", title="My Amazing Entry!")
+
+        # slugs, the insert, and the unread count update
+        with django_assert_num_queries(3):
+            entry.save()
+        assert entry.slug == "my-amazing-entry-1"
+
+    def test_slug_suffix_fits_max_length(self, entry_factory):
+        """Should shorten a long slug to make room for the suffix."""
+        first = entry_factory(title="a" * 300)
+        second = entry_factory(title="a" * 300)
+        assert len(first.slug) == Entry.SLUG_MAX_LENGTH
+        assert second.slug == "a" * (Entry.SLUG_MAX_LENGTH - 2) + "-1"
+
+    def test_slug_query_skips_longer_slugs(self, entry_factory):
+        """Should only load the slugs a short title could collide with."""
+        entry_factory(_quantity=20, title="News of the day")
+        entry_factory(title="Newsletter")
+        entry_factory(_quantity=2, title="News")
+        assert Entry.get_taken_slugs({"news"}) == {"news", "news-1"}
+        assert entry_factory(title="News").slug == "news-2"
+
     def test_feed_guid_unique_together_constraint(self, entry):
         """A duplicated guid for the same feed should raise IntegrityError."""
         with pytest.raises(IntegrityError):
@@ -384,6 +459,49 @@ class TestEntryModel:
             == 0
         )
 
+    def test_archive_older_than_this(self, feed, user, entry_factory):
+        """Should mark older entries in the feed as deleted, but not newer ones."""
+        older = [entry_factory(feed=feed) for _ in range(3)]
+        entry = entry_factory(feed=feed)
+        newer = entry_factory(feed=feed)
+        other_feed_entry = entry_factory()
+        entry.archive_older_than_this(user)
+        for older_entry in older:
+            assert older_entry.is_deleted_by(user)
+        assert not entry.is_deleted_by(user)
+        assert not newer.is_deleted_by(user)
+        assert not other_feed_entry.is_deleted_by(user)
+
+    def test_archive_older_than_this_removes_pinned_and_saved(
+        self, feed, user, entry_factory
+    ):
+        """As with mark_deleted, pinned and saved states should be removed."""
+        pinned = entry_factory(feed=feed)
+        pinned.mark_pinned(user)
+        saved = entry_factory(feed=feed)
+        saved.mark_saved(user)
+        entry = entry_factory(feed=feed)
+        entry.archive_older_than_this(user)
+        assert not pinned.is_pinned_by(user)
+        assert not saved.is_saved_by(user)
+        assert pinned.is_deleted_by(user)
+        assert saved.is_deleted_by(user)
+
+    def test_archive_older_than_this_ignores_already_deleted(
+        self, feed, user, entry_factory
+    ):
+        """Entries which are already deleted should not raise or be duplicated."""
+        deleted = entry_factory(feed=feed)
+        deleted.mark_deleted(user)
+        entry = entry_factory(feed=feed)
+        entry.archive_older_than_this(user)
+        assert (
+            EntryState.objects.filter(
+                entry=deleted, user=user, state=EntryState.STATE_DELETED
+            ).count()
+            == 1
+        )
+
     def test_teaser_uses_summary_if_available(self, entry):
         """If the summary is available from the feed, use it instead."""
         entry.summary = "Summary"
@@ -409,3 +527,208 @@ class TestEntryModel:
         """Short copy should return unmodified."""
         entry.summary = "This is only a test"
         assert entry.teaser == "This is only a test"
+
+
+@pytest.mark.django_db
+class TestUnreadCount:
+    def get_count(self, user, feed):
+        return UnreadCount.objects.get(user=user, feed=feed).count
+
+    def test_watching_creates_count(self, user, feed, entry_factory):
+        """Watching a feed should start counting its existing unread entries."""
+        [entry_factory(feed=feed) for _ in range(3)]
+        user.watch(feed)
+        assert self.get_count(user, feed) == 3
+
+    def test_watching_from_feed_creates_count(self, user, feed, entry_factory):
+        """Adding watchers from the feed side should also start counting."""
+        entry_factory(feed=feed)
+        feed.watched_by.add(user)
+        assert self.get_count(user, feed) == 1
+
+    def test_unwatching_removes_count(self, user, feed):
+        """Unwatching a feed should stop counting its unread entries."""
+        user.watch(feed)
+        user.unwatch(feed)
+        assert not UnreadCount.objects.filter(user=user, feed=feed).exists()
+
+    def test_clearing_removes_counts(self, user, feed):
+        """Clearing the watched feeds should stop counting all of them."""
+        user.watch(feed)
+        user.watching.clear()
+        assert not UnreadCount.objects.filter(user=user).exists()
+
+    def test_new_entry_increments(self, user, feed, entry_factory):
+        """Each new entry should increment the count of watching users."""
+        user.watch(feed)
+        [entry_factory(feed=feed) for _ in range(2)]
+        assert self.get_count(user, feed) == 2
+
+    @pytest.mark.parametrize(
+        "mark", ["mark_read_by", "mark_pinned", "mark_saved", "mark_deleted"]
+    )
+    def test_first_state_decrements(self, mark, user, feed, entry_factory):
+        """Applying any state to an unread entry should decrement the count once."""
+        user.watch(feed)
+        entry = entry_factory(feed=feed)
+        getattr(entry, mark)(user)
+        getattr(entry, mark)(user)
+        assert self.get_count(user, feed) == 0
+
+    def test_further_states_do_not_decrement(self, user, feed, entry_factory):
+        """Only the first state applied to an entry should decrement the count."""
+        user.watch(feed)
+        entry = entry_factory(feed=feed)
+        entry_factory(feed=feed)
+        entry.mark_pinned(user)
+        entry.mark_saved(user)
+        entry.mark_deleted(user)
+        assert self.get_count(user, feed) == 1
+
+    def test_removing_last_state_increments(self, user, feed, entry_factory):
+        """An entry with no states left should be counted as unread again."""
+        user.watch(feed)
+        entry = entry_factory(feed=feed)
+        entry.mark_pinned(user)
+        entry.mark_unpinned(user)
+        assert self.get_count(user, feed) == 1
+
+    def test_removing_other_state_does_not_increment(self, user, feed, entry_factory):
+        """An entry with remaining states should not be counted as unread."""
+        user.watch(feed)
+        entry = entry_factory(feed=feed)
+        entry.mark_read_by(user)
+        entry.mark_pinned(user)
+        entry.mark_unpinned(user)
+        assert self.get_count(user, feed) == 0
+
+    def test_deleting_entry_decrements(self, user, feed, entry_factory):
+        """Deleting an entry should only decrement the count if it was unread."""
+        user.watch(feed)
+        entries = [entry_factory(feed=feed) for _ in range(3)]
+        entries[0].mark_read_by(user)
+        entries[0].delete()
+        entries[1].delete()
+        assert self.get_count(user, feed) == 1
+
+    def test_deleting_entries_in_bulk_decrements(self, user, feed, entry_factory):
+        """Deleting many entries at once should decrement the count for each."""
+        user.watch(feed)
+        [entry_factory(feed=feed) for _ in range(3)]
+        Entry.objects.filter(feed=feed).delete()
+        assert self.get_count(user, feed) == 0
+
+    def test_bulk_archive_decrements(self, user, feed, entry_factory):
+        """Archiving a feed should leave nothing unread."""
+        user.watch(feed)
+        entries = [entry_factory(feed=feed) for _ in range(4)]
+        entries[0].mark_pinned(user)
+        feed.mark_entries_archived(user)
+        assert self.get_count(user, feed) == 0
+
+    def test_matches_unread_query(self, user, feed, entry_factory):
+        """The maintained count should agree with the unread query."""
+        user.watch(feed)
+        entries = [entry_factory(feed=feed) for _ in range(6)]
+        entries[0].mark_read_by(user)
+        entries[1].mark_pinned(user)
+        entries[1].mark_unpinned(user)
+        entries[3].archive_older_than_this(user)
+        expected = Entry.user_state.unread(user).filter(feed=feed).count()
+        assert self.get_count(user, feed) == expected
+
+    def test_rebuild(self, user, feed, entry_factory):
+        """Rebuilding should correct any drift in the count."""
+        user.watch(feed)
+        [entry_factory(feed=feed) for _ in range(3)]
+        UnreadCount.objects.filter(user=user, feed=feed).update(count=100)
+        UnreadCount.objects.rebuild(user)
+        assert self.get_count(user, feed) == 3
+
+
+@pytest.mark.django_db
+class TestUserStateIndexes:
+    """Check the indexes backing the user state queries.
+
+    The indexes are checked by definition, then by the plans of the queries they
+    back. For tiny test tables a scan and sort is often cheapest, so plans are made
+    with both disabled once the tables are analyzed.
+    """
+
+    @pytest.fixture
+    def stated_feed(self, watched_feed, entry_factory):
+        (feed, user) = watched_feed
+        entries = [entry_factory(feed=feed) for _ in range(6)]
+        [entry.mark_pinned(user) for entry in entries[:2]]
+        entries[3].mark_saved(user)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE feeds_entry")
+            cursor.execute("ANALYZE feeds_entrystate")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+        return feed, user
+
+    def get_index(self, model, name):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        return constraints[name]
+
+    def test_entry_feed_published_index(self):
+        """Entries should be indexed by feed, then newest first."""
+        index = self.get_index(Entry, "entry_feed_published_idx")
+        assert index["columns"] == ["feed_id", "date_published"]
+        assert index["orders"] == ["ASC", "DESC"]
+
+    def test_entrystate_user_entry_index(self):
+        """States should be indexed by user then entry, for the unread anti join."""
+        index = self.get_index(EntryState, "entrystate_user_entry_idx")
+        assert index["columns"] == ["user_id", "entry_id"]
+
+    @pytest.mark.parametrize(
+        "name, state",
+        [
+            ("entrystate_pinned_idx", EntryState.STATE_PINNED),
+            ("entrystate_saved_idx", EntryState.STATE_SAVED),
+        ],
+    )
+    def test_partial_state_indexes(self, name, state):
+        """Pinned and saved states should each have a partial index in view order."""
+        index = self.get_index(EntryState, name)
+        assert index["columns"] == ["user_id", "date_created"]
+        assert index["orders"] == ["ASC", "DESC"]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE indexname = %s", [name]
+            )
+            assert f"WHERE ((state)::text = '{state}'::text)" in cursor.fetchone()[0]
+
+    def test_unread_planned_as_anti_join(self, watched_feed, entry_factory):
+        """Excluding stated entries should be planned as an anti join."""
+        (feed, user) = watched_feed
+        entries = [entry_factory(feed=feed) for _ in range(6)]
+        [entry.mark_pinned(user) for entry in entries[:2]]
+        for analyze in [False, True]:
+            if analyze:
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE feeds_entry")
+                    cursor.execute("ANALYZE feeds_entrystate")
+            assert "Anti Join" in Entry.user_state.unread(user).explain()
+
+    def test_unread_feed_planned_with_published_index(self, stated_feed):
+        """A feed's unread entries should be read newest first from the index."""
+        (feed, user) = stated_feed
+        plan = Entry.user_state.unread(user).filter(feed=feed).explain()
+        assert "Index Scan using entry_feed_published_idx" in plan
+
+    @pytest.mark.parametrize(
+        "name, manager",
+        [("entrystate_pinned_idx", "pinned"), ("entrystate_saved_idx", "saved")],
+    )
+    def test_stated_planned_with_partial_index(self, stated_feed, name, manager):
+        """Pinned and saved entries should be read most recent first from the index."""
+        (feed, user) = stated_feed
+        entries = getattr(Entry.user_state, manager)(user)
+        plan = entries.order_by("-states__date_created").explain()
+        assert f"Index Scan using {name}" in plan
@@ -1,9 +1,25 @@
 from django.contrib import admin
 
-from feedzero.ingest.models import IngestLog
+from feedzero.ingest.models import IngestLog, IngestMetric
 
 
 @admin.register(IngestLog)
 class IngestLogAdmin(admin.ModelAdmin):
     list_display = ("state", "date_created", "feed")
     list_filter = ("feed", "state")
+
+
+@admin.register(IngestMetric)
+class IngestMetricAdmin(admin.ModelAdmin):
+    list_display = (
+        "bucket",
+        "period",
+        "feed",
+        "syncs",
+        "errors",
+        "fetch_time_max",
+        "entries_new",
+    )
+    list_filter = ("period",)
+    ordering = ("-bucket", "-fetch_time_max")
+    raw_id_fields = ("feed",)
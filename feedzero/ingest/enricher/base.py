@@ -6,8 +6,10 @@ from feedzero.ingest.enricher.utils import convert_html_to_newspaper, get_sorted
 
 
 class Enricher:
-    def __init__(self, entry: Entry):
+    def __init__(self, entry: Entry, reserved: bool = False):
         self.entry = entry
+        # a slot is already held for the request to the entry's host
+        self.reserved = reserved
 
     def enrich(self):
         if hasattr(self.entry, "enriched"):
@@ -0,0 +1,68 @@
+from datetime import timedelta
+import time
+
+from django.conf import settings
+from django.db import transaction
+import django_rq
+from django_rq import job
+from loguru import logger
+from redis.exceptions import RedisError
+
+from feedzero.feeds.models import Entry
+from feedzero.ingest.enricher.simple import SimpleEnricher
+from feedzero.ingest.exceptions import ThrottledException
+from feedzero.ingest.models import IngestMetric
+
+
+@job("enrichment")
+def enrich_entry(entry_id: int, reserved: bool = False):
+    """Enrich a stored entry with the content of the page it links to.
+
+    An enrichment queued again after being throttled may already hold a slot for
+    its host, so is reserved and isn't throttled a second time.
+    """
+    try:
+        entry = Entry.objects.get(pk=entry_id)
+    except Entry.DoesNotExist:
+        logger.warning(f"Entry {entry_id} no longer exists, skipping enrichment.")
+        return
+
+    # TODO multiple enrichers need some logic here to get the appropriate one
+    started = time.perf_counter()
+    try:
+        SimpleEnricher(entry, reserved=reserved).enrich()
+    except ThrottledException as e:
+        logger.debug(f"Deferring enrichment of entry {entry_id}: {e}")
+        defer_enrichment(entry_id, e.delay, e.reserved)
+        return
+    IngestMetric.objects.record(
+        entry.feed_id, enrichments=1, enrich_time=time.perf_counter() - started
+    )
+
+
+def defer_enrichment(entry_id: int, delay: float, reserved: bool = False):
+    """Queue the entry's enrichment again once its host will take requests.
+
+    The enrichment workers need to be started `--with-scheduler` to run it. Without
+    RQ there's nothing to hold the enrichment back with, so it's skipped.
+    """
+    if not settings.RQ_ENABLED:
+        logger.info(f"Skipping enrichment of entry {entry_id}, its host is throttled")
+        return
+    try:
+        django_rq.get_queue("enrichment").enqueue_in(
+            timedelta(seconds=delay),
+            enrich_entry,
+            args=(entry_id,),
+            kwargs={"reserved": reserved},
+        )
+    except RedisError:
+        logger.error(f"Unable to defer enrichment of entry {entry_id}", exc_info=True)
+
+
+def queue_enrichment(entry: Entry):
+    """Enrich the entry once the transaction inserting it has committed."""
+    if settings.RQ_ENABLED:
+        transaction.on_commit(lambda: enrich_entry.delay(entry.pk))
+    else:
+        transaction.on_commit(lambda: enrich_entry(entry.pk))
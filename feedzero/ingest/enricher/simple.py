@@ -1,7 +1,7 @@
-import requests
-
-from feedzero.ingest.constants import REQUESTS_USER_AGENT
+from feedzero.ingest import http
 from feedzero.ingest.enricher.base import Enricher
+from feedzero.ingest.exceptions import ThrottledException
+from feedzero.ingest.throttle import get_retry_after, get_throttle
 
 
 class SimpleEnricher(Enricher):
@@ -9,7 +9,16 @@ class SimpleEnricher(Enricher):
 
     def extract_page_html(self) -> str:
         url = self.get_start_url()
-        response = requests.get(url, headers={"User-Agent": REQUESTS_USER_AGENT})
+        throttle = get_throttle()
+        delay = 0 if self.reserved else throttle.acquire(url)
+        if delay:
+            raise ThrottledException(url, delay, reserved=True)
+
+        response = http.get(url)
+        retry_after = get_retry_after(response)
+        if retry_after is not None:
+            throttle.block(url, retry_after)
+            raise ThrottledException(url, retry_after)
         if response.status_code != 200:
             raise ValueError(
                 f"Enrichment request for url {url} failed with status code {response.status_code}"
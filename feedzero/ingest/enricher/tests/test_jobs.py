@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.utils import timezone
+import django_rq
+import pytest
+from redis.exceptions import RedisError
+
+from feedzero.ingest.enricher.jobs import enrich_entry, queue_enrichment
+from feedzero.ingest.exceptions import ThrottledException
+from feedzero.ingest.models import IngestMetric
+
+
+def get_scheduled_jobs():
+    """Get the jobs waiting on the enrichment queue with when each is due."""
+    queue = django_rq.get_queue("enrichment")
+    registry = queue.scheduled_job_registry
+    return [
+        (queue.fetch_job(job_id), registry.get_scheduled_time(job_id))
+        for job_id in registry.get_job_ids()
+    ]
+
+
+@pytest.mark.django_db
+class TestEnrichEntry:
+    def test_enriches_entry(self, mocker, entry):
+        """Should run the enricher against the stored entry."""
+        enrich = mocker.patch("feedzero.ingest.enricher.jobs.SimpleEnricher.enrich")
+        enrich_entry(entry.pk)
+        assert enrich.called
+
+    def test_records_enrich_time(self, mocker, entry):
+        """Should add the enrichment to the feed's metrics."""
+        mocker.patch("feedzero.ingest.enricher.jobs.SimpleEnricher.enrich")
+        enrich_entry(entry.pk)
+        metric = IngestMetric.objects.get(feed=entry.feed)
+        assert metric.enrichments == 1
+        assert metric.enrich_time > 0
+
+    def test_missing_entry_does_nothing(self, mocker):
+        """Should not raise if the entry has since been deleted."""
+        enrich = mocker.patch("feedzero.ingest.enricher.jobs.SimpleEnricher.enrich")
+        enrich_entry(-1)
+        assert not enrich.called
+
+    @pytest.mark.parametrize("reserved", [True, False])
+    def test_throttled_enrichment_queued_again(self, mocker, settings, entry, reserved):
+        """Should queue the enrichment again for when its host will take requests."""
+        settings.RQ_ENABLED = True
+        mocker.patch(
+            "feedzero.ingest.enricher.jobs.SimpleEnricher.enrich",
+            side_effect=ThrottledException(entry.link, 30, reserved=reserved),
+        )
+        enrich_entry(entry.pk)
+        [(job, due)] = get_scheduled_jobs()
+        assert job.func == enrich_entry
+        assert job.args == (entry.pk,)
+        assert job.kwargs == {"reserved": reserved}
+        assert timedelta(seconds=29) < due - timezone.now() <= timedelta(seconds=30)
+
+    def test_reserved_enrichment_skips_throttle(self, mocker, entry):
+        """Should pass on that a slot is already held for the entry's host."""
+        enricher = mocker.patch("feedzero.ingest.enricher.jobs.SimpleEnricher")
+        enrich_entry(entry.pk, reserved=True)
+        enricher.assert_called_with(entry, reserved=True)
+
+    def test_throttled_enrichment_skipped_without_rq(self, mocker, settings, entry):
+        """Should skip the enrichment if RQ is disabled, rather than wait on it."""
+        settings.RQ_ENABLED = False
+        mocker.patch(
+            "feedzero.ingest.enricher.jobs.SimpleEnricher.enrich",
+            side_effect=ThrottledException(entry.link, 30),
+        )
+        enrich_entry(entry.pk)
+        assert get_scheduled_jobs() == []
+
+    def test_redis_failure_drops_deferral(self, mocker, settings, entry):
+        """Should not raise if the enrichment can't be queued again."""
+        settings.RQ_ENABLED = True
+        mocker.patch(
+            "feedzero.ingest.enricher.jobs.SimpleEnricher.enrich",
+            side_effect=ThrottledException(entry.link, 30),
+        )
+        mocker.patch(
+            "feedzero.ingest.enricher.jobs.django_rq.get_queue", side_effect=RedisError
+        )
+        enrich_entry(entry.pk)
+
+
+@pytest.mark.django_db
+class TestQueueEnrichment:
+    @pytest.fixture
+    def on_commit(self, mocker):
+        """Run on commit callbacks immediately, the test transaction never commits."""
+        return mocker.patch(
+            "feedzero.ingest.enricher.jobs.transaction.on_commit",
+            side_effect=lambda fn: fn(),
+        )
+
+    def test_enqueues_after_commit(self, mocker, settings, on_commit, entry):
+        """Should enqueue the enrichment job once the entry is committed."""
+        settings.RQ_ENABLED = True
+        delay = mocker.patch("feedzero.ingest.enricher.jobs.enrich_entry.delay")
+        queue_enrichment(entry)
+        assert on_commit.called
+        delay.assert_called_with(entry.pk)
+
+    def test_runs_inline_without_rq(self, mocker, settings, on_commit, entry):
+        """Should enrich synchronously if RQ is disabled."""
+        settings.RQ_ENABLED = False
+        enrich = mocker.patch("feedzero.ingest.enricher.jobs.SimpleEnricher.enrich")
+        queue_enrichment(entry)
+        assert enrich.called
@@ -1,7 +1,8 @@
 import pytest
 
-from feedzero.ingest.constants import REQUESTS_USER_AGENT
 from feedzero.ingest.enricher.simple import SimpleEnricher
+from feedzero.ingest.exceptions import ThrottledException
+from feedzero.ingest.throttle import HostThrottle
 
 
 @pytest.mark.django_db
@@ -10,21 +11,19 @@ class TestSimpleEnricher:
     def enricher(self, entry):
         return SimpleEnricher(entry)
 
-    def test_sends_correct_user_agent(self, mocker, enricher):
-        """Should send the feedzero user agent."""
-        req_fn = mocker.patch("feedzero.ingest.enricher.simple.requests.get")
+    def test_requests_through_pooled_session(self, mocker, enricher):
+        """Should request the page through the shared session for its host."""
+        req_fn = mocker.patch("feedzero.ingest.enricher.simple.http.get")
         req_mock = mocker.Mock()
         req_mock.status_code = 200
         req_fn.return_value = req_mock
 
         enricher.extract_page_html()
-        req_fn.assert_called_with(
-            enricher.entry.link, headers={"User-Agent": REQUESTS_USER_AGENT}
-        )
+        req_fn.assert_called_with(enricher.entry.link)
 
     def test_returns_response_text(self, mocker, enricher):
         """Should return the raw response text."""
-        req_fn = mocker.patch("feedzero.ingest.enricher.simple.requests.get")
+        req_fn = mocker.patch("feedzero.ingest.enricher.simple.http.get")
         req_mock = mocker.Mock()
         req_mock.status_code = 200
         req_mock.text = "This is only a test"
@@ -35,10 +34,45 @@ class TestSimpleEnricher:
 
     def test_invalid_status_code_raises(self, mocker, enricher):
         """Should raise if a non 200 status code is received."""
-        req_fn = mocker.patch("feedzero.ingest.enricher.simple.requests.get")
+        req_fn = mocker.patch("feedzero.ingest.enricher.simple.http.get")
         req_mock = mocker.Mock()
         req_mock.status_code = 400
         req_fn.return_value = req_mock
 
         with pytest.raises(ValueError):
             enricher.extract_page_html()
+
+    def test_throttled_host_raises(self, mocker, enricher):
+        """Should not request the page while its host is throttled."""
+        req_fn = mocker.patch("feedzero.ingest.enricher.simple.http.get")
+        mocker.patch.object(HostThrottle, "acquire", return_value=30)
+
+        with pytest.raises(ThrottledException) as e:
+            enricher.extract_page_html()
+        assert e.value.delay == 30
+        assert e.value.reserved
+        assert not req_fn.called
+
+    def test_reserved_request_skips_throttle(self, mocker, entry):
+        """Should not take another slot for a request which already holds one."""
+        req_fn = mocker.patch("feedzero.ingest.enricher.simple.http.get")
+        req_fn.return_value.status_code = 200
+        acquire = mocker.patch.object(HostThrottle, "acquire", return_value=30)
+
+        SimpleEnricher(entry, reserved=True).extract_page_html()
+        assert not acquire.called
+        assert req_fn.called
+
+    def test_too_many_requests_blocks_host(self, mocker, enricher):
+        """Should hold back the host for as long as it asks."""
+        req_fn = mocker.patch("feedzero.ingest.enricher.simple.http.get")
+        req_mock = mocker.Mock()
+        req_mock.status_code = 429
+        req_mock.headers = {"Retry-After": "120"}
+        req_fn.return_value = req_mock
+
+        with pytest.raises(ThrottledException) as e:
+            enricher.extract_page_html()
+        assert e.value.delay == 120
+        assert not e.value.reserved
+        assert HostThrottle().acquire(enricher.entry.link) > 100
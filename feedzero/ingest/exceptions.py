@@ -1,2 +1,17 @@
 class ContentErrorException(Exception):
     pass
+
+
+class ResponseTooLargeException(Exception):
+    pass
+
+
+class ThrottledException(Exception):
+    def __init__(self, url: str, delay: float, reserved: bool = False):
+        """Note how many seconds to wait before requesting the url again.
+
+        Reserved if a slot is held for the request once the delay is up.
+        """
+        super().__init__(f"Requests to {url} are held back for {delay:.1f}s")
+        self.delay = delay
+        self.reserved = reserved
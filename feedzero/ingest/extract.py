@@ -0,0 +1,129 @@
+import time
+import traceback
+from typing import Callable, List, Tuple
+
+import feedparser
+import maya
+
+from feedzero.core.sanitize import sanitize
+from feedzero.ingest.exceptions import ContentErrorException
+
+# Nothing here may touch Django, as these run in parse processes which never set it
+# up, see feedzero.ingest.pipeline.
+
+
+class EntryParser:
+    """Parse an individual entry."""
+
+    def __init__(self, entry_data: feedparser.FeedParserDict):
+        """Load initial entry data into the parser."""
+        self.entry_data = entry_data
+
+    def load(self, entry_data):
+        """Load the given entry data into the parser, replacing the existing."""
+        self.entry_data = entry_data
+
+    def extract(self) -> dict:
+        """Extract the appropriate values from the entry_data."""
+        return {
+            "title": self.entry_data.title,
+            "link": self.entry_data.link,
+            "guid": self.entry_data.id,
+            "date_published": maya.parse(self.entry_data.published).datetime(),
+            "content": sanitize(self.get_content()).article,
+            "summary": sanitize(self.get_summary()).text,
+        }
+
+    def get_tags(self) -> List[dict]:
+        """Get the tags of the entry, with their terms normalised."""
+        return [
+            {
+                "term": tag.term.lower().strip(),
+                "scheme": tag.get("scheme", ""),
+                "label": tag.get("label", ""),
+            }
+            for tag in getattr(self.entry_data, "tags", [])
+        ]
+
+    def _has_field(self, field: str):
+        if not hasattr(self.entry_data, field):
+            return False
+        return getattr(self.entry_data, field, False)
+
+    def get_content(self) -> str:
+        """Get the raw html for the content field of the Entry."""
+        if self._has_field("content"):
+            field = self.entry_data.content
+        elif self._has_field("description"):
+            field = self.entry_data.description
+        else:
+            raise ContentErrorException("content")
+
+        return self._flatten(field)
+
+    def get_summary(self) -> str:
+        """Get the raw html for the summary field of the Entry."""
+        if self._has_field("summary_detail"):
+            field = self.entry_data.summary_detail
+        elif self._has_field("summary"):
+            field = self.entry_data.summary
+        else:
+            raise ContentErrorException("summary")
+
+        return self._flatten(field)
+
+    def _flatten(self, field) -> str:
+        """Get the html of the given field as a single string.
+
+        The argument `field` may be of varying type depending on which
+        feedparser field we've determined to be appropriate.
+        """
+        content = field
+
+        # TODO will this correctly handle multi part atom instances?
+        if isinstance(field, list):
+            content = "".join(f["value"] for f in field)
+        elif isinstance(field, feedparser.FeedParserDict):
+            content = field["value"]
+
+        return content
+
+
+def parse_document(body: str) -> List[feedparser.FeedParserDict]:
+    """Parse a feed document into its entries."""
+    return feedparser.parse(body).entries
+
+
+def extract_entries(
+    entries: List[feedparser.FeedParserDict]
+) -> Tuple[List[dict], List[str]]:
+    """Extract the fields and tags of each entry as plain dicts, ready to be written.
+
+    Entries which fail extraction are left out, with their tracebacks returned
+    alongside so the failures can be logged by the writer.
+    """
+    entry_parser = None
+    extracted = []
+    errors = []
+
+    for entry in entries:
+        try:
+            if not entry_parser:
+                entry_parser = EntryParser(entry)
+            else:
+                entry_parser.load(entry)
+
+            fields = entry_parser.extract()
+            fields["tags"] = entry_parser.get_tags()
+            extracted.append(fields)
+        except Exception:
+            errors.append(traceback.format_exc())
+
+    return extracted, errors
+
+
+def timed(fn: Callable, *args) -> Tuple[object, float]:
+    """Call the function, returning its result and the seconds it took."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
@@ -0,0 +1,234 @@
+import asyncio
+import codecs
+from collections import namedtuple
+from email.message import Message
+import re
+import time
+from typing import List
+
+import aiohttp
+from django.conf import settings
+from loguru import logger
+import requests
+from requests.compat import chardet
+from requests.structures import CaseInsensitiveDict
+
+from feedzero.feeds.models import Feed
+from feedzero.ingest.exceptions import ResponseTooLargeException
+from feedzero.ingest.utils import get_request_headers
+
+CHUNK_SIZE = 64 * 1024
+# bytes of body to look over before choosing an encoding for it
+DETECT_BYTES = 4 * 1024
+XML_ENCODING_PATTERN = re.compile(rb"""^\s*<\?xml[^>]*encoding=["']([\w.:-]+)["']""")
+
+# Mirrors the parts of requests.Response the rest of ingest relies upon, so a
+# result can be handed straight to the response handling in jobs and RSSParser. Also
+# notes the bytes of body read and the seconds spent requesting and reading it.
+FetchResult = namedtuple(
+    "FetchResult",
+    ["feed", "status_code", "headers", "text", "error", "size", "elapsed"],
+    defaults=[0, 0],
+)
+
+
+class BodyReader:
+    """Decode a response body as it streams in, refusing bodies over the size limit.
+
+    The encoding is chosen once DETECT_BYTES of the body have arrived. A byte order
+    mark wins, then the charset from the headers, then the XML declaration. Without
+    any of those the start of the body is checked, taking utf-8 if it decodes and
+    otherwise detecting the encoding as requests does.
+    """
+
+    BOMS = [
+        (codecs.BOM_UTF32_BE, "utf-32"),
+        (codecs.BOM_UTF32_LE, "utf-32"),
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+    ]
+
+    def __init__(self, encoding: str = None, max_bytes: int = None):
+        """Fall back to the configured limit if none is supplied."""
+        self.encoding = encoding
+        self.max_bytes = max_bytes or settings.INGEST_FETCH_MAX_BYTES
+        self.decoder = None
+        self.size = 0
+        self.parts = []
+        self.buffer = b""
+
+    def check_length(self, headers):
+        """Refuse the body before it's read if its declared length is over the limit."""
+        length = headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            raise ResponseTooLargeException(
+                f"Content-Length of {length} is over {self.max_bytes} bytes"
+            )
+
+    def get_encoding(self, sample: bytes) -> str:
+        """Work out the encoding of the body, given the start of it."""
+        for bom, encoding in self.BOMS:
+            if sample.startswith(bom):
+                return encoding
+        if self.encoding:
+            return self.encoding
+        match = XML_ENCODING_PATTERN.match(sample)
+        if match:
+            return match.group(1).decode("ascii")
+        try:
+            # not final, as the sample may end part way through a character
+            codecs.getincrementaldecoder("utf-8")().decode(sample)
+            return "utf-8"
+        except UnicodeDecodeError:
+            return chardet.detect(sample)["encoding"] or "utf-8"
+
+    def get_decoder(self, sample: bytes):
+        """Build a decoder for the body, given the start of it."""
+        try:
+            decoder = codecs.getincrementaldecoder(self.get_encoding(sample))
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")
+        return decoder(errors="replace")
+
+    def feed(self, chunk: bytes):
+        """Decode the next chunk of the body, once enough has arrived to detect it."""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ResponseTooLargeException(f"Body is over {self.max_bytes} bytes")
+        if self.decoder is None:
+            self.buffer += chunk
+            if len(self.buffer) < DETECT_BYTES:
+                return
+            chunk, self.buffer = self.buffer, b""
+            self.decoder = self.get_decoder(chunk)
+        self.parts.append(self.decoder.decode(chunk))
+
+    def read(self) -> str:
+        """Return the decoded body."""
+        if self.decoder is None:
+            if not self.buffer:
+                return ""
+            self.decoder = self.get_decoder(self.buffer)
+            self.parts.append(self.decoder.decode(self.buffer))
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return "".join(self.parts)
+
+
+def get_declared_charset(headers) -> str:
+    """Get the charset the Content-Type header declares, if it declares one.
+
+    Unlike requests.Response.encoding this doesn't assume ISO-8859-1 for text types,
+    which would outrank the XML declaration.
+    """
+    message = Message()
+    message["Content-Type"] = headers.get("Content-Type", "")
+    return message.get_content_charset()
+
+
+def read_response(
+    feed: Feed, response: requests.Response, max_bytes: int = None
+) -> FetchResult:
+    """Stream the body of a response requested with stream=True into a result.
+
+    Failing to read the whole body is captured on the result.
+    """
+    reader = BodyReader(get_declared_charset(response.headers), max_bytes)
+    try:
+        reader.check_length(response.headers)
+        for chunk in response.iter_content(CHUNK_SIZE):
+            reader.feed(chunk)
+    except (requests.RequestException, ResponseTooLargeException) as e:
+        logger.warning(f"Abandoned download of {feed.link}: {e!r}")
+        return FetchResult(
+            feed=feed,
+            status_code=None,
+            headers=CaseInsensitiveDict(),
+            text="",
+            error=e,
+            size=reader.size,
+        )
+    finally:
+        response.close()
+    return FetchResult(
+        feed=feed,
+        status_code=response.status_code,
+        headers=response.headers,
+        text=reader.read(),
+        error=None,
+        size=reader.size,
+    )
+
+
+class AsyncFeedFetcher:
+    """Fetch many feeds at once, bounded by a global and a per host connection limit."""
+
+    def __init__(
+        self,
+        concurrency: int = None,
+        per_host: int = None,
+        timeout=None,
+        max_bytes: int = None,
+    ):
+        """Fall back to the configured limits if none are supplied."""
+        self.concurrency = concurrency or settings.INGEST_FETCH_CONCURRENCY
+        self.per_host = per_host or settings.INGEST_FETCH_PER_HOST
+        self.timeout = timeout or settings.INGEST_FETCH_TIMEOUT
+        self.max_bytes = max_bytes or settings.INGEST_FETCH_MAX_BYTES
+
+    def fetch(self, feeds: List[Feed]) -> List[FetchResult]:
+        """Fetch all of the given feeds, returning results in the same order."""
+        return asyncio.run(self.fetch_all(feeds))
+
+    async def fetch_all(self, feeds: List[Feed]) -> List[FetchResult]:
+        """Share one session between all requests so the connector can enforce limits."""
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.per_host
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            return await asyncio.gather(
+                *[self.fetch_one(session, feed) for feed in feeds]
+            )
+
+    async def fetch_one(
+        self, session: aiohttp.ClientSession, feed: Feed
+    ) -> FetchResult:
+        """Fetch an individual feed, capturing any failure on the result."""
+        logger.debug(f"Fetching feed {feed.link}")
+        started = time.monotonic()
+        reader = None
+        try:
+            async with session.get(
+                feed.link, headers=get_request_headers(feed)
+            ) as response:
+                reader = BodyReader(response.charset, self.max_bytes)
+                reader.check_length(response.headers)
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    reader.feed(chunk)
+                return FetchResult(
+                    feed=feed,
+                    status_code=response.status,
+                    headers=CaseInsensitiveDict(response.headers),
+                    text=reader.read(),
+                    error=None,
+                    size=reader.size,
+                    elapsed=time.monotonic() - started,
+                )
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            ResponseTooLargeException,
+        ) as e:
+            logger.warning(f"Failed to fetch {feed.link}: {e!r}")
+            return FetchResult(
+                feed=feed,
+                status_code=None,
+                headers=CaseInsensitiveDict(),
+                text="",
+                error=e,
+                size=reader.size if reader else 0,
+                elapsed=time.monotonic() - started,
+            )
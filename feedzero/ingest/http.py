@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import random
+import threading
+from urllib.parse import urlsplit
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from feedzero.ingest.constants import REQUESTS_USER_AGENT
+
+_local = threading.local()
+
+
+class JitteredRetry(Retry):
+    """Retry with exponential backoff, randomised so retries to a host spread out."""
+
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, super().get_backoff_time())
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def get_timeout() -> tuple:
+    return (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+
+
+def build_session() -> requests.Session:
+    """Build a session sending our user agent, which retries failed connections.
+
+    Retry-After is not waited upon, as a worker shouldn't sleep for however long a
+    server asks it to.
+    """
+    retry = JitteredRetry(
+        total=settings.HTTP_RETRIES,
+        backoff_factor=settings.HTTP_RETRY_BACKOFF,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry, pool_connections=1, pool_maxsize=settings.HTTP_POOL_SIZE
+    )
+    session = requests.Session()
+    session.headers["User-Agent"] = REQUESTS_USER_AGENT
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """Get the session for the url's host, so requests to a host share connections.
+
+    Sessions belong to a thread, as they aren't thread safe, and only the most
+    recently used HTTP_MAX_SESSIONS are kept open.
+    """
+    sessions = getattr(_local, "sessions", None)
+    if sessions is None:
+        sessions = _local.sessions = OrderedDict()
+
+    host = get_host(url)
+    session = sessions.pop(host, None) or build_session()
+    sessions[host] = session
+    while len(sessions) > settings.HTTP_MAX_SESSIONS:
+        _, evicted = sessions.popitem(last=False)
+        evicted.close()
+    return session
+
+
+def close_sessions():
+    """Close all of the thread's sessions."""
+    sessions = getattr(_local, "sessions", {})
+    while sessions:
+        _, session = sessions.popitem()
+        session.close()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Send a GET request through the url's pooled session, with default timeouts."""
+    kwargs.setdefault("timeout", get_timeout())
+    return get_session(url).get(url, **kwargs)
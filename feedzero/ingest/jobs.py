@@ -1,37 +1,259 @@
+from collections import defaultdict
+from datetime import timedelta
+import math
+import time
+import traceback
+from typing import List
+
+from django.conf import settings
+import django_rq
 from django_rq import job
 from loguru import logger
 import maya
 import requests
+from requests.structures import CaseInsensitiveDict
 from sentry_sdk import configure_scope
 
 from feedzero.feeds.models import Feed
-from feedzero.ingest.constants import REQUESTS_USER_AGENT
-from feedzero.ingest.models import IngestLog
+from feedzero.ingest import http
+from feedzero.ingest.fetcher import AsyncFeedFetcher, FetchResult, read_response
+from feedzero.ingest.models import IngestLog, IngestMetric
 from feedzero.ingest.parser import RSSParser
+from feedzero.ingest.pipeline import parse_responses
+from feedzero.ingest.scheduling import (
+    schedule_after_failure,
+    schedule_after_scrape,
+    schedule_after_throttle,
+    SCHEDULE_FIELDS,
+)
+from feedzero.ingest.throttle import get_retry_after, get_throttle
+from feedzero.ingest.utils import get_request_headers, truncate_body
 
 
 @job
-def sync_feed(feed: Feed):
-    """Sync feed parsing against the database."""
+def sync_feed(feed_id: int, reserved: bool = False):
+    """Sync feed parsing against the database.
+
+    A sync queued again after being throttled already holds a slot for its host,
+    so is reserved and isn't throttled a second time.
+    """
+    try:
+        feed = Feed.objects.get(pk=feed_id)
+    except Feed.DoesNotExist:
+        logger.warning(f"Feed {feed_id} no longer exists, skipping sync.")
+        return
+
     with configure_scope() as scope:
         logger.debug(f"Processing feed {feed.link}")
         scope.set_tag("feed", feed.title)
 
-        r = requests.get(feed.link, headers={"User-Agent": REQUESTS_USER_AGENT})
+        delay = 0 if reserved else get_throttle().acquire(feed.link)
+        if delay:
+            defer_feeds([feed], delay, sync_feed, feed.pk)
+            return
+
+        started = time.monotonic()
+        try:
+            r = http.get(feed.link, headers=get_request_headers(feed), stream=True)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to fetch {feed.link}: {e!r}")
+            result = FetchResult(
+                feed=feed,
+                status_code=None,
+                headers=CaseInsensitiveDict(),
+                text="",
+                error=e,
+            )
+        else:
+            result = read_response(feed, r)
+        result = result._replace(elapsed=time.monotonic() - started)
+        if result.error:
+            record_fetch_error(result)
+            return
+        try:
+            process_feed_response(feed, result)
+        except Exception:
+            record_sync_error(result, traceback.format_exc())
+            raise
+
+
+@job
+def sync_feeds(feed_ids: List[int], reserved: bool = False):
+    """Fetch a batch of feeds concurrently, then sync them against the database.
+
+    Feeds are loaded as the job runs, leaving out any which have since been
+    disabled. Those whose host has had its share of requests are deferred rather
+    than fetched, and queued again in a batch per delay, reserved as they hold slots
+    for their host. The bodies fetched are parsed together, see
+    feedzero.ingest.pipeline.
+    """
+    enabled = Feed.objects.filter(scraping_enabled=True).in_bulk(feed_ids)
+    feeds = [enabled[pk] for pk in feed_ids if pk in enabled]
+
+    throttle = get_throttle()
+    ready = []
+    deferred = defaultdict(list)
+    for feed in feeds:
+        delay = 0 if reserved else throttle.acquire(feed.link)
+        if delay:
+            deferred[math.ceil(delay)].append(feed)
+        else:
+            ready.append(feed)
+    for delay, batch in deferred.items():
+        defer_feeds(batch, delay, sync_feeds, [feed.pk for feed in batch])
+
+    parseable = []
+    for result in AsyncFeedFetcher().fetch(ready):
+        feed = result.feed
+        with configure_scope() as scope:
+            scope.set_tag("feed", feed.title)
+
+            if result.error:
+                record_fetch_error(result)
+                continue
+
+            try:
+                if check_feed_response(feed, result):
+                    parseable.append(result)
+            except Exception:
+                logger.exception(f"Failed to sync feed {feed.link}", exc_info=True)
+                record_sync_error(result, traceback.format_exc())
+
+    if settings.INGEST_BULK_CREATE:
+        parsed = parse_responses(parseable)
+    else:
+        parsed = {}
+        for result in parseable:
+            parser = RSSParser(result.feed)
+            try:
+                parser.parse(result)
+            except Exception:
+                logger.exception(
+                    f"Failed to sync feed {result.feed.link}", exc_info=True
+                )
+                continue
+            parsed[result.feed.pk] = parser
+
+    # feeds missing from parsed raised while parsing, and have been logged as such
+    for result in parseable:
+        parser = parsed.get(result.feed.pk)
+        if parser:
+            record_scrape(result.feed, result, len(parser.created_ids), parser.metrics)
+        else:
+            record_sync_error(result)
+
+
+def defer_feeds(feeds: List[Feed], delay: float, func, *args):
+    """Push the feeds back until their host will take requests, queueing func again.
 
-        scope.set_extra("body", r.text)
+    The queued job reschedules the feeds as it syncs them, so they're only left due
+    for queue_feeds, which would fetch them a second time, if that job is lost. The
+    job is given the feed ids rather than the feeds, so it syncs them as they are
+    when it runs. Without RQ the feeds are left for queue_feeds once they're due.
+    """
+    if settings.RQ_ENABLED:
+        django_rq.get_queue().enqueue_in(
+            timedelta(seconds=delay), func, args=args, kwargs={"reserved": True}
+        )
+        due = delay + settings.INGEST_SCHEDULE_MIN_INTERVAL * 60
+    else:
+        due = delay
+    for feed in feeds:
+        logger.debug(f"Deferring {feed.link} for {delay:.1f}s, its host is throttled")
+        schedule_after_throttle(feed, due)
 
-        if r.status_code != 200:
+
+def record_fetch_error(result: FetchResult):
+    """Log a feed whose body couldn't be fetched as not responding, and back off."""
+    IngestLog.objects.create(
+        feed=result.feed, state=IngestLog.STATE_NOT_RESPONDING, body=repr(result.error)
+    )
+    record_metrics(result.feed, result, errors=1)
+    schedule_after_failure(result.feed)
+
+
+def record_sync_error(result: FetchResult, error: str = None):
+    """Log a feed which raised while being synced as failed, and back off."""
+    IngestLog.objects.create(feed=result.feed, state=IngestLog.STATE_FAILED, body=error)
+    record_metrics(result.feed, result, errors=1)
+    schedule_after_failure(result.feed)
+
+
+def record_metrics(feed: Feed, result: FetchResult, **values):
+    """Add the measurements of a sync to the feed's metrics for the hour.
+
+    Syncs which got a response are also counted by the class of its status code.
+    """
+    status_class = (result.status_code or 0) // 100
+    if 2 <= status_class <= 5:
+        values[f"status_{status_class}xx"] = 1
+    IngestMetric.objects.record(
+        feed.pk,
+        syncs=1,
+        bytes_fetched=result.size,
+        fetch_time=result.elapsed,
+        fetch_time_max=result.elapsed,
+        **values,
+    )
+
+
+def process_feed_response(feed: Feed, response: FetchResult):
+    """Record the outcome of a feed request, parsing the body into the database."""
+    if check_feed_response(feed, response):
+        parser = RSSParser(feed)
+        created = parser.parse(response, bulk=settings.INGEST_BULK_CREATE)
+        record_scrape(feed, response, created, parser.metrics)
+
+
+def check_feed_response(feed: Feed, response: FetchResult) -> bool:
+    """Record the outcome of a response without a body to parse, or say it has one."""
+    with configure_scope() as scope:
+        scope.set_extra("body", truncate_body(response.text))
+
+        if response.status_code == 304:
+            logger.debug(f"{feed.link} has not been modified since the last scrape")
+            IngestLog.objects.create(feed=feed, state=IngestLog.STATE_NOT_MODIFIED)
+            feed.date_last_scraped = maya.now().datetime()
+            schedule_after_scrape(feed, found_new=False)
+            feed.save(update_fields=["date_last_scraped", *SCHEDULE_FIELDS])
+            record_metrics(feed, response, not_modified=1)
+            return False
+
+        retry_after = get_retry_after(response)
+        if retry_after is not None:
+            logger.warning(f"{feed.link} asked us to back off for {retry_after:.0f}s")
+            IngestLog.objects.create(feed=feed, state=IngestLog.STATE_THROTTLED)
+            record_metrics(feed, response, throttled=1)
+            get_throttle().block(feed.link, retry_after)
+            schedule_after_throttle(feed, retry_after)
+            return False
+
+        if response.status_code != 200:
             logger.error(
-                f"{r.status_code} received when scraping {feed.link}", exc_info=True
+                f"{response.status_code} received when scraping {feed.link}",
+                exc_info=True,
             )
             IngestLog.objects.create(
-                feed=feed, state=IngestLog.STATE_NOT_RESPONDING, body=r.text
+                feed=feed, state=IngestLog.STATE_NOT_RESPONDING, body=response.text
             )
-            return
+            record_metrics(feed, response, errors=1)
+            schedule_after_failure(feed)
+            return False
 
-        parser = RSSParser(feed)
-        parser.parse(r)
+        return True
+
+
+def record_scrape(feed: Feed, response: FetchResult, created: int, metrics: dict):
+    """Store the validators and metrics of a parsed response, and schedule the next.
 
-        feed.date_last_scraped = maya.now().datetime()
-        feed.save()
+    The metrics are those of the RSSParser which parsed it, and are recorded once
+    the feed is saved so a sync which then fails isn't counted twice.
+    """
+    feed.etag = response.headers.get("ETag")
+    feed.last_modified = response.headers.get("Last-Modified")
+    feed.date_last_scraped = maya.now().datetime()
+    schedule_after_scrape(feed, found_new=bool(created))
+    feed.save(
+        update_fields=["etag", "last_modified", "date_last_scraped", *SCHEDULE_FIELDS]
+    )
+    record_metrics(feed, response, **metrics)
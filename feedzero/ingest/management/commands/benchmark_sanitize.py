@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import feedparser
+
+from feedzero.core.sanitize import sanitize
+from feedzero.ingest.exceptions import ContentErrorException
+from feedzero.ingest.extract import EntryParser
+from feedzero.ingest.models import IngestLog
+
+
+class Command(BaseCommand):
+    help = "Time sanitizing the content and summaries of real feed entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sources", nargs="*", help="Paths or URLs of feed documents to use."
+        )
+        parser.add_argument(
+            "--logs",
+            type=int,
+            default=0,
+            help="Also use the bodies of this many of the latest ingest logs.",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Number of runs over the corpus."
+        )
+
+    def get_documents(self, feed_document) -> list:
+        """Get the raw content and summary html of each entry in the feed document."""
+        documents = []
+        for entry in feedparser.parse(feed_document).entries:
+            entry_parser = EntryParser(entry)
+            for get_html in (entry_parser.get_content, entry_parser.get_summary):
+                try:
+                    documents.append(get_html())
+                except ContentErrorException:
+                    continue
+        return documents
+
+    def handle(self, *args, **options):
+        documents = []
+        for source in options["sources"]:
+            documents += self.get_documents(source)
+        if options["logs"]:
+            logs = IngestLog.objects.exclude(body__isnull=True).exclude(body="")
+            bodies = logs.order_by("-date_created").values_list("body", flat=True)
+            for body in bodies[: options["logs"]]:
+                documents += self.get_documents(body)
+        if not documents:
+            raise CommandError("No entry content found, pass feeds or --logs.")
+
+        timings = []
+        for _ in range(max(options["repeat"], 1)):
+            start = time.perf_counter()
+            for document in documents:
+                sanitize(document)
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        size = sum(len(document) for document in documents)
+        self.stdout.write(
+            f"Sanitized {len(documents)} documents ({size} characters) "
+            f"in {best * 1000:.1f}ms, best of {len(timings)}, "
+            f"{len(documents) / best:.0f} documents/s"
+        )
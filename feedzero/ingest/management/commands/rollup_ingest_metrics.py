@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from feedzero.ingest.models import IngestLog, IngestMetric
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll hourly ingest metrics up into days, and delete expired metrics and logs"
+    )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        merged = IngestMetric.objects.rollup(
+            now - timedelta(days=settings.INGEST_METRICS_HOURLY_RETENTION)
+        )
+        pruned = IngestMetric.objects.prune(
+            now - timedelta(days=settings.INGEST_METRICS_RETENTION)
+        )
+        logs, _ = IngestLog.objects.filter(
+            date_created__lt=now - timedelta(days=settings.INGEST_LOG_RETENTION)
+        ).delete()
+
+        self.stdout.write(
+            f"Rolled up {merged} hourly metrics, deleted {pruned} expired metrics "
+            f"and {logs} ingest logs"
+        )
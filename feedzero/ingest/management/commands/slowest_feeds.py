@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from feedzero.ingest.models import IngestMetric
+
+TIMES = ["fetch_time", "parse_time", "db_time", "enrich_time"]
+
+
+class Command(BaseCommand):
+    help = "List the feeds taking longest to sync on average, from the ingest metrics"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--by", choices=TIMES, default="fetch_time", help="The time to rank by."
+        )
+        parser.add_argument(
+            "--days", type=int, default=1, help="Number of days to look back over."
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Number of feeds to list."
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"])
+        ranking = IngestMetric.objects.slowest(since, options["by"])
+        for row in ranking[: options["limit"]]:
+            self.stdout.write(
+                f"{row['average'] * 1000:8.0f}ms over {row['count']:5} "
+                f"{row['feed__title']} ({row['feed__link']})"
+            )
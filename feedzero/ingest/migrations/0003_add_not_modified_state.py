@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("ingest", "0002_increasing_state_max_length")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ingestlog",
+            name="state",
+            field=models.CharField(
+                choices=[
+                    ("success", "Success"),
+                    ("partial", "Partial"),
+                    ("failed", "Failed"),
+                    ("not_responding", "Not responding"),
+                    ("not_modified", "Not modified"),
+                ],
+                max_length=15,
+            ),
+        )
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("ingest", "0004_add_throttled_state")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ingestlog",
+            name="state",
+            field=models.CharField(
+                choices=[
+                    ("success", "Success"),
+                    ("partial", "Partial"),
+                    ("failed", "Failed"),
+                    ("not_responding", "Not responding"),
+                    ("not_modified", "Not modified"),
+                    ("throttled", "Throttled"),
+                    ("unchanged", "Unchanged"),
+                ],
+                max_length=15,
+            ),
+        )
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0016_add_feed_content_hash"),
+        ("ingest", "0005_add_unchanged_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestMetric",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("syncs", models.PositiveIntegerField(default=0)),
+                ("errors", models.PositiveIntegerField(default=0)),
+                ("not_modified", models.PositiveIntegerField(default=0)),
+                ("throttled", models.PositiveIntegerField(default=0)),
+                ("bytes_fetched", models.BigIntegerField(default=0)),
+                ("fetch_time", models.FloatField(default=0)),
+                ("fetch_time_max", models.FloatField(default=0)),
+                ("parse_time", models.FloatField(default=0)),
+                ("db_time", models.FloatField(default=0)),
+                ("enrichments", models.PositiveIntegerField(default=0)),
+                ("enrich_time", models.FloatField(default=0)),
+                ("entries_seen", models.PositiveIntegerField(default=0)),
+                ("entries_new", models.PositiveIntegerField(default=0)),
+                ("entries_failed", models.PositiveIntegerField(default=0)),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingest_metrics",
+                        to="feeds.Feed",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="ingestmetric",
+            index=models.Index(
+                fields=["period", "bucket"], name="ingest_inge_period_39d48a_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="ingestmetric", unique_together={("feed", "period", "bucket")}
+        ),
+    ]
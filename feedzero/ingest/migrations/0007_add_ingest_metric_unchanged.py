@@ -0,0 +1,16 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("ingest", "0006_add_ingest_metrics")]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingestmetric",
+            name="unchanged",
+            field=models.PositiveIntegerField(default=0),
+        )
+    ]
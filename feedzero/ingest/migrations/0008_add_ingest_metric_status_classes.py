@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("ingest", "0007_add_ingest_metric_unchanged")]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingestmetric",
+            name="status_2xx",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="ingestmetric",
+            name="status_3xx",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="ingestmetric",
+            name="status_4xx",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="ingestmetric",
+            name="status_5xx",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,24 +1,36 @@
-from django.db import models
+from datetime import datetime
+from typing import List
+
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import Greatest, TruncDay
+from django.utils import timezone
 
 from feedzero.feeds.models import Feed
+from feedzero.ingest.utils import truncate_body
 
 
 class IngestLog(models.Model):
-    """Metric dumping ground until further notice.
+    """The outcome of each sync of a feed, with the body of those which failed.
 
-    TODO this is somewhat inelegant, consider breaking out or
-            tracking these metrics elsewhere
+    Timings and sizes are kept as IngestMetric totals instead.
     """
 
     STATE_SUCCESS = "success"
     STATE_PARTIAL = "partial"
     STATE_FAILED = "failed"
     STATE_NOT_RESPONDING = "not_responding"
+    STATE_NOT_MODIFIED = "not_modified"
+    STATE_THROTTLED = "throttled"
+    STATE_UNCHANGED = "unchanged"
     STATE_CHOICES = [
         (STATE_SUCCESS, "Success"),
         (STATE_PARTIAL, "Partial"),
         (STATE_FAILED, "Failed"),
         (STATE_NOT_RESPONDING, "Not responding"),
+        (STATE_NOT_MODIFIED, "Not modified"),
+        (STATE_THROTTLED, "Throttled"),
+        (STATE_UNCHANGED, "Unchanged"),
     ]
     state = models.CharField(max_length=15, choices=STATE_CHOICES)
     body = models.TextField(blank=True, null=True)
@@ -28,3 +40,202 @@ class IngestLog(models.Model):
     def __str__(self):
         """Supply some debug information in string representation."""
         return f"{self.date_created} {self.feed.title} {self.state}"
+
+    def save(self, *args, **kwargs):
+        """Keep stored bodies to a bounded size, however large the response was."""
+        self.body = truncate_body(self.body)
+        return super().save(*args, **kwargs)
+
+
+class IngestMetricManager(models.Manager):
+    def get_bucket(self, moment: datetime, period: str) -> datetime:
+        """Get the start of the hour or day the moment falls in."""
+        bucket = moment.replace(minute=0, second=0, microsecond=0)
+        if period == IngestMetric.PERIOD_DAY:
+            bucket = bucket.replace(hour=0)
+        return bucket
+
+    def record(self, feed_id: int, moment: datetime = None, **values):
+        """Add measurements to the totals of the feed's bucket for the current hour."""
+        bucket = self.get_bucket(moment or timezone.now(), IngestMetric.PERIOD_HOUR)
+        self.bulk_create(
+            [
+                IngestMetric(
+                    feed_id=feed_id, period=IngestMetric.PERIOD_HOUR, bucket=bucket
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+        updates = {}
+        for field, value in values.items():
+            if field == "fetch_time_max":
+                updates[field] = Greatest(F(field), value)
+            else:
+                updates[field] = F(field) + value
+        return self.filter(
+            feed_id=feed_id, period=IngestMetric.PERIOD_HOUR, bucket=bucket
+        ).update(**updates)
+
+    def rollup(self, before: datetime) -> int:
+        """Merge the hourly buckets of days before the given time into daily ones.
+
+        Returns the number of hourly buckets merged.
+        """
+        before = self.get_bucket(before, IngestMetric.PERIOD_DAY)
+        hourly = self.filter(period=IngestMetric.PERIOD_HOUR, bucket__lt=before)
+        aggregates = {
+            f"total_{field}": Max(field) if field == "fetch_time_max" else Sum(field)
+            for field in IngestMetric.TOTAL_FIELDS
+        }
+
+        with transaction.atomic():
+            days = (
+                hourly.annotate(day=TruncDay("bucket", tzinfo=timezone.utc))
+                .values("feed_id", "day")
+                .order_by()
+                .annotate(**aggregates)
+            )
+            daily = [
+                IngestMetric(
+                    feed_id=row["feed_id"],
+                    period=IngestMetric.PERIOD_DAY,
+                    bucket=row["day"],
+                    **{
+                        field: row[f"total_{field}"]
+                        for field in IngestMetric.TOTAL_FIELDS
+                    },
+                )
+                for row in days
+            ]
+            if not daily:
+                return 0
+
+            self.merge(daily)
+            merged, _ = hourly.delete()
+        return merged
+
+    def merge(self, metrics: List["IngestMetric"]):
+        """Add unsaved buckets to those stored for the same feed and time, if any."""
+        existing = {
+            (metric.feed_id, metric.bucket): metric
+            for metric in self.filter(
+                period=metrics[0].period,
+                feed_id__in={metric.feed_id for metric in metrics},
+                bucket__in={metric.bucket for metric in metrics},
+            )
+        }
+        new = []
+        updated = []
+        for metric in metrics:
+            stored = existing.get((metric.feed_id, metric.bucket))
+            if stored is None:
+                new.append(metric)
+                continue
+            updated.append(stored)
+            for field in IngestMetric.TOTAL_FIELDS:
+                if field == "fetch_time_max":
+                    value = max(stored.fetch_time_max, metric.fetch_time_max)
+                else:
+                    value = getattr(stored, field) + getattr(metric, field)
+                setattr(stored, field, value)
+
+        self.bulk_create(new)
+        self.bulk_update(updated, IngestMetric.TOTAL_FIELDS)
+
+    def prune(self, before: datetime) -> int:
+        """Delete every bucket starting before the given time."""
+        deleted, _ = self.filter(bucket__lt=before).delete()
+        return deleted
+
+    def slowest(self, since: datetime, field: str = "fetch_time"):
+        """Rank feeds by their average time spent on the field since the given time.
+
+        Enrichment time is averaged over enrichments, every other time over syncs.
+        """
+        count = "enrichments" if field == "enrich_time" else "syncs"
+        return (
+            self.filter(bucket__gte=self.get_bucket(since, IngestMetric.PERIOD_HOUR))
+            .values("feed_id", "feed__title", "feed__link")
+            .annotate(
+                count=Sum(count),
+                total=Sum(field),
+                average=ExpressionWrapper(
+                    Sum(field) / Greatest(Sum(count), 1),
+                    output_field=models.FloatField(),
+                ),
+            )
+            .filter(count__gt=0)
+            .order_by("-average")
+        )
+
+
+class IngestMetric(models.Model):
+    """Totals of the syncs of a feed over an hour, or a day once rolled up.
+
+    Only totals are stored, so buckets can be merged by adding them together and
+    averages taken by dividing by syncs. Times are in seconds.
+    """
+
+    PERIOD_HOUR = "hour"
+    PERIOD_DAY = "day"
+    PERIOD_CHOICES = [(PERIOD_HOUR, "Hour"), (PERIOD_DAY, "Day")]
+    TOTAL_FIELDS = [
+        "syncs",
+        "errors",
+        "not_modified",
+        "throttled",
+        "unchanged",
+        "status_2xx",
+        "status_3xx",
+        "status_4xx",
+        "status_5xx",
+        "bytes_fetched",
+        "fetch_time",
+        "fetch_time_max",
+        "parse_time",
+        "db_time",
+        "enrichments",
+        "enrich_time",
+        "entries_seen",
+        "entries_new",
+        "entries_failed",
+    ]
+
+    feed = models.ForeignKey(
+        Feed, related_name="ingest_metrics", on_delete=models.CASCADE
+    )
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    # syncs attempted, and those which ended without a body to parse
+    syncs = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    not_modified = models.PositiveIntegerField(default=0)
+    throttled = models.PositiveIntegerField(default=0)
+    # syncs whose body was the same as the last one parsed, so wasn't parsed again
+    unchanged = models.PositiveIntegerField(default=0)
+    # syncs which got a response, by the class of its status code
+    status_2xx = models.PositiveIntegerField(default=0)
+    status_3xx = models.PositiveIntegerField(default=0)
+    status_4xx = models.PositiveIntegerField(default=0)
+    status_5xx = models.PositiveIntegerField(default=0)
+    bytes_fetched = models.BigIntegerField(default=0)
+    fetch_time = models.FloatField(default=0)
+    fetch_time_max = models.FloatField(default=0)
+    parse_time = models.FloatField(default=0)
+    db_time = models.FloatField(default=0)
+    enrichments = models.PositiveIntegerField(default=0)
+    enrich_time = models.FloatField(default=0)
+    entries_seen = models.PositiveIntegerField(default=0)
+    entries_new = models.PositiveIntegerField(default=0)
+    entries_failed = models.PositiveIntegerField(default=0)
+
+    objects = IngestMetricManager()
+
+    def __str__(self):
+        """Supply some debug information in string representation."""
+        return f"{self.bucket} {self.period} {self.feed.title}"
+
+    class Meta:
+        unique_together = [("feed", "period", "bucket")]
+        indexes = [models.Index(fields=["period", "bucket"])]
@@ -1,110 +1,139 @@
-from typing import List
+from contextlib import contextmanager
+import time
+from typing import List, Tuple
 
+from django.db import IntegrityError, transaction
 import feedparser
 from loguru import logger
-import maya
 import requests
 
-from feedzero.feeds.models import Entry, Feed
-from feedzero.ingest.enricher.simple import SimpleEnricher
-from feedzero.ingest.exceptions import ContentErrorException
+from feedzero.feeds.models import Entry, Feed, UnreadCount
+from feedzero.ingest.enricher.jobs import queue_enrichment
+from feedzero.ingest.extract import EntryParser, extract_entries, parse_document
 from feedzero.ingest.models import IngestLog
-from feedzero.ingest.utils import clean_content, get_or_create_tags
-
-
-class EntryParser:
-    """Parse an individual entry."""
-
-    def __init__(self, entry_data: feedparser.FeedParserDict):
-        """Load initial entry data into the parser."""
-        self.entry_data = entry_data
-
-    def load(self, entry_data):
-        """Load the given entry data into the parser, replacing the existing."""
-        self.entry_data = entry_data
-
-    def extract(self) -> dict:
-        """Extract the appropriate values from the entry_data."""
-        return {
-            "title": self.entry_data.title,
-            "link": self.entry_data.link,
-            "guid": self.entry_data.id,
-            "date_published": maya.parse(self.entry_data.published).datetime(),
-            "content": self._get_content(),
-            "summary": self._get_summary(),
-        }
-
-    def _has_field(self, field: str):
-        if not hasattr(self.entry_data, field):
-            return False
-        return getattr(self.entry_data, field, False)
-
-    def _get_content(self) -> str:
-        """Get the data for the content field of the Entry."""
-        if self._has_field("content"):
-            field = self.entry_data.content
-        elif self._has_field("description"):
-            field = self.entry_data.description
-        else:
-            raise ContentErrorException("content")
-
-        return self._clean(field)
-
-    def _get_summary(self) -> str:
-        """Get the data for the summary field of the Entry."""
-        if self._has_field("summary_detail"):
-            field = self.entry_data.summary_detail
-        elif self._has_field("summary"):
-            field = self.entry_data.summary
-        else:
-            raise ContentErrorException("summary")
-
-        return self._clean(field)
-
-    def _clean(self, field) -> str:
-        """Clean the given field and return a sanitized string.
-
-        This function is currently the dumping ground for dirt.
-        The argument `field` may be of varying type depending on which
-        feedparser field we've determined to be appropriate.
-        """
-        content = field
-
-        # TODO will this correctly handle multi part atom instances?
-        if isinstance(field, list):
-            content = "".join(f["value"] for f in field)
-        elif isinstance(field, feedparser.FeedParserDict):
-            content = field["value"]
-
-        cleaned = clean_content(content)
-        return cleaned.article
+from feedzero.ingest.utils import (
+    bulk_get_or_create_tags,
+    get_content_hash,
+    get_or_create_tags,
+)
+from feedzero.rules.jobs import queue_rule_application
 
 
 class RSSParser:
     def __init__(self, feed: Feed):
         """Initialise feed as a constant (lol constants in python)."""
         self.FEED = feed
+        self.created_ids = []
+        # measurements of the parse, in seconds for times, see IngestMetric
+        self.metrics = {
+            "entries_seen": 0,
+            "entries_new": 0,
+            "entries_failed": 0,
+            "unchanged": 0,
+            "parse_time": 0,
+            "db_time": 0,
+        }
+
+    @contextmanager
+    def timed(self, metric: str):
+        """Add the seconds spent within the block to the metric."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.metrics[metric] += time.perf_counter() - started
 
     def get_entries_to_process(self, entries: List[feedparser.FeedParserDict]):
         """Yield entries which don't currently exist.
 
-        Could potentially instead return a list comp. Think this uses less memory.
+        Existing guids are loaded in a single query up front, rather than one per entry.
         TODO we need to be able to update existing entries?
         """
+        self.metrics["entries_seen"] = len(entries)
+        guids = [entry.id for entry in entries]
+        existing = set(
+            Entry.objects.filter(feed=self.FEED, guid__in=guids).values_list(
+                "guid", flat=True
+            )
+        )
         for entry in entries:
-            if not Entry.objects.filter(guid=entry.id, feed=self.FEED).exists():
-                yield entry
+            if entry.id in existing:
+                continue
+            # a document may repeat a guid, only the first occurrence is new
+            existing.add(entry.id)
+            yield entry
 
-    def parse(self, response: requests.Response, should_enrich=True):
-        """Parse the RSS feed response into the database.
+    def parse(self, response: requests.Response, should_enrich=True, bulk=False) -> int:
+        """Parse the RSS feed response into the database, returning entries created.
 
-        TODO this function needs to be smaller
+        In bulk mode new entries are validated in memory and written with a handful
+        of statements for the whole document, rather than several queries per entry.
+        A body identical to the last one parsed without errors is logged as unchanged
+        and not parsed again, for servers which ignore conditional requests.
         """
+        if self.is_unchanged(response.text):
+            return 0
+
+        with self.timed("parse_time"):
+            entries = parse_document(response.text)
+        if bulk:
+            new_entries = list(self.get_entries_to_process(entries))
+            with self.timed("parse_time"):
+                extracted, errors = extract_entries(new_entries)
+            return self.write(response, extracted, errors, should_enrich)
+
+        # extraction is interleaved with the writes, so is counted as database time
+        with self.timed("db_time"):
+            has_errored = self.insert_individually(entries, response, should_enrich)
+        return self.finish(response, has_errored)
+
+    def is_unchanged(self, body: str) -> bool:
+        """Log the body as unchanged if it's the same as the last one parsed."""
+        if get_content_hash(body) != self.FEED.content_hash:
+            return False
+        logger.debug(f"{self.FEED.link} is unchanged since the last scrape")
+        IngestLog.objects.create(state=IngestLog.STATE_UNCHANGED, feed=self.FEED)
+        self.metrics["unchanged"] = 1
+        return True
+
+    def write(
+        self, response, extracted: List[dict], errors: List[str], should_enrich=True
+    ) -> int:
+        """Write entries extracted from the response in bulk, returning those created.
+
+        This is the part of a bulk parse needing the database, the extraction having
+        been done beforehand, possibly by another process.
+        """
+        with self.timed("db_time"):
+            has_errored = self.insert_in_bulk(
+                extracted, errors, response, should_enrich
+            )
+        return self.finish(response, has_errored)
+
+    def finish(self, response, has_errored: bool) -> int:
+        """Log the outcome of the parse and queue rules for the entries created."""
+        self.metrics["entries_new"] = len(self.created_ids)
+        log_state = IngestLog.STATE_PARTIAL if has_errored else IngestLog.STATE_SUCCESS
+        IngestLog.objects.create(state=log_state, feed=self.FEED)
+
+        # entries which failed should be retried, even if the body doesn't change
+        if not has_errored:
+            content_hash = get_content_hash(response.text)
+            self.FEED.content_hash = content_hash
+            Feed.objects.filter(pk=self.FEED.pk).update(content_hash=content_hash)
+
+        if self.created_ids:
+            queue_rule_application(self.FEED, self.created_ids)
+        return len(self.created_ids)
+
+    def insert_individually(
+        self, entries: List[feedparser.FeedParserDict], response, should_enrich=True
+    ) -> bool:
+        """Save each new entry in turn, returning whether any of them failed."""
         entry_parser = None
-        data = feedparser.parse(response.text)
         has_errored = False
 
-        for entry in self.get_entries_to_process(data.entries):
+        for entry in self.get_entries_to_process(entries):
             logger.info(f"New entry {entry.id} found for feed {self.FEED.title}")
             try:
                 if not entry_parser:
@@ -116,25 +145,131 @@ class RSSParser:
 
                 db_entry = Entry(feed=self.FEED, **entry_extract)
                 db_entry.full_clean()
-                db_entry.save()
+                # extract has already reduced the summary to text
+                db_entry.save(sanitize=False)
+                self.created_ids.append(db_entry.pk)
 
                 tags = get_or_create_tags(entry, self.FEED)
                 if len(tags) > 0:
                     db_entry.tags.add(*tags)
-                    # TODO is this save call needed?
-                    db_entry.save()
 
                 if should_enrich:
-                    # TODO multiple enrichers need some logic here to get the appropriate one
-                    SimpleEnricher(db_entry).enrich()
+                    queue_enrichment(db_entry)
+
+            except Exception:
+                logger.exception("Failed to parse entry.", exc_info=True)
+                has_errored = True
+                self.log_failure(response)
+                continue
+
+        return has_errored
+
+    def insert_in_bulk(
+        self, extracted: List[dict], errors: List[str], response, should_enrich=True
+    ) -> bool:
+        """Validate extracted entries in memory and write them together.
+
+        Entries which failed extraction or fail validation are logged and skipped, as
+        they would be individually. Should the write itself fail, e.g. a concurrent
+        sync inserted one of the entries, fall back to saving each in turn.
+        """
+        has_errored = bool(errors)
+        for error in errors:
+            logger.error(f"Failed to parse entry.\n{error}")
+            self.log_failure(response)
 
+        prepared = []
+        for fields in extracted:
+            logger.info(f"New entry {fields['guid']} found for feed {self.FEED.title}")
+            fields = dict(fields)
+            tags = fields.pop("tags")
+            try:
+                db_entry = Entry(feed=self.FEED, **fields)
+                # the feed is known to exist and get_entries_to_process has already
+                # established uniqueness, so skip the queries validating either
+                db_entry.full_clean(exclude=["feed"], validate_unique=False)
+                prepared.append((db_entry, tags))
             except Exception:
                 logger.exception("Failed to parse entry.", exc_info=True)
                 has_errored = True
-                IngestLog.objects.create(
-                    state=IngestLog.STATE_FAILED, feed=self.FEED, body=response.text
+                self.log_failure(response)
+
+        if not prepared:
+            return has_errored
+
+        try:
+            with transaction.atomic():
+                db_entries = self.write_entries(prepared)
+        except IntegrityError:
+            logger.exception(
+                f"Bulk insert failed for feed {self.FEED.title}, inserting individually.",
+                exc_info=True,
+            )
+            failed = self.save_individually(prepared, response, should_enrich)
+            return has_errored or failed
+
+        self.created_ids += [db_entry.pk for db_entry in db_entries]
+        if should_enrich:
+            for db_entry in db_entries:
+                queue_enrichment(db_entry)
+
+        return has_errored
+
+    def write_entries(self, prepared: List[Tuple[Entry, List[dict]]]):
+        """Insert the prepared entries, their tags and the entry to tag relations."""
+        db_entries = [db_entry for db_entry, _ in prepared]
+        Entry.assign_slugs(db_entries)
+        db_entries = Entry.objects.bulk_create(db_entries)
+        UnreadCount.objects.increment_feed(self.FEED.pk, len(db_entries))
+
+        tags = bulk_get_or_create_tags(
+            [tag for _, entry_tags in prepared for tag in entry_tags], self.FEED
+        )
+        relations = []
+        for db_entry, entry_tags in prepared:
+            for term in {tag["term"] for tag in entry_tags}:
+                relations.append(
+                    Entry.tags.through(entry_id=db_entry.pk, tag_id=tags[term].pk)
                 )
+        Entry.tags.through.objects.bulk_create(relations)
+        return db_entries
+
+    def save_individually(
+        self, prepared: List[Tuple[Entry, List[dict]]], response, should_enrich=True
+    ) -> bool:
+        """Save each prepared entry in turn, returning whether any of them failed."""
+        guids = [db_entry.guid for db_entry, _ in prepared]
+        existing = set(
+            Entry.objects.filter(feed=self.FEED, guid__in=guids).values_list(
+                "guid", flat=True
+            )
+        )
+        has_errored = False
+
+        for db_entry, entry_tags in prepared:
+            if db_entry.guid in existing:
                 continue
+            try:
+                with transaction.atomic():
+                    db_entry.save(sanitize=False)
+                    tags = bulk_get_or_create_tags(entry_tags, self.FEED)
+                    if tags:
+                        db_entry.tags.add(*tags.values())
+                self.created_ids.append(db_entry.pk)
 
-        log_state = IngestLog.STATE_PARTIAL if has_errored else IngestLog.STATE_SUCCESS
-        IngestLog.objects.create(state=log_state, feed=self.FEED)
+                if should_enrich:
+                    queue_enrichment(db_entry)
+
+            except Exception:
+                logger.exception("Failed to parse entry.", exc_info=True)
+                has_errored = True
+                self.log_failure(response)
+
+        return has_errored
+
+    def log_failure(self, response):
+        """Store the response body so problematic documents can be investigated."""
+        self.metrics["entries_failed"] += 1
+        IngestLog.objects.create(
+            state=IngestLog.STATE_FAILED, feed=self.FEED, body=response.text
+        )
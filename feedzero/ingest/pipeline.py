@@ -0,0 +1,88 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+import multiprocessing
+from typing import Dict, List
+
+from django.conf import settings
+from loguru import logger
+
+from feedzero.ingest.extract import extract_entries, parse_document, timed
+from feedzero.ingest.parser import RSSParser
+
+
+class InlineExecutor(Executor):
+    """Run each call as it's submitted, for when no parse processes are configured."""
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def get_executor(size: int) -> Executor:
+    """Get a pool of up to INGEST_PARSE_PROCESSES processes for size documents.
+
+    Processes are spawned rather than forked, so they never inherit the database
+    connection, and as they never set up Django they can't open their own. Every
+    worker running sync_feeds starts its own pool, so across the workers there can
+    be as many as workers x INGEST_PARSE_PROCESSES.
+    """
+    processes = min(settings.INGEST_PARSE_PROCESSES, size)
+    if processes < 1:
+        return InlineExecutor()
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def parse_responses(responses: List, should_enrich=True) -> Dict[int, RSSParser]:
+    """Parse a batch of fetched feed bodies into the database.
+
+    Documents are parsed, and their new entries extracted, in a pool of processes so
+    the work isn't held up by the GIL. This process only checks which entries exist
+    and writes the new ones, so there's still the one database connection however
+    many cores parse. Returns the parser of each document keyed by feed pk, for
+    the entries it created and its metrics, leaving out feeds which failed to parse.
+    """
+    parsed = {}
+    pending = []
+    for response in responses:
+        parser = RSSParser(response.feed)
+        if parser.is_unchanged(response.text):
+            parsed[response.feed.pk] = parser
+        else:
+            pending.append((parser, response))
+    if not pending:
+        return parsed
+
+    with get_executor(len(pending)) as executor:
+        documents = [
+            executor.submit(timed, parse_document, response.text)
+            for _, response in pending
+        ]
+        extractions = []
+        for (parser, response), document in zip(pending, documents):
+            try:
+                entries, seconds = document.result()
+                parser.metrics["parse_time"] += seconds
+                entries = list(parser.get_entries_to_process(entries))
+            except Exception:
+                logger.exception(f"Failed to parse {response.feed.link}", exc_info=True)
+                continue
+            extraction = executor.submit(timed, extract_entries, entries)
+            extractions.append((parser, response, extraction))
+
+        for parser, response, extraction in extractions:
+            try:
+                (extracted, errors), seconds = extraction.result()
+                parser.metrics["parse_time"] += seconds
+                parser.write(response, extracted, errors, should_enrich)
+                parsed[response.feed.pk] = parser
+            except Exception:
+                logger.exception(
+                    f"Failed to sync feed {response.feed.link}", exc_info=True
+                )
+
+    return parsed
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from feedzero.feeds.models import Feed
+from feedzero.ingest.models import IngestLog
+
+# the fields schedule_after_scrape sets, for callers saving only what they change
+SCHEDULE_FIELDS = ["unchanged_scrapes", "next_scrape_at"]
+
+
+def get_publish_interval(feed: Feed) -> Optional[timedelta]:
+    """Return the median gap between the feed's most recently published entries."""
+    dates = list(
+        feed.entries.filter(date_published__isnull=False)
+        .order_by("-date_published")
+        .values_list("date_published", flat=True)[
+            : settings.INGEST_SCHEDULE_SAMPLE_SIZE
+        ]
+    )
+    gaps = [newer - older for newer, older in zip(dates, dates[1:])]
+    if not gaps:
+        return None
+    return median(gaps)
+
+
+def get_failure_streak(feed: Feed) -> int:
+    """Count the feed's consecutive most recent ingest logs that were failed syncs.
+
+    A sync fails if the feed isn't responding, or if syncing it raised. Entries
+    failing within a parse are followed by a partial log, so don't count.
+    """
+    # anything beyond this many failures is already backed off to the dead interval
+    limit = 32
+    states = feed.ingest_logs.order_by("-date_created").values_list("state", flat=True)[
+        :limit
+    ]
+    streak = 0
+    for state in states:
+        if state not in (IngestLog.STATE_NOT_RESPONDING, IngestLog.STATE_FAILED):
+            break
+        streak += 1
+    return streak
+
+
+def clamp_interval(interval: timedelta) -> timedelta:
+    """Keep an interval within the configured minimum and maximum."""
+    minimum = timedelta(minutes=settings.INGEST_SCHEDULE_MIN_INTERVAL)
+    maximum = timedelta(minutes=settings.INGEST_SCHEDULE_MAX_INTERVAL)
+    return max(minimum, min(interval, maximum))
+
+
+def get_scrape_interval(feed: Feed) -> timedelta:
+    """Return the interval a responding feed should be scraped at.
+
+    Each scrape in a row which found nothing new doubles the interval, up to the
+    configured maximum.
+    """
+    interval = get_publish_interval(feed) or timedelta(
+        minutes=settings.INGEST_SCHEDULE_DEFAULT_INTERVAL
+    )
+    # beyond this many doublings any interval has passed the maximum
+    backoff = 2 ** min(feed.unchanged_scrapes, 16)
+    return clamp_interval(interval * backoff)
+
+
+def get_failure_interval(feed: Feed) -> timedelta:
+    """Return the interval a feed whose syncs are failing should be retried at.
+
+    The default interval doubles with each consecutive failure, up to the dead
+    interval, so feeds that have gone away are only checked occasionally.
+    """
+    streak = max(get_failure_streak(feed), 1)
+    interval = timedelta(minutes=settings.INGEST_SCHEDULE_DEFAULT_INTERVAL) * (
+        2 ** min(streak - 1, 16)
+    )
+    return min(interval, timedelta(minutes=settings.INGEST_SCHEDULE_DEAD_INTERVAL))
+
+
+def schedule_after_scrape(feed: Feed, found_new: bool, now: datetime = None):
+    """Set when the feed is next due after a scrape which got a response.
+
+    The feed is not saved, as callers save it along with the rest of the scrape.
+    """
+    now = now or timezone.now()
+    feed.unchanged_scrapes = 0 if found_new else feed.unchanged_scrapes + 1
+    feed.next_scrape_at = now + get_scrape_interval(feed)
+
+
+def schedule_after_failure(feed: Feed, now: datetime = None):
+    """Set and save when the feed is next due after it failed to sync.
+
+    Should be called once the not responding or failed state has been logged.
+    """
+    now = now or timezone.now()
+    feed.next_scrape_at = now + get_failure_interval(feed)
+    Feed.objects.filter(pk=feed.pk).update(next_scrape_at=feed.next_scrape_at)
+
+
+def schedule_after_throttle(feed: Feed, delay: float, now: datetime = None):
+    """Set and save when the feed is next due after its host held back a request.
+
+    The delay in seconds comes from our own rate limit or the host's Retry-After.
+    """
+    now = now or timezone.now()
+    feed.next_scrape_at = now + timedelta(seconds=delay)
+    Feed.objects.filter(pk=feed.pk).update(next_scrape_at=feed.next_scrape_at)
@@ -1,3 +1,7 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
 from model_mommy import mommy
 import pytest
 
@@ -15,3 +19,123 @@ def ingest_log_factory():
         return mommy.make(IngestLog, feed=feed, **kwargs)
 
     return _make
+
+
+class FeedStandInHandler(BaseHTTPRequestHandler):
+    """Serve a fixed body for any path, honouring If-None-Match against a fixed ETag.
+
+    Connections are kept alive between requests, as remote hosts would.
+    """
+
+    protocol_version = "HTTP/1.1"
+    ETAG = '"standin"'
+    BODY = b"<rss><channel><title>Stand in</title></channel></rss>"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append((self.path, dict(self.headers)))
+            server.connections.add(self.client_address)
+        try:
+            time.sleep(server.delay)
+            if self.headers.get("If-None-Match") == self.ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+            self.send_header("Content-Length", str(len(self.BODY)))
+            self.send_header("ETag", self.ETAG)
+            self.end_headers()
+            self.wfile.write(self.BODY)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server_factory():
+    """Start local HTTP stand-ins for remote hosts, each stopped after the test.
+
+    Each tracks its requests, the connections they arrived on and how many were
+    served at once. Every request is answered after the given delay in seconds.
+    """
+    servers = []
+
+    def _start(delay=0):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FeedStandInHandler)
+        server.lock = threading.Lock()
+        server.in_flight = 0
+        server.max_in_flight = 0
+        server.requests = []
+        server.connections = set()
+        server.delay = delay
+        server.url = f"http://127.0.0.1:{server.server_address[1]}"
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append(server)
+        return server
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def feed_server(stand_in_server_factory):
+    """A stand-in for remote feeds, slow enough for requests to overlap."""
+    return stand_in_server_factory(delay=0.05)
+
+
+@pytest.fixture
+def rss_document_factory():
+    """Build an RSS document with the given number of items."""
+
+    def _make(count=5, title="Entry", tags=("news",), guid_prefix="guid"):
+        items = []
+        for i in range(count):
+            categories = "".join(f"<category>{tag}</category>" for tag in tags)
+            items.append(
+                f"""
+                <item>
+                    <title>{title} {i}</title>
+                    <link>https://tightenupthe.tech/{guid_prefix}/{i}</link>
+                    <guid>{guid_prefix}-{i}</guid>
+                    <pubDate>Wed, 21 Oct 2015 07:28:00 GMT</pubDate>
+                    <description>&lt;p&gt;Content {i}&lt;/p&gt;</description>
+                    {categories}
+                </item>
+                """
+            )
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+        <rss version="2.0">
+            <channel>
+                <title>Test feed</title>
+                <link>https://tightenupthe.tech</link>
+                <description>Test feed</description>
+                {"".join(items)}
+            </channel>
+        </rss>
+        """
+
+    return _make
+
+
+@pytest.fixture
+def rss_response_factory(mocker, rss_document_factory):
+    """Mock a feed response, wrapping a generated RSS document."""
+
+    def _make(**kwargs):
+        response = mocker.Mock()
+        response.status_code = 200
+        response.headers = {}
+        response.text = rss_document_factory(**kwargs)
+        return response
+
+    return _make
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+import pytest
+
+from feedzero.ingest.models import IngestLog, IngestMetric
+
+
+@pytest.mark.django_db
+class TestBenchmarkSanitize:
+    def test_times_feed_documents(self, tmp_path, rss_document_factory, capsys):
+        """Should sanitize the content and summary of each entry in the feeds."""
+        path = tmp_path / "feed.xml"
+        path.write_text(rss_document_factory(count=3))
+        call_command("benchmark_sanitize", str(path), repeat=1)
+        assert "Sanitized 6 documents" in capsys.readouterr().out
+
+    def test_uses_ingest_log_bodies(self, feed, rss_document_factory, capsys):
+        """Should build the corpus from stored responses when asked to."""
+        IngestLog.objects.create(
+            feed=feed, state=IngestLog.STATE_FAILED, body=rss_document_factory(count=2)
+        )
+        call_command("benchmark_sanitize", logs=10, repeat=1)
+        assert "Sanitized 4 documents" in capsys.readouterr().out
+
+    def test_raises_without_documents(self):
+        """Should fail when there is nothing to sanitize."""
+        with pytest.raises(CommandError):
+            call_command("benchmark_sanitize")
+
+
+@pytest.mark.django_db
+class TestRollupIngestMetrics:
+    def test_rolls_up_and_prunes(self, settings, feed, capsys):
+        """Should roll up old hours and delete metrics and logs past retention."""
+        now = timezone.now()
+        IngestMetric.objects.record(feed.pk, now - timedelta(days=8), syncs=1)
+        IngestMetric.objects.record(feed.pk, now - timedelta(days=100), syncs=1)
+        IngestMetric.objects.record(feed.pk, now, syncs=1)
+        log = IngestLog.objects.create(feed=feed, state=IngestLog.STATE_SUCCESS)
+        IngestLog.objects.filter(pk=log.pk).update(
+            date_created=now - timedelta(days=31)
+        )
+
+        call_command("rollup_ingest_metrics")
+        assert "Rolled up 2 hourly metrics" in capsys.readouterr().out
+        periods = IngestMetric.objects.values_list("period", flat=True)
+        assert sorted(periods) == [IngestMetric.PERIOD_DAY, IngestMetric.PERIOD_HOUR]
+        assert not IngestLog.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSlowestFeeds:
+    def test_lists_slowest_feeds(self, feed_factory, capsys):
+        """Should list feeds slowest first."""
+        slow = feed_factory(title="Slow feed")
+        fast = feed_factory(title="Fast feed")
+        IngestMetric.objects.record(slow.pk, syncs=1, parse_time=2)
+        IngestMetric.objects.record(fast.pk, syncs=1, parse_time=1)
+        call_command("slowest_feeds", by="parse_time")
+        out = capsys.readouterr().out
+        assert out.index("Slow feed") < out.index("Fast feed")
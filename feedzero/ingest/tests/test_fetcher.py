@@ -0,0 +1,227 @@
+import io
+
+from django.utils import timezone
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from feedzero.ingest.exceptions import ResponseTooLargeException
+from feedzero.ingest.fetcher import AsyncFeedFetcher, BodyReader, read_response
+from feedzero.ingest.jobs import sync_feeds
+from feedzero.ingest.models import IngestLog, IngestMetric
+from feedzero.ingest.parser import RSSParser
+
+
+@pytest.mark.django_db
+class TestAsyncFeedFetcher:
+    @pytest.fixture
+    def served_feeds(self, feed_server, feed_factory):
+        return [feed_factory(link=f"{feed_server.url}/feed/{i}") for i in range(8)]
+
+    def test_fetches_every_feed(self, feed_server, served_feeds):
+        """Should return a result for every feed, in the order supplied."""
+        results = AsyncFeedFetcher().fetch(served_feeds)
+        assert [result.feed for result in results] == served_feeds
+        for result in results:
+            assert result.error is None
+            assert result.status_code == 200
+            assert result.text == feed_server.RequestHandlerClass.BODY.decode()
+
+    def test_exposes_response_headers(self, feed_server, served_feeds):
+        """Headers should be accessible case insensitively, as with requests."""
+        results = AsyncFeedFetcher().fetch(served_feeds[:1])
+        assert results[0].headers.get("etag") == '"standin"'
+
+    def test_sends_conditional_headers(self, feed_server, served_feeds):
+        """Should send stored validators so the server can respond 304."""
+        feed = served_feeds[0]
+        feed.etag = '"standin"'
+        results = AsyncFeedFetcher().fetch([feed])
+        assert results[0].status_code == 304
+
+    def test_respects_per_host_limit(self, feed_server, served_feeds):
+        """Should never have more than the per host limit in flight to one host."""
+        AsyncFeedFetcher(concurrency=100, per_host=2).fetch(served_feeds)
+        assert len(feed_server.requests) == len(served_feeds)
+        assert feed_server.max_in_flight <= 2
+
+    def test_respects_global_limit(self, feed_server, served_feeds):
+        """Should never have more than the global limit in flight."""
+        AsyncFeedFetcher(concurrency=3, per_host=100).fetch(served_feeds)
+        assert feed_server.max_in_flight <= 3
+
+    def test_fetches_concurrently(self, feed_server, served_feeds):
+        """Should have more than one request in flight at a time."""
+        AsyncFeedFetcher(concurrency=100, per_host=100).fetch(served_feeds)
+        assert feed_server.max_in_flight > 1
+
+    def test_connection_failure_captured_on_result(self, feed_factory):
+        """Should not raise if a feed cannot be reached."""
+        feed = feed_factory(link="http://127.0.0.1:1/unreachable")
+        results = AsyncFeedFetcher().fetch([feed])
+        assert results[0].error is not None
+        assert results[0].status_code is None
+
+    def test_oversized_body_captured_on_result(self, feed_server, feed_factory):
+        """Should abandon bodies over the size limit rather than read them."""
+        feed = feed_factory(link=f"{feed_server.url}/feed/1")
+        results = AsyncFeedFetcher(max_bytes=10).fetch([feed])
+        assert isinstance(results[0].error, ResponseTooLargeException)
+        assert results[0].text == ""
+
+
+class TestBodyReader:
+    def test_decodes_split_characters(self):
+        """Should decode characters split across chunks."""
+        body = "<rss>caf\u00e9</rss>".encode("utf-8")
+        reader = BodyReader("utf-8")
+        for i in range(len(body)):
+            reader.feed(body[i : i + 1])
+        assert reader.read() == "<rss>caf\u00e9</rss>"
+
+    def test_uses_xml_declared_encoding(self):
+        """Should fall back to the encoding in the XML declaration."""
+        body = '<?xml version="1.0" encoding="iso-8859-1"?><rss>\u00e9</rss>'
+        reader = BodyReader()
+        reader.feed(body.encode("iso-8859-1"))
+        assert reader.read() == body
+
+    def test_waits_for_xml_declaration(self):
+        """Should find the declared encoding when it's split across chunks."""
+        body = '<?xml version="1.0" encoding="iso-8859-1"?><rss>\u00e9</rss>'
+        reader = BodyReader()
+        for i in range(len(body)):
+            reader.feed(body[i : i + 1].encode("iso-8859-1"))
+        assert reader.read() == body
+
+    @pytest.mark.parametrize("encoding", ["utf-16", "utf-8-sig"])
+    def test_detects_byte_order_mark(self, encoding):
+        """Should decode a body starting with a byte order mark in its encoding."""
+        body = "<rss>caf\u00e9</rss>" * 500
+        reader = BodyReader()
+        reader.feed(body.encode(encoding))
+        assert reader.read() == body
+
+    def test_detects_undeclared_encoding(self):
+        """Should detect a body which isn't utf-8, rather than replacing characters."""
+        body = "<rss><title>Caf\u00e9 et cr\u00eapes</title></rss>"
+        reader = BodyReader()
+        reader.feed(body.encode("iso-8859-1"))
+        text = reader.read()
+        assert "Caf\u00e9" in text
+        assert "\ufffd" not in text
+
+    def test_refuses_oversized_body(self):
+        """Should raise as soon as the body is over the limit."""
+        reader = BodyReader("utf-8", max_bytes=5)
+        reader.feed(b"12345")
+        with pytest.raises(ResponseTooLargeException):
+            reader.feed(b"6")
+
+    def test_refuses_oversized_content_length(self):
+        """Should raise before reading if the declared length is over the limit."""
+        reader = BodyReader("utf-8", max_bytes=5)
+        with pytest.raises(ResponseTooLargeException):
+            reader.check_length({"Content-Length": "6"})
+
+
+@pytest.mark.django_db
+class TestReadResponse:
+    @pytest.fixture
+    def response_factory(self):
+        def _make(body: bytes, content_type: str):
+            response = requests.Response()
+            response.status_code = 200
+            response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+            response.raw = io.BytesIO(body)
+            return response
+
+        return _make
+
+    def test_uses_xml_declared_encoding_for_text_types(self, feed, response_factory):
+        """Should not take text types without a charset to be ISO-8859-1."""
+        body = '<?xml version="1.0" encoding="utf-8"?><rss>caf\u00e9</rss>'
+        response = response_factory(body.encode("utf-8"), "text/xml")
+        assert read_response(feed, response).text == body
+
+    def test_uses_declared_charset(self, feed, response_factory):
+        """Should prefer the charset the Content-Type declares."""
+        body = '<?xml version="1.0" encoding="utf-8"?><rss>caf\u00e9</rss>'
+        response = response_factory(
+            body.encode("iso-8859-1"), "text/xml; charset=ISO-8859-1"
+        )
+        assert read_response(feed, response).text == body
+
+
+@pytest.mark.django_db
+class TestSyncFeeds:
+    @pytest.fixture
+    def mocked_parse(self, mocker):
+        return mocker.patch(
+            "feedzero.ingest.jobs.parse_responses",
+            side_effect=lambda results: {
+                result.feed.pk: RSSParser(result.feed) for result in results
+            },
+        )
+
+    def test_parses_fetched_bodies(self, mocked_parse, feed_server, feed_factory):
+        """Should hand the fetched bodies to the parse pipeline together."""
+        feeds = [feed_factory(link=f"{feed_server.url}/feed/{i}") for i in range(3)]
+        sync_feeds([feed.pk for feed in feeds])
+        assert mocked_parse.call_count == 1
+        assert [result.feed for result in mocked_parse.call_args[0][0]] == feeds
+
+    def test_parses_individually_without_bulk_create(
+        self, settings, mocker, mocked_parse, feed_server, feed_factory
+    ):
+        """Should parse each body in turn if bulk inserts are turned off."""
+        settings.INGEST_BULK_CREATE = False
+        parse = mocker.patch("feedzero.ingest.jobs.RSSParser.parse", return_value=0)
+        feeds = [feed_factory(link=f"{feed_server.url}/feed/{i}") for i in range(3)]
+        sync_feeds([feed.pk for feed in feeds])
+        assert parse.call_count == 3
+        assert not mocked_parse.called
+
+    def test_logs_unreachable_feeds(self, mocked_parse, feed_factory):
+        """Should log a not responding state for feeds which could not be fetched."""
+        feed = feed_factory(link="http://127.0.0.1:1/unreachable")
+        sync_feeds([feed.pk])
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_NOT_RESPONDING
+        ).exists()
+
+    def test_stores_validators(self, mocked_parse, feed_server, feed_factory):
+        """Should store the validators from each response on the feed."""
+        feed = feed_factory(link=f"{feed_server.url}/feed/1")
+        sync_feeds([feed.pk])
+        feed.refresh_from_db()
+        assert feed.etag == '"standin"'
+
+    def test_backs_off_feeds_which_fail_to_parse(
+        self, mocker, feed_server, feed_factory
+    ):
+        """Should log and reschedule a feed whose parse raised, not leave it due."""
+        mocker.patch("feedzero.ingest.jobs.parse_responses", return_value={})
+        feed = feed_factory(link=f"{feed_server.url}/feed/1")
+        sync_feeds([feed.pk])
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_FAILED
+        ).exists()
+        metric = IngestMetric.objects.get(feed=feed)
+        assert (metric.syncs, metric.errors) == (1, 1)
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now()
+
+    def test_backs_off_feeds_which_fail_checks(
+        self, mocker, mocked_parse, feed_server, feed_factory
+    ):
+        """Should log and reschedule a feed whose response handling raised."""
+        mocker.patch(
+            "feedzero.ingest.jobs.check_feed_response", side_effect=ValueError("oops")
+        )
+        feed = feed_factory(link=f"{feed_server.url}/feed/1")
+        sync_feeds([feed.pk])
+        log = IngestLog.objects.get(feed=feed, state=IngestLog.STATE_FAILED)
+        assert "ValueError" in log.body
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now()
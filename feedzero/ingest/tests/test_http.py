@@ -0,0 +1,87 @@
+from model_mommy import mommy
+import pytest
+from rq import Queue
+from rq.job import JobStatus
+
+from feedzero.core.workers import SimpleWorker
+from feedzero.feeds.models import Entry
+from feedzero.ingest import http
+from feedzero.ingest.constants import REQUESTS_USER_AGENT
+from feedzero.ingest.enricher.jobs import enrich_entry
+
+
+@pytest.fixture
+def page_server(stand_in_server_factory):
+    return stand_in_server_factory()
+
+
+@pytest.fixture(autouse=True)
+def sessions():
+    yield
+    http.close_sessions()
+
+
+class TestSessions:
+    def test_reuses_session_per_host(self):
+        """Should hand out the same session for urls on the same host."""
+        session = http.get_session("https://example.com/a")
+        assert http.get_session("https://EXAMPLE.com/b") is session
+        assert http.get_session("https://example.org/a") is not session
+
+    def test_closes_least_recently_used(self, settings):
+        """Should only keep the configured number of sessions open."""
+        settings.HTTP_MAX_SESSIONS = 2
+        first = http.get_session("https://one.example.com")
+        http.get_session("https://two.example.com")
+        http.get_session("https://one.example.com")
+        http.get_session("https://three.example.com")
+        assert http.get_session("https://one.example.com") is first
+        assert len(http._local.sessions) == 2
+        assert "two.example.com" not in http._local.sessions
+
+    def test_sends_user_agent(self, page_server):
+        """Should send the feedzero user agent by default."""
+        http.get(page_server.url)
+        [(_, headers)] = page_server.requests
+        assert headers["User-Agent"] == REQUESTS_USER_AGENT
+
+    def test_reuses_connections(self, page_server):
+        """Should make many requests to a host over a single connection."""
+        for i in range(40):
+            assert http.get(f"{page_server.url}/article/{i}").status_code == 200
+        assert len(page_server.connections) == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_reuses_connections_across_jobs(self, fake_redis, page_server, entry):
+        """Should keep a host's connection open between the worker's enrichment jobs."""
+        entries = [
+            mommy.make(
+                Entry,
+                feed=entry.feed,
+                link=f"{page_server.url}/article/{i}",
+                summary="Summary",
+            )
+            for i in range(3)
+        ]
+        queue = Queue("enrichment", connection=fake_redis)
+        jobs = [queue.enqueue(enrich_entry, entry.pk) for entry in entries]
+        SimpleWorker([queue], connection=fake_redis).work(burst=True)
+        assert all(job.get_status() == JobStatus.FINISHED for job in jobs)
+        assert len(page_server.connections) == 1
+
+    def test_sets_default_timeout(self, mocker):
+        """Should time out requests unless told otherwise."""
+        session = mocker.Mock()
+        mocker.patch("feedzero.ingest.http.get_session", return_value=session)
+        http.get("https://example.com")
+        session.get.assert_called_with(
+            "https://example.com", timeout=http.get_timeout()
+        )
+
+    def test_jitters_retry_backoff(self, mocker):
+        """Should wait a random portion of the exponential backoff."""
+        uniform = mocker.patch("feedzero.ingest.http.random.uniform", return_value=0.3)
+        retry = http.JitteredRetry(total=3, backoff_factor=1)
+        retry = retry.increment(method="GET", url="/").increment(method="GET", url="/")
+        assert retry.get_backoff_time() == 0.3
+        assert uniform.call_args[0][0] == 0
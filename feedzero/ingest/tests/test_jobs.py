@@ -0,0 +1,377 @@
+from datetime import timedelta
+
+from django.utils import timezone
+import django_rq
+import pytest
+import requests
+
+from feedzero.feeds.models import Feed
+from feedzero.ingest.constants import REQUESTS_USER_AGENT
+from feedzero.ingest.jobs import sync_feed, sync_feeds
+from feedzero.ingest.models import IngestLog, IngestMetric
+from feedzero.ingest.throttle import HostThrottle
+
+
+def get_scheduled_jobs():
+    """Get the jobs waiting on the default queue with when each is due."""
+    queue = django_rq.get_queue()
+    registry = queue.scheduled_job_registry
+    return [
+        (queue.fetch_job(job_id), registry.get_scheduled_time(job_id))
+        for job_id in registry.get_job_ids()
+    ]
+
+
+@pytest.mark.django_db
+class TestSyncFeed:
+    @pytest.fixture
+    def response_factory(self, mocker):
+        def _make(status_code=200, text="", headers=None):
+            response = mocker.Mock()
+            response.status_code = status_code
+            response.encoding = "utf-8"
+            response.iter_content.return_value = [text.encode("utf-8")]
+            response.headers = headers or {}
+            return response
+
+        return _make
+
+    @pytest.fixture
+    def mocked_get(self, mocker, response_factory):
+        req_fn = mocker.patch("feedzero.ingest.jobs.http.get")
+        req_fn.return_value = response_factory()
+        return req_fn
+
+    @pytest.fixture
+    def mocked_parse(self, mocker):
+        return mocker.patch("feedzero.ingest.jobs.RSSParser.parse")
+
+    def test_sends_unconditional_request_without_validators(
+        self, feed, mocked_get, mocked_parse
+    ):
+        """Should only send the user agent if no validators have been stored."""
+        sync_feed(feed.pk)
+        mocked_get.assert_called_with(
+            feed.link, headers={"User-Agent": REQUESTS_USER_AGENT}, stream=True
+        )
+
+    def test_sends_conditional_headers(self, feed, mocked_get, mocked_parse):
+        """Should send the stored validators back as conditional headers."""
+        feed.etag = '"abc"'
+        feed.last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+        feed.save()
+        sync_feed(feed.pk)
+        mocked_get.assert_called_with(
+            feed.link,
+            headers={
+                "User-Agent": REQUESTS_USER_AGENT,
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+            },
+            stream=True,
+        )
+
+    def test_stores_validators_from_response(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should store the ETag and Last-Modified headers on the feed."""
+        mocked_get.return_value = response_factory(
+            headers={"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}
+        )
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert feed.etag == '"abc"'
+        assert feed.last_modified == "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    def test_not_modified_skips_parse(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should not parse the response if the server responds 304."""
+        mocked_get.return_value = response_factory(status_code=304)
+        sync_feed(feed.pk)
+        assert not mocked_parse.called
+
+    def test_not_modified_logs_state(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should log a not modified ingest state if the server responds 304."""
+        mocked_get.return_value = response_factory(status_code=304)
+        sync_feed(feed.pk)
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_NOT_MODIFIED
+        ).exists()
+
+    def test_not_modified_updates_date_last_scraped(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should still count a 304 as a scrape."""
+        mocked_get.return_value = response_factory(status_code=304)
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert feed.date_last_scraped is not None
+
+    def test_error_status_logs_not_responding(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should log a not responding state for unexpected status codes."""
+        mocked_get.return_value = response_factory(status_code=500)
+        sync_feed(feed.pk)
+        assert not mocked_parse.called
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_NOT_RESPONDING
+        ).exists()
+
+    def test_not_modified_backs_off_schedule(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should schedule the next scrape further out after a 304."""
+        mocked_get.return_value = response_factory(status_code=304)
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert feed.unchanged_scrapes == 1
+        assert feed.next_scrape_at > timezone.now()
+
+    def test_new_entries_reset_backoff(self, feed, mocked_get, mocked_parse):
+        """Should reset the backoff once a scrape finds new entries."""
+        feed.unchanged_scrapes = 3
+        mocked_parse.return_value = 1
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert feed.unchanged_scrapes == 0
+        assert feed.next_scrape_at > timezone.now()
+
+    def test_no_new_entries_backs_off_schedule(self, feed, mocked_get, mocked_parse):
+        """Should count a scrape which found no new entries as unchanged."""
+        mocked_parse.return_value = 0
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert feed.unchanged_scrapes == 1
+
+    def test_error_status_schedules_retry(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should schedule a retry for feeds which are not responding."""
+        mocked_get.return_value = response_factory(status_code=500)
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now()
+
+    def test_oversized_body_skips_parse(
+        self, settings, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should log and back off from feeds whose body is over the size limit."""
+        settings.INGEST_FETCH_MAX_BYTES = 10
+        mocked_get.return_value = response_factory(text="x" * 11)
+        sync_feed(feed.pk)
+        assert not mocked_parse.called
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_NOT_RESPONDING
+        ).exists()
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now()
+
+    @pytest.mark.parametrize("failure", ["request", "body"])
+    def test_request_error_backs_off(
+        self, feed, mocked_get, mocked_parse, response_factory, failure
+    ):
+        """Should log and back off from feeds whose request or body read raised."""
+        if failure == "request":
+            mocked_get.side_effect = requests.ConnectionError("refused")
+        else:
+            response = response_factory()
+            response.iter_content.side_effect = requests.ConnectionError("reset")
+            mocked_get.return_value = response
+        sync_feed(feed.pk)
+        assert not mocked_parse.called
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_NOT_RESPONDING
+        ).exists()
+        metric = IngestMetric.objects.get(feed=feed)
+        assert (metric.syncs, metric.errors) == (1, 1)
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now()
+
+    def test_parse_error_backs_off(self, feed, mocked_get, mocked_parse):
+        """Should log and reschedule a feed whose parse raised, then re-raise."""
+        mocked_parse.side_effect = ValueError("oops")
+        with pytest.raises(ValueError):
+            sync_feed(feed.pk)
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_FAILED
+        ).exists()
+        metric = IngestMetric.objects.get(feed=feed)
+        assert (metric.syncs, metric.errors, metric.status_2xx) == (1, 1, 1)
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now()
+
+    def test_records_metrics(self, feed, mocked_get, response_factory):
+        """Should add the fetch and parse of the sync to the feed's metrics."""
+        mocked_get.return_value = response_factory(text="<rss></rss>")
+        sync_feed(feed.pk)
+        metric = IngestMetric.objects.get(feed=feed)
+        assert (metric.syncs, metric.errors, metric.bytes_fetched) == (1, 0, 11)
+        assert metric.status_2xx == 1
+        assert metric.fetch_time > 0
+        assert metric.fetch_time == metric.fetch_time_max
+
+    def test_records_unchanged_metric(self, feed, mocked_get, response_factory):
+        """Should count syncs whose body hadn't changed since the last parse."""
+        mocked_get.side_effect = lambda *args, **kwargs: response_factory(
+            text="<rss></rss>"
+        )
+        sync_feed(feed.pk)
+        sync_feed(feed.pk)
+        metric = IngestMetric.objects.get(feed=feed)
+        assert (metric.syncs, metric.unchanged) == (2, 1)
+
+    @pytest.mark.parametrize(
+        "status_code,field,status_class",
+        [
+            (304, "not_modified", "status_3xx"),
+            (429, "throttled", "status_4xx"),
+            (500, "errors", "status_5xx"),
+        ],
+    )
+    def test_records_outcome_metrics(
+        self,
+        feed,
+        mocked_get,
+        mocked_parse,
+        response_factory,
+        status_code,
+        field,
+        status_class,
+    ):
+        """Should count syncs which ended without a body to parse by their outcome."""
+        mocked_get.return_value = response_factory(status_code=status_code)
+        sync_feed(feed.pk)
+        metric = IngestMetric.objects.get(feed=feed)
+        assert metric.syncs == 1
+        assert getattr(metric, field) == 1
+        assert getattr(metric, status_class) == 1
+
+    def test_throttled_host_defers_feed(
+        self, settings, feed, mocked_get, mocked_parse, mocker
+    ):
+        """Should reschedule rather than fetch a feed whose host is throttled."""
+        settings.RQ_ENABLED = False
+        mocker.patch.object(HostThrottle, "acquire", return_value=30)
+        sync_feed(feed.pk)
+        assert not mocked_get.called
+        feed.refresh_from_db()
+        assert (
+            timezone.now() < feed.next_scrape_at < timezone.now() + timedelta(minutes=1)
+        )
+
+    def test_throttled_host_queues_feed_again(self, settings, feed, mocked_get, mocker):
+        """Should queue the sync again for when the host will take requests."""
+        settings.RQ_ENABLED = True
+        mocker.patch.object(HostThrottle, "acquire", return_value=30)
+        sync_feed(feed.pk)
+        [(job, due)] = get_scheduled_jobs()
+        assert job.func == sync_feed
+        assert job.args == (feed.pk,)
+        assert job.kwargs == {"reserved": True}
+        assert timedelta(seconds=29) < due - timezone.now() <= timedelta(seconds=30)
+        # left for the queued job, so queue_feeds won't fetch it again meanwhile
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now() + timedelta(minutes=15)
+
+    def test_missing_feed_does_nothing(self, mocked_get):
+        """Should not raise if the feed has since been deleted."""
+        sync_feed(-1)
+        assert not mocked_get.called
+
+    def test_keeps_changes_made_during_sync(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should only save the fields the sync sets, keeping edits made meanwhile."""
+        mocked_get.return_value = response_factory(text="<rss></rss>")
+        mocked_parse.side_effect = lambda *args, **kwargs: Feed.objects.filter(
+            pk=feed.pk
+        ).update(title="Edited", scraping_enabled=False)
+        sync_feed(feed.pk)
+        feed.refresh_from_db()
+        assert (feed.title, feed.scraping_enabled) == ("Edited", False)
+        assert feed.date_last_scraped is not None
+
+    def test_too_many_requests_backs_off_host(
+        self, feed, mocked_get, mocked_parse, response_factory
+    ):
+        """Should log the feed as throttled and hold back its host for Retry-After."""
+        mocked_get.return_value = response_factory(
+            status_code=429, headers={"Retry-After": "600"}
+        )
+        sync_feed(feed.pk)
+        assert not mocked_parse.called
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_THROTTLED
+        ).exists()
+        assert not IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_NOT_RESPONDING
+        ).exists()
+        feed.refresh_from_db()
+        assert feed.next_scrape_at > timezone.now() + timedelta(minutes=9)
+        assert HostThrottle().acquire(feed.link) > 500
+
+
+@pytest.mark.django_db
+def test_sync_feeds_defers_throttled_feeds(settings, mocker, feed_factory):
+    """Should only fetch the feeds whose host has requests to spare."""
+    settings.INGEST_THROTTLE_BURST = 2
+    fetch = mocker.patch("feedzero.ingest.jobs.AsyncFeedFetcher.fetch", return_value=[])
+    feeds = [feed_factory(link=f"https://example.com/{i}") for i in range(3)]
+    sync_feeds([feed.pk for feed in feeds])
+    assert fetch.call_args[0][0] == feeds[:2]
+    feeds[2].refresh_from_db()
+    assert feeds[2].next_scrape_at > timezone.now()
+
+
+@pytest.mark.django_db
+def test_sync_feeds_queues_throttled_feeds_again(settings, mocker, feed_factory):
+    """Should queue the deferred feeds again in a batch per delay, once they're due."""
+    settings.RQ_ENABLED = True
+    delays = {"https://a.com": 0, "https://b.com": 2.5, "https://c.com": 2.1}
+    mocker.patch.object(HostThrottle, "acquire", side_effect=delays.get)
+    mocker.patch("feedzero.ingest.jobs.AsyncFeedFetcher.fetch", return_value=[])
+    feeds = [feed_factory(link=link) for link in delays]
+    sync_feeds([feed.pk for feed in feeds])
+    [(job, due)] = get_scheduled_jobs()
+    assert job.func == sync_feeds
+    assert job.args == ([feed.pk for feed in feeds[1:]],)
+    assert job.kwargs == {"reserved": True}
+    assert timedelta(seconds=2) < due - timezone.now() <= timedelta(seconds=3)
+
+
+@pytest.mark.django_db
+def test_sync_feeds_staggers_throttled_feeds(settings, mocker, feed_factory):
+    """Should give each deferred feed on a host its own slot, a batch per second."""
+    settings.RQ_ENABLED = True
+    settings.INGEST_THROTTLE_RATE = 1
+    settings.INGEST_THROTTLE_BURST = 1
+    mocker.patch("feedzero.ingest.jobs.AsyncFeedFetcher.fetch", return_value=[])
+    feeds = [feed_factory(link=f"https://example.com/{i}") for i in range(3)]
+    sync_feeds([feed.pk for feed in feeds])
+    jobs = sorted(get_scheduled_jobs(), key=lambda scheduled: scheduled[1])
+    assert [job.args for job, _ in jobs] == [([feeds[1].pk],), ([feeds[2].pk],)]
+
+
+@pytest.mark.django_db
+def test_reserved_sync_feeds_skips_throttle(mocker, feed_factory):
+    """Should fetch feeds queued again with a reserved slot without acquiring."""
+    acquire = mocker.patch.object(HostThrottle, "acquire", return_value=30)
+    fetch = mocker.patch("feedzero.ingest.jobs.AsyncFeedFetcher.fetch", return_value=[])
+    feed = feed_factory()
+    sync_feeds([feed.pk], reserved=True)
+    assert fetch.call_args[0][0] == [feed]
+    assert not acquire.called
+
+
+@pytest.mark.django_db
+def test_sync_feeds_skips_disabled_feeds(mocker, feed_factory):
+    """Should leave out feeds which were disabled after being queued."""
+    fetch = mocker.patch("feedzero.ingest.jobs.AsyncFeedFetcher.fetch", return_value=[])
+    enabled = feed_factory()
+    disabled = feed_factory(scraping_enabled=False)
+    sync_feeds([disabled.pk, enabled.pk])
+    assert fetch.call_args[0][0] == [enabled]
@@ -1,6 +1,9 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
 import pytest
 
-from feedzero.ingest.models import IngestLog
+from feedzero.ingest.models import IngestLog, IngestMetric
 
 
 @pytest.mark.django_db
@@ -17,3 +20,72 @@ class TestIngestLog:
         log2 = ingest_log_factory(feed=feed)
         feed.delete()
         assert len(IngestLog.objects.filter(pk__in=[log1.pk, log2.pk])) == 0
+
+    def test_caps_stored_body(self, settings, feed):
+        """Should truncate bodies over the configured length."""
+        settings.INGEST_LOG_MAX_BODY = 10
+        log = IngestLog.objects.create(
+            state=IngestLog.STATE_FAILED, feed=feed, body="x" * 100
+        )
+        assert log.body == "x" * 10 + "\n[truncated 90 characters]"
+
+
+@pytest.mark.django_db
+class TestIngestMetric:
+    @pytest.fixture
+    def moment(self):
+        return datetime(2019, 3, 4, 10, 30, tzinfo=timezone.utc)
+
+    def test_records_into_hourly_bucket(self, feed, moment):
+        """Should add measurements to the totals for the hour."""
+        IngestMetric.objects.record(feed.pk, moment, syncs=1, fetch_time=0.5)
+        IngestMetric.objects.record(
+            feed.pk, moment + timedelta(minutes=20), syncs=1, fetch_time=1.5
+        )
+        metric = IngestMetric.objects.get(feed=feed)
+        assert metric.period == IngestMetric.PERIOD_HOUR
+        assert metric.bucket == datetime(2019, 3, 4, 10, tzinfo=timezone.utc)
+        assert metric.syncs == 2
+        assert metric.fetch_time == 2
+
+    def test_keeps_slowest_fetch(self, feed, moment):
+        """Should keep the longest fetch time rather than adding them up."""
+        for elapsed in [0.5, 3, 1]:
+            IngestMetric.objects.record(feed.pk, moment, fetch_time_max=elapsed)
+        assert IngestMetric.objects.get(feed=feed).fetch_time_max == 3
+
+    def test_rollup_merges_hours_into_days(self, feed, moment):
+        """Should replace the hourly buckets of past days with a bucket for each day."""
+        for hour in range(3):
+            IngestMetric.objects.record(
+                feed.pk,
+                moment + timedelta(hours=hour),
+                syncs=1,
+                fetch_time_max=hour,
+                entries_new=2,
+            )
+        today = moment + timedelta(days=1)
+        IngestMetric.objects.record(feed.pk, today, syncs=1)
+
+        assert IngestMetric.objects.rollup(today) == 3
+        day = IngestMetric.objects.get(period=IngestMetric.PERIOD_DAY)
+        assert day.bucket == datetime(2019, 3, 4, tzinfo=timezone.utc)
+        assert (day.syncs, day.entries_new, day.fetch_time_max) == (3, 6, 2)
+        assert IngestMetric.objects.filter(period=IngestMetric.PERIOD_HOUR).count() == 1
+
+    def test_rollup_adds_to_existing_day(self, feed, moment):
+        """Should add late hours to a day which has already been rolled up."""
+        IngestMetric.objects.record(feed.pk, moment, syncs=2)
+        IngestMetric.objects.rollup(moment + timedelta(days=1))
+        IngestMetric.objects.record(feed.pk, moment + timedelta(hours=1), syncs=1)
+        IngestMetric.objects.rollup(moment + timedelta(days=1))
+        assert IngestMetric.objects.get().syncs == 3
+
+    def test_ranks_slowest_feeds(self, feed_factory):
+        """Should rank feeds by their average time per sync."""
+        slow, fast = feed_factory(), feed_factory()
+        IngestMetric.objects.record(slow.pk, syncs=2, fetch_time=10)
+        IngestMetric.objects.record(fast.pk, syncs=10, fetch_time=10)
+        ranking = IngestMetric.objects.slowest(timezone.now() - timedelta(days=1))
+        assert [row["feed_id"] for row in ranking] == [slow.pk, fast.pk]
+        assert ranking[0]["average"] == 5
@@ -1,9 +1,18 @@
 """TODO this file needs filling out with substantially more tests."""
+import pickle
+
+import bleach
+from django.db import IntegrityError
+import feedparser
 import maya
 import pytest
 
+from feedzero.feeds.models import Entry, Tag
 from feedzero.ingest.exceptions import ContentErrorException
+from feedzero.ingest.extract import extract_entries, parse_document
+from feedzero.ingest.models import IngestLog
 from feedzero.ingest.parser import EntryParser, RSSParser
+from feedzero.ingest.utils import get_content_hash
 
 
 class TestEntryParser:
@@ -99,20 +108,33 @@ class TestEntryParser:
             parser = EntryParser(valid_data_partial)
             parser.extract()
 
-    # TODO parametrize
-    def test_extract_cleans_content(self):
+    def test_extract_cleans_content(self, valid_data):
         """Should clean out any schmuck from the content field."""
-        pass
+        valid_data.content = (
+            '<p style="color: red">Hi <script>bad()</script><a href="/x" '
+            'onclick="bad()">there</a></p>'
+        )
+        data = EntryParser(valid_data).extract()
+        assert data["content"] == '<p>Hi bad()<a href="/x">there</a></p>'
 
     # TODO parametrize
     def test_date_published_parsing(self):
         """Should handle various date published strings."""
         pass
 
-    # TODO parametrize
-    def test_extract_cleans_summary(self):
-        """Should clean out any schmuck from the content field."""
-        pass
+    @pytest.mark.parametrize(
+        "summary",
+        [
+            "<p>Fish &amp; <b>chips</b></p>",
+            '<a title="a > b" href="/x">1 < 2</a> & <img src="y">',
+            "<div><!-- comment --><script>bad()</script>text</div>",
+        ],
+    )
+    def test_extract_cleans_summary(self, valid_data, summary):
+        """Should reduce the summary to the text bleach gives when stripping all tags."""
+        valid_data.summary_detail = summary
+        data = EntryParser(valid_data).extract()
+        assert data["summary"] == bleach.clean(summary, tags=[], strip=True).strip()
 
 
 @pytest.mark.django_db
@@ -149,6 +171,39 @@ class TestRSSParser:
         parser = RSSParser(feed=feed_factory())
         assert list(parser.get_entries_to_process([mocked_entry_1])) == [mocked_entry_1]
 
+    def test_omits_duplicated_guids_within_document(self, mocker, feed):
+        """Should only yield the first occurrence of a guid repeated in the document."""
+        mocked_entry_1 = mocker.MagicMock()
+        mocked_entry_1.id = "duplicated"
+
+        mocked_entry_2 = mocker.MagicMock()
+        mocked_entry_2.id = "duplicated"
+
+        parser = RSSParser(feed=feed)
+        entries = [mocked_entry_1, mocked_entry_2]
+        assert list(parser.get_entries_to_process(entries)) == [mocked_entry_1]
+
+    @pytest.mark.parametrize("size", [1, 10, 100])
+    def test_existence_check_constant_queries(
+        self, mocker, size, feed, entry_factory, django_assert_num_queries
+    ):
+        """Should check for existing entries in one query, whatever the feed size."""
+        existing = [entry_factory(feed=feed) for _ in range(size // 2)]
+        entries = []
+        for entry in existing:
+            mocked_entry = mocker.MagicMock()
+            mocked_entry.id = entry.guid
+            entries.append(mocked_entry)
+        for i in range(size - len(existing)):
+            mocked_entry = mocker.MagicMock()
+            mocked_entry.id = f"new-{i}"
+            entries.append(mocked_entry)
+
+        parser = RSSParser(feed=feed)
+        with django_assert_num_queries(1):
+            to_process = list(parser.get_entries_to_process(entries))
+        assert len(to_process) == size - len(existing)
+
     def test_creates_database_entry(self):
         """Should create database entry if valid data."""
         pass
@@ -172,3 +227,219 @@ class TestRSSParser:
         tests should any bugs arise.
         """
         pass
+
+
+class TestExtractEntries:
+    def test_extracts_plain_dicts(self, rss_document_factory):
+        """Should extract each entry's fields and tags into dicts which pickle."""
+        entries = parse_document(rss_document_factory(count=2, tags=("News ",)))
+        extracted, errors = extract_entries(entries)
+        assert errors == []
+        assert [fields["guid"] for fields in extracted] == ["guid-0", "guid-1"]
+        assert extracted[0]["tags"] == [{"term": "news", "scheme": None, "label": None}]
+        assert pickle.loads(pickle.dumps(extracted)) == extracted
+
+    def test_returns_failures(self, mocker, rss_document_factory):
+        """Should leave out entries which fail, returning their tracebacks."""
+        extract = EntryParser.extract
+
+        def failing_extract(parser):
+            if parser.entry_data.id == "guid-1":
+                raise ContentErrorException("content")
+            return extract(parser)
+
+        mocker.patch.object(EntryParser, "extract", failing_extract)
+        extracted, errors = extract_entries(
+            parse_document(rss_document_factory(count=3))
+        )
+        assert [fields["guid"] for fields in extracted] == ["guid-0", "guid-2"]
+        assert len(errors) == 1
+        assert "ContentErrorException" in errors[0]
+
+
+@pytest.mark.django_db
+class TestRSSParserBulk:
+    def test_creates_database_entries(self, feed, rss_response_factory):
+        """Should create an entry for every item in the document."""
+        RSSParser(feed).parse(
+            rss_response_factory(count=5), should_enrich=False, bulk=True
+        )
+        assert Entry.objects.filter(feed=feed).count() == 5
+
+    def test_matches_individual_insertion(self, feed_factory, rss_response_factory):
+        """Should store the same data as inserting each entry individually."""
+        bulk_feed = feed_factory()
+        individual_feed = feed_factory()
+        response = rss_response_factory(count=3, tags=("news", "Tech "))
+        RSSParser(bulk_feed).parse(response, should_enrich=False, bulk=True)
+        RSSParser(individual_feed).parse(response, should_enrich=False, bulk=False)
+
+        fields = ["guid", "title", "link", "content", "summary", "date_published"]
+        bulk_entries = Entry.objects.filter(feed=bulk_feed).order_by("guid")
+        individual_entries = Entry.objects.filter(feed=individual_feed).order_by("guid")
+        assert list(bulk_entries.values(*fields)) == list(
+            individual_entries.values(*fields)
+        )
+        for entry in bulk_entries:
+            assert entry.slug
+            assert sorted(tag.term for tag in entry.tags.all()) == ["news", "tech"]
+
+    def test_assigns_unique_slugs(self, feed, entry_factory, rss_response_factory):
+        """Should not reuse slugs that exist, or that were assigned in the batch."""
+        entry_factory(feed=feed, title="Entry 0")
+        RSSParser(feed).parse(
+            rss_response_factory(count=2), should_enrich=False, bulk=True
+        )
+        slugs = set(Entry.objects.filter(feed=feed).values_list("slug", flat=True))
+        assert slugs == {"entry-0", "entry-0-1", "entry-1"}
+
+    def test_reuses_existing_tags(self, feed, rss_response_factory):
+        """Should attach existing tags rather than creating duplicates."""
+        Tag.objects.create(term="news", feed=feed)
+        RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=True
+        )
+        assert Tag.objects.filter(feed=feed, term="news").count() == 1
+
+    def test_constant_queries(
+        self, feed_factory, rss_response_factory, django_assert_num_queries
+    ):
+        """Should write a document in the same number of queries, whatever its size."""
+        for count in [5, 50]:
+            feed = feed_factory()
+            response = rss_response_factory(count=count)
+            with django_assert_num_queries(11):
+                RSSParser(feed).parse(response, should_enrich=False, bulk=True)
+
+    def test_isolates_failing_entries(self, mocker, feed, rss_response_factory):
+        """Should skip and log entries which fail, inserting the remainder."""
+        extract = EntryParser.extract
+
+        def failing_extract(parser):
+            if parser.entry_data.id == "guid-1":
+                raise ContentErrorException("content")
+            return extract(parser)
+
+        mocker.patch.object(EntryParser, "extract", failing_extract)
+        RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=True
+        )
+        assert Entry.objects.filter(feed=feed).count() == 2
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_FAILED
+        ).exists()
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_PARTIAL
+        ).exists()
+
+    def test_logs_success(self, feed, rss_response_factory):
+        """Should log a success state if every entry was inserted."""
+        RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=True
+        )
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_SUCCESS
+        ).exists()
+
+    def test_falls_back_to_individual_insertion(
+        self, mocker, feed, rss_response_factory
+    ):
+        """Should insert entries individually if the bulk write fails."""
+        mocker.patch.object(RSSParser, "write_entries", side_effect=IntegrityError)
+        RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=True
+        )
+        assert Entry.objects.filter(feed=feed).count() == 3
+
+    @pytest.mark.parametrize("bulk", [True, False])
+    def test_queues_enrichment_of_created_entries(
+        self, mocker, bulk, feed, rss_response_factory
+    ):
+        """Should queue enrichment for each of the created entries, not enrich inline."""
+        queue = mocker.patch("feedzero.ingest.parser.queue_enrichment")
+        RSSParser(feed).parse(rss_response_factory(count=3), bulk=bulk)
+        assert queue.call_count == 3
+        queued = {call[0][0].pk for call in queue.call_args_list}
+        assert queued == set(
+            Entry.objects.filter(feed=feed).values_list("pk", flat=True)
+        )
+
+    @pytest.mark.parametrize("bulk", [True, False])
+    def test_returns_created_count(
+        self, bulk, feed, entry_factory, rss_response_factory
+    ):
+        """Should return the number of entries created, omitting existing ones."""
+        entry_factory(feed=feed, guid="guid-0")
+        created = RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=bulk
+        )
+        assert created == 2
+
+    @pytest.mark.parametrize("bulk", [True, False])
+    def test_queues_rule_application_for_created_entries(
+        self, mocker, bulk, feed, entry_factory, rss_response_factory
+    ):
+        """Should queue rule application for the entries created, not existing ones."""
+        queue = mocker.patch("feedzero.ingest.parser.queue_rule_application")
+        entry_factory(feed=feed, guid="guid-0")
+        RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=bulk
+        )
+        created = Entry.objects.filter(feed=feed).exclude(guid="guid-0")
+        queue.assert_called_once_with(
+            feed, list(created.order_by("pk").values_list("pk", flat=True))
+        )
+
+    def test_no_rule_application_without_new_entries(
+        self, mocker, feed, entry_factory, rss_response_factory
+    ):
+        """Should not queue rule application if nothing was created."""
+        queue = mocker.patch("feedzero.ingest.parser.queue_rule_application")
+        entry_factory(feed=feed, guid="guid-0")
+        RSSParser(feed).parse(
+            rss_response_factory(count=1), should_enrich=False, bulk=True
+        )
+        assert not queue.called
+
+
+@pytest.mark.django_db
+class TestRSSParserContentHash:
+    def test_stores_hash_of_parsed_body(self, feed, rss_response_factory):
+        """Should store the hash of a body once it's been parsed."""
+        response = rss_response_factory(count=2)
+        RSSParser(feed).parse(response, should_enrich=False, bulk=True)
+        feed.refresh_from_db()
+        assert feed.content_hash == get_content_hash(response.text)
+
+    def test_skips_identical_body(self, mocker, feed, rss_response_factory):
+        """Should log an unchanged body without parsing it again."""
+        response = rss_response_factory(count=2)
+        RSSParser(feed).parse(response, should_enrich=False, bulk=True)
+        parse = mocker.spy(feedparser, "parse")
+
+        created = RSSParser(feed).parse(response, should_enrich=False, bulk=True)
+        assert created == 0
+        assert not parse.called
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_UNCHANGED
+        ).exists()
+
+    def test_parses_changed_body(self, feed, rss_response_factory):
+        """Should parse a body which differs from the last."""
+        parser = RSSParser(feed)
+        parser.parse(rss_response_factory(count=2), should_enrich=False, bulk=True)
+        created = RSSParser(feed).parse(
+            rss_response_factory(count=3), should_enrich=False, bulk=True
+        )
+        assert created == 1
+
+    def test_retries_body_with_failures(self, mocker, feed, rss_response_factory):
+        """Should not store the hash of a body which had entries fail."""
+        mocker.patch.object(
+            EntryParser, "extract", side_effect=ContentErrorException("content")
+        )
+        RSSParser(feed).parse(
+            rss_response_factory(count=2), should_enrich=False, bulk=True
+        )
+        feed.refresh_from_db()
+        assert feed.content_hash is None
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from feedzero.feeds.models import Entry
+from feedzero.ingest.extract import parse_document
+from feedzero.ingest.models import IngestLog
+from feedzero.ingest.pipeline import get_executor, InlineExecutor, parse_responses
+
+
+@pytest.fixture
+def result_factory(rss_response_factory):
+    """Mock a fetched result for the feed, wrapping a generated RSS document."""
+
+    def _make(feed, **kwargs):
+        result = rss_response_factory(**kwargs)
+        result.feed = feed
+        return result
+
+    return _make
+
+
+def get_created(parsed):
+    return {pk: len(parser.created_ids) for pk, parser in parsed.items()}
+
+
+@pytest.mark.django_db
+class TestParseResponses:
+    @pytest.fixture(autouse=True)
+    def inline(self, settings):
+        settings.INGEST_PARSE_PROCESSES = 0
+
+    def test_writes_each_document(self, feed_factory, result_factory):
+        """Should write the new entries of every document, returning parsers by feed."""
+        feeds = [feed_factory() for _ in range(3)]
+        results = [result_factory(feed, count=i + 1) for i, feed in enumerate(feeds)]
+        parsed = parse_responses(results, should_enrich=False)
+        assert get_created(parsed) == {feed.pk: i + 1 for i, feed in enumerate(feeds)}
+        for i, feed in enumerate(feeds):
+            assert Entry.objects.filter(feed=feed).count() == i + 1
+
+    def test_parses_in_processes(self, settings, feed_factory, result_factory):
+        """Should give the same result when documents are parsed by other processes."""
+        settings.INGEST_PARSE_PROCESSES = 2
+        feeds = [feed_factory() for _ in range(3)]
+        results = [result_factory(feed, count=2, tags=("news",)) for feed in feeds]
+        parsed = parse_responses(results, should_enrich=False)
+        assert get_created(parsed) == {feed.pk: 2 for feed in feeds}
+        for feed in feeds:
+            entries = Entry.objects.filter(feed=feed)
+            assert entries.count() == 2
+            assert entries.filter(tags__term="news").count() == 2
+
+    def test_skips_unchanged_documents(self, mocker, feed, result_factory):
+        """Should not send a document to be parsed if it hasn't changed."""
+        parse_responses([result_factory(feed, count=2)], should_enrich=False)
+        parse = mocker.patch("feedzero.ingest.pipeline.parse_document")
+        parsed = parse_responses([result_factory(feed, count=2)], should_enrich=False)
+        assert get_created(parsed) == {feed.pk: 0}
+        assert parsed[feed.pk].metrics["unchanged"] == 1
+        assert not parse.called
+        assert IngestLog.objects.filter(
+            feed=feed, state=IngestLog.STATE_UNCHANGED
+        ).exists()
+
+    def test_only_extracts_new_entries(self, mocker, feed, result_factory):
+        """Should only send entries which don't exist yet to be extracted."""
+        parse_responses([result_factory(feed, count=2)], should_enrich=False)
+        extract = mocker.patch(
+            "feedzero.ingest.pipeline.extract_entries", return_value=([], [])
+        )
+        parse_responses([result_factory(feed, count=3)], should_enrich=False)
+        assert [entry.id for entry in extract.call_args[0][0]] == ["guid-2"]
+
+    def test_isolates_failing_documents(self, mocker, feed_factory, result_factory):
+        """Should leave out feeds which fail to parse, writing the remainder."""
+        broken, working = feed_factory(), feed_factory()
+        results = [result_factory(broken, count=1), result_factory(working, count=2)]
+
+        def failing_parse(body):
+            if body == results[0].text:
+                raise ValueError("broken")
+            return parse_document(body)
+
+        mocker.patch("feedzero.ingest.pipeline.parse_document", failing_parse)
+        parsed = parse_responses(results, should_enrich=False)
+        assert get_created(parsed) == {working.pk: 2}
+
+    def test_measures_parse(self, settings, feed, result_factory):
+        """Should note the time spent parsing, including in other processes."""
+        settings.INGEST_PARSE_PROCESSES = 1
+        parsed = parse_responses([result_factory(feed, count=3)], should_enrich=False)
+        metrics = parsed[feed.pk].metrics
+        assert metrics["parse_time"] > 0
+        assert metrics["db_time"] > 0
+        assert metrics["entries_seen"] == metrics["entries_new"] == 3
+
+
+class TestGetExecutor:
+    def test_inline_without_processes(self, settings):
+        """Should parse in this process if no parse processes are configured."""
+        settings.INGEST_PARSE_PROCESSES = 0
+        assert isinstance(get_executor(10), InlineExecutor)
+
+    def test_limits_processes_to_documents(self, settings):
+        """Should not start more processes than there are documents."""
+        settings.INGEST_PARSE_PROCESSES = 8
+        with get_executor(2) as executor:
+            assert isinstance(executor, ProcessPoolExecutor)
+            assert executor._max_workers == 2
@@ -0,0 +1,151 @@
+from datetime import timedelta
+
+from django.utils import timezone
+import pytest
+
+from feedzero.ingest.models import IngestLog
+from feedzero.ingest.scheduling import (
+    get_publish_interval,
+    schedule_after_failure,
+    schedule_after_scrape,
+)
+
+
+@pytest.fixture
+def published_every(entry_factory, feed):
+    """Give the feed entries published at the given interval."""
+
+    def _make(interval: timedelta, count=5):
+        now = timezone.now()
+        for i in range(count):
+            entry_factory(feed=feed, date_published=now - interval * i)
+        return feed
+
+    return _make
+
+
+@pytest.mark.django_db
+class TestGetPublishInterval:
+    def test_median_of_gaps(self, entry_factory, feed):
+        """Should return the median gap between publish dates."""
+        now = timezone.now()
+        for hours in [0, 1, 3, 5, 30]:
+            entry_factory(feed=feed, date_published=now - timedelta(hours=hours))
+        assert get_publish_interval(feed) == timedelta(hours=2)
+
+    def test_none_without_history(self, entry_factory, feed):
+        """Should return None if there aren't two dated entries to compare."""
+        entry_factory(feed=feed, date_published=timezone.now())
+        entry_factory(feed=feed, date_published=None)
+        assert get_publish_interval(feed) is None
+
+    def test_uses_recent_entries(self, settings, entry_factory, feed):
+        """Should only sample the most recently published entries."""
+        settings.INGEST_SCHEDULE_SAMPLE_SIZE = 3
+        now = timezone.now()
+        for hours in [0, 1, 2, 100, 200]:
+            entry_factory(feed=feed, date_published=now - timedelta(hours=hours))
+        assert get_publish_interval(feed) == timedelta(hours=1)
+
+
+@pytest.mark.django_db
+class TestScheduleAfterScrape:
+    @pytest.fixture(autouse=True)
+    def intervals(self, settings):
+        settings.INGEST_SCHEDULE_DEFAULT_INTERVAL = 60
+        settings.INGEST_SCHEDULE_MIN_INTERVAL = 15
+        settings.INGEST_SCHEDULE_MAX_INTERVAL = 24 * 60
+
+    def test_follows_publish_cadence(self, published_every):
+        """Should schedule the next scrape one publish interval away."""
+        feed = published_every(timedelta(hours=2))
+        now = timezone.now()
+        schedule_after_scrape(feed, found_new=True, now=now)
+        assert feed.next_scrape_at == now + timedelta(hours=2)
+
+    def test_default_without_history(self, feed):
+        """Should use the default interval for feeds without a publish history."""
+        now = timezone.now()
+        schedule_after_scrape(feed, found_new=True, now=now)
+        assert feed.next_scrape_at == now + timedelta(hours=1)
+
+    def test_clamps_to_minimum(self, published_every):
+        """Should not poll busy feeds more often than the minimum interval."""
+        feed = published_every(timedelta(minutes=1))
+        now = timezone.now()
+        schedule_after_scrape(feed, found_new=True, now=now)
+        assert feed.next_scrape_at == now + timedelta(minutes=15)
+
+    def test_clamps_to_maximum(self, published_every):
+        """Should poll weekly feeds at least as often as the maximum interval."""
+        feed = published_every(timedelta(weeks=1))
+        now = timezone.now()
+        schedule_after_scrape(feed, found_new=True, now=now)
+        assert feed.next_scrape_at == now + timedelta(days=1)
+
+    def test_backs_off_when_unchanged(self, published_every):
+        """Should double the interval for each scrape in a row finding nothing new."""
+        feed = published_every(timedelta(hours=2))
+        now = timezone.now()
+        schedule_after_scrape(feed, found_new=False, now=now)
+        assert feed.next_scrape_at == now + timedelta(hours=4)
+        schedule_after_scrape(feed, found_new=False, now=now)
+        assert feed.next_scrape_at == now + timedelta(hours=8)
+        assert feed.unchanged_scrapes == 2
+
+    def test_new_entries_reset_backoff(self, published_every):
+        """Should return to the publish cadence once something new is found."""
+        feed = published_every(timedelta(hours=2))
+        feed.unchanged_scrapes = 5
+        now = timezone.now()
+        schedule_after_scrape(feed, found_new=True, now=now)
+        assert feed.unchanged_scrapes == 0
+        assert feed.next_scrape_at == now + timedelta(hours=2)
+
+
+@pytest.mark.django_db
+class TestScheduleAfterFailure:
+    @pytest.fixture(autouse=True)
+    def intervals(self, settings):
+        settings.INGEST_SCHEDULE_DEFAULT_INTERVAL = 60
+        settings.INGEST_SCHEDULE_DEAD_INTERVAL = 24 * 60
+
+    def log_states(self, feed, *states):
+        for state in states:
+            IngestLog.objects.create(feed=feed, state=state)
+
+    def test_backs_off_with_streak(self, feed):
+        """Should double the retry interval for each consecutive failure."""
+        self.log_states(
+            feed,
+            IngestLog.STATE_NOT_RESPONDING,
+            IngestLog.STATE_SUCCESS,
+            IngestLog.STATE_NOT_RESPONDING,
+            IngestLog.STATE_NOT_RESPONDING,
+            IngestLog.STATE_NOT_RESPONDING,
+        )
+        now = timezone.now()
+        schedule_after_failure(feed, now=now)
+        assert feed.next_scrape_at == now + timedelta(hours=4)
+
+    def test_counts_failed_syncs(self, feed):
+        """Should back off from syncs which raised as from feeds not responding."""
+        self.log_states(feed, IngestLog.STATE_NOT_RESPONDING, IngestLog.STATE_FAILED)
+        now = timezone.now()
+        schedule_after_failure(feed, now=now)
+        assert feed.next_scrape_at == now + timedelta(hours=2)
+
+    def test_caps_at_dead_interval(self, feed):
+        """Should only retry feeds which have been gone a long time occasionally."""
+        self.log_states(feed, *[IngestLog.STATE_NOT_RESPONDING] * 10)
+        now = timezone.now()
+        schedule_after_failure(feed, now=now)
+        assert feed.next_scrape_at == now + timedelta(days=1)
+
+    def test_saves_schedule(self, feed):
+        """Should store the next scrape time on the feed."""
+        self.log_states(feed, IngestLog.STATE_NOT_RESPONDING)
+        now = timezone.now()
+        schedule_after_failure(feed, now=now)
+        feed.refresh_from_db()
+        assert feed.next_scrape_at == now + timedelta(hours=1)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from email.utils import format_datetime
+
+from django.utils import timezone
+import pytest
+from redis.exceptions import ConnectionError
+
+from feedzero.ingest.throttle import get_retry_after, HostThrottle
+
+
+class TestHostThrottle:
+    @pytest.fixture
+    def clock(self, mocker):
+        clock = mocker.patch("feedzero.ingest.throttle.time.time")
+        clock.return_value = 1000.0
+        return clock
+
+    @pytest.fixture
+    def throttle(self, fake_redis, clock):
+        return HostThrottle(fake_redis, rate=2, burst=3)
+
+    def test_allows_a_burst(self, throttle):
+        """Should let the burst through, then say how long until the next token."""
+        assert [throttle.acquire("https://example.com/a") for _ in range(3)] == [0] * 3
+        assert throttle.acquire("https://example.com/b") == pytest.approx(0.5)
+
+    def test_staggers_reserved_slots(self, throttle):
+        """Should give each caller held back its own slot, at the rate allowed."""
+        for _ in range(3):
+            throttle.acquire("https://example.com")
+        waits = [throttle.acquire("https://example.com") for _ in range(3)]
+        assert waits == [pytest.approx(0.5), pytest.approx(1), pytest.approx(1.5)]
+
+    def test_reserved_slots_are_kept(self, throttle, clock):
+        """Should not hand a reserved slot to a later caller once it's due."""
+        for _ in range(4):
+            throttle.acquire("https://example.com")
+        clock.return_value += 0.5
+        assert throttle.acquire("https://example.com") == pytest.approx(0.5)
+
+    def test_staggers_slots_after_block(self, throttle):
+        """Should reserve slots after a block ends, starting with the burst."""
+        throttle.block("https://example.com", 60)
+        waits = [throttle.acquire("https://example.com") for _ in range(4)]
+        assert waits[:3] == [pytest.approx(60, abs=0.01)] * 3
+        assert waits[3] == pytest.approx(60.5, abs=0.01)
+
+    def test_refills_over_time(self, throttle, clock):
+        """Should add tokens back at the configured rate."""
+        for _ in range(3):
+            throttle.acquire("https://example.com")
+        clock.return_value += 0.5
+        assert throttle.acquire("https://example.com") == 0
+        assert throttle.acquire("https://example.com") > 0
+
+    def test_shared_between_workers(self, fake_redis, throttle):
+        """Should share buckets between every throttle using the same Redis."""
+        for _ in range(3):
+            throttle.acquire("https://example.com")
+        other = HostThrottle(fake_redis, rate=2, burst=3)
+        assert other.acquire("https://example.com") > 0
+
+    def test_buckets_per_host(self, throttle):
+        """Should not hold back one host for requests to another."""
+        for _ in range(3):
+            throttle.acquire("https://example.com")
+        assert throttle.acquire("https://example.org") == 0
+
+    def test_block_holds_back_host(self, throttle):
+        """Should hold back a blocked host even with tokens to spare."""
+        throttle.block("https://example.com/feed", 120)
+        assert throttle.acquire("https://example.com/other") == pytest.approx(
+            120, abs=1
+        )
+
+    def test_block_keeps_longer_block(self, throttle):
+        """Should not shorten a block already in place."""
+        throttle.block("https://example.com", 120)
+        throttle.block("https://example.com", 5)
+        assert throttle.acquire("https://example.com") > 100
+
+    def test_lets_requests_through_without_redis(self, mocker):
+        """Should not stop ingest if Redis can't be reached."""
+        connection = mocker.Mock()
+        connection.register_script.return_value.side_effect = ConnectionError()
+        assert HostThrottle(connection).acquire("https://example.com") == 0
+
+
+class TestGetRetryAfter:
+    @pytest.fixture
+    def response_factory(self, mocker):
+        def _make(status_code, retry_after=None):
+            response = mocker.Mock()
+            response.status_code = status_code
+            response.headers = {}
+            if retry_after is not None:
+                response.headers["Retry-After"] = retry_after
+            return response
+
+        return _make
+
+    def test_reads_seconds(self, response_factory):
+        """Should read a delay given in seconds."""
+        assert get_retry_after(response_factory(429, "120")) == 120
+
+    def test_reads_date(self, response_factory):
+        """Should read a delay given as a date."""
+        date = format_datetime(timezone.now() + timedelta(minutes=5))
+        assert get_retry_after(response_factory(503, date)) == pytest.approx(300, abs=2)
+
+    def test_defaults_too_many_requests(self, settings, response_factory):
+        """Should back off for the default time if a 429 doesn't say how long for."""
+        assert get_retry_after(response_factory(429, "soon")) == (
+            settings.INGEST_THROTTLE_BACKOFF
+        )
+
+    def test_ignores_unavailable_without_header(self, response_factory):
+        """Should leave a 503 without Retry-After to be handled as not responding."""
+        assert get_retry_after(response_factory(503)) is None
+
+    def test_ignores_other_statuses(self, response_factory):
+        """Should not treat other responses as throttling."""
+        assert get_retry_after(response_factory(200, "120")) is None
+
+    def test_caps_delay(self, settings, response_factory):
+        """Should not back off for longer than the maximum scrape interval."""
+        delay = get_retry_after(response_factory(429, "99999999"))
+        assert delay == settings.INGEST_SCHEDULE_MAX_INTERVAL * 60
@@ -0,0 +1,116 @@
+from email.utils import parsedate_to_datetime
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+import django_rq
+from loguru import logger
+from redis.exceptions import RedisError
+
+from feedzero.ingest.http import get_host
+
+# Takes a token from the host's bucket, refilled at ARGV[1] tokens a second up to
+# ARGV[2]. When the bucket is empty, or the host has asked us to back off, the next
+# free slot is reserved by letting the tokens go negative, and the seconds until it
+# are returned. So callers arriving together are given successive slots, rather than
+# all being told to come back at the same time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local start = now
+local blocked = redis.call("PTTL", KEYS[2])
+if blocked > 0 then
+    start = now + blocked / 1000
+end
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+if start > updated then
+    tokens = math.min(burst, tokens + (start - updated) * rate)
+    updated = start
+end
+
+tokens = tokens - 1
+local wait = (updated - now) + math.max(0, -tokens) / rate
+redis.call("HMSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(updated))
+redis.call("EXPIRE", KEYS[1], math.ceil(wait + burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+def get_redis():
+    return django_rq.get_connection()
+
+
+class HostThrottle:
+    """Token buckets per host, shared by every worker through Redis.
+
+    Failing to reach Redis lets requests through, so ingest carries on unthrottled
+    rather than not at all.
+    """
+
+    def __init__(self, connection=None, rate: float = None, burst: int = None):
+        """Fall back to the RQ connection and the configured limits."""
+        self.connection = connection or get_redis()
+        self.rate = rate or settings.INGEST_THROTTLE_RATE
+        self.burst = burst or settings.INGEST_THROTTLE_BURST
+        self.script = self.connection.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, url: str) -> float:
+        """Take a token for the url's host, or reserve the next, returning the wait.
+
+        A caller given a wait in seconds holds the slot, so should make its request
+        once the wait has passed without acquiring again.
+        """
+        host = get_host(url)
+        keys = [f"throttle:bucket:{host}", f"throttle:blocked:{host}"]
+        try:
+            return float(
+                self.script(keys=keys, args=[self.rate, self.burst, time.time()])
+            )
+        except RedisError:
+            logger.warning(f"Unable to throttle requests to {host}", exc_info=True)
+            return 0
+
+    def block(self, url: str, seconds: float):
+        """Hold back every request to the url's host for the given time."""
+        key = f"throttle:blocked:{get_host(url)}"
+        milliseconds = max(int(seconds * 1000), 1)
+        try:
+            if self.connection.pttl(key) < milliseconds:
+                self.connection.set(key, 1, px=milliseconds)
+        except RedisError:
+            logger.warning(f"Unable to block requests to {url}", exc_info=True)
+
+
+def get_throttle() -> HostThrottle:
+    return HostThrottle()
+
+
+def get_retry_after(response) -> Optional[float]:
+    """Return the seconds the server asked us to back off for, if it's throttling us.
+
+    A 429 without a usable Retry-After backs off for the default time, while a 503
+    only counts as throttling if the server says when to come back.
+    """
+    if response.status_code not in (429, 503):
+        return None
+    default = settings.INGEST_THROTTLE_BACKOFF if response.status_code == 429 else None
+
+    value = response.headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        delay = float(value)
+    else:
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date, timezone.utc)
+        delay = (date - timezone.now()).total_seconds()
+
+    maximum = settings.INGEST_SCHEDULE_MAX_INTERVAL * 60
+    return min(max(delay, 0), maximum)
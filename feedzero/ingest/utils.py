@@ -1,35 +1,11 @@
-from collections import namedtuple
-from typing import List
+import hashlib
+from typing import Dict, List
 
-from bleach import clean
-from django.utils.text import Truncator
+from django.conf import settings
 from feedparser import FeedParserDict
 
 from feedzero.feeds.models import Feed, Tag
-
-CleanedContent = namedtuple("CleanedContent", ["teaser", "article"])
-
-
-def clean_content(content):
-    cleaned_full_content = clean(
-        content,
-        strip=True,
-        tags=["b", "i", "a", "img", "p", "div"],
-        attributes={"a": ["href", "title"], "img": ["src"]},
-        styles=[],
-    )
-
-    cleaned_teaser_content = clean(content, strip=True)
-    truncator = Truncator(cleaned_teaser_content)
-    teaser = truncator.words(100)
-    return CleanedContent(teaser=teaser.strip(), article=cleaned_full_content.strip())
-
-
-def clean_item_content(item_content):
-    content = ""
-    for section in item_content:
-        content += section.value
-    return clean_content(content)
+from feedzero.ingest.constants import REQUESTS_USER_AGENT
 
 
 def get_or_create_tags(entry: FeedParserDict, feed: Feed) -> List[Tag]:
@@ -55,3 +31,51 @@ def get_or_create_tags(entry: FeedParserDict, feed: Feed) -> List[Tag]:
         tags.append(db_tag)
 
     return tags
+
+
+def bulk_get_or_create_tags(tags: List[dict], feed: Feed) -> Dict[str, Tag]:
+    """Get or create many extracted tags at once, keyed by term.
+
+    The tags are dicts of the term, scheme and label, as extract_entries gives them.
+    """
+    new_tags = {}
+    for tag in tags:
+        new_tags.setdefault(
+            tag["term"],
+            Tag(term=tag["term"], scheme=tag["scheme"], label=tag["label"], feed=feed),
+        )
+    if not new_tags:
+        return {}
+
+    db_tags = {}
+    for db_tag in Tag.objects.filter(feed=feed, term__in=new_tags.keys()):
+        db_tags.setdefault(db_tag.term, db_tag)
+
+    missing = [tag for term, tag in new_tags.items() if term not in db_tags]
+    for db_tag in Tag.objects.bulk_create(missing):
+        db_tags[db_tag.term] = db_tag
+
+    return db_tags
+
+
+def get_request_headers(feed: Feed) -> dict:
+    """Build the headers for a feed request, conditional if we have cached validators."""
+    headers = {"User-Agent": REQUESTS_USER_AGENT}
+    if feed.etag:
+        headers["If-None-Match"] = feed.etag
+    if feed.last_modified:
+        headers["If-Modified-Since"] = feed.last_modified
+    return headers
+
+
+def truncate_body(body: str) -> str:
+    """Cap a response body kept for diagnostics at the configured length."""
+    limit = settings.INGEST_LOG_MAX_BODY
+    if body is None or len(body) <= limit:
+        return body
+    return f"{body[:limit]}\n[truncated {len(body) - limit} characters]"
+
+
+def get_content_hash(body: str) -> str:
+    """Hash a response body, to tell whether it changed since the last scrape."""
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
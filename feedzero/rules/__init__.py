@@ -0,0 +1 @@
+default_app_config = "feedzero.rules.apps.RulesConfig"
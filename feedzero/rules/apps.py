@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RulesConfig(AppConfig):
     name = "feedzero.rules"
+
+    def ready(self):
+        import feedzero.rules.receivers  # noqa
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from functools import reduce
+import operator
+import re
+from typing import Set
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+
+from feedzero.feeds.models import Entry, EntryState
+from feedzero.rules.snapshot import get_active_rules
+
+
+class CompiledRules:
+    """A user's active rules, compiled once to be matched against many entries.
+
+    Feed rules become a set of feed ids per action, and text rules a single regex
+    per action over lower cased titles, so no rule has to be loaded or resolved to
+    its subclass per entry. Rules come from the user's cached snapshot.
+
+    Only delete rules are applied. Entries have no hidden transition, as with
+    Rule.apply, so rules with the hidden action are left alone.
+    """
+
+    applied_actions = [EntryState.STATE_DELETED]
+
+    def __init__(self, user):
+        """Compile the user's active rules from their cached snapshot."""
+        self.user = user
+        self.feed_ids = defaultdict(set)
+        self.texts = defaultdict(set)
+
+        for rule in get_active_rules(user.pk):
+            if rule.feed_id is not None:
+                self.feed_ids[rule.action].add(rule.feed_id)
+            else:
+                self.texts[rule.action].add(rule.text.lower())
+        self.patterns = {
+            action: re.compile("|".join(re.escape(text) for text in sorted(values)))
+            for action, values in self.texts.items()
+        }
+
+    def __bool__(self):
+        return bool(self.feed_ids or self.patterns)
+
+    def get_matching_ids(self, entries: QuerySet, action: str) -> Set[int]:
+        """Return the ids of the entries matched by rules with the action.
+
+        Feed rules are matched in the database. Titles of the remaining entries are
+        read in one query and matched against the text rule pattern.
+        """
+        feed_ids = self.feed_ids.get(action, set())
+        matched = set(entries.filter(feed_id__in=feed_ids).values_list("pk", flat=True))
+
+        pattern = self.patterns.get(action)
+        if pattern is not None:
+            remaining = entries.exclude(feed_id__in=feed_ids).values_list("pk", "title")
+            for pk, title in remaining.iterator():
+                if pattern.search(title.lower()):
+                    matched.add(pk)
+        return matched
+
+    def get_matching_entries(self, entries: QuerySet, action: str) -> QuerySet:
+        """Filter the entries to those matched by rules with the action, in SQL.
+
+        Each rule becomes a predicate, a feed id list or a case insensitive LIKE,
+        OR'd together into a single query. The LIKE is backed by a trigram index.
+        """
+        predicates = [Q(title__icontains=text) for text in sorted(self.texts[action])]
+        if self.feed_ids[action]:
+            predicates.append(Q(feed_id__in=self.feed_ids[action]))
+        if not predicates:
+            return entries.none()
+        return entries.filter(reduce(operator.or_, predicates))
+
+    def apply(self, entries: QuerySet, mode: str = None):
+        """Apply the rules to the user's entries with a set of statements per action.
+
+        In "sql" mode rules are evaluated by the database, in "python" mode titles
+        are read and matched in the worker. Defaults to RULES_EXECUTION_MODE.
+        """
+        mode = mode or settings.RULES_EXECUTION_MODE
+        for action in self.applied_actions:
+            if mode == "sql":
+                matched = self.get_matching_entries(entries, action)
+            else:
+                matched = Entry.objects.filter(
+                    pk__in=self.get_matching_ids(entries, action)
+                )
+            EntryState.objects.bulk_mark(matched, self.user, action)
@@ -1,9 +1,12 @@
 from typing import List
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django_rq import job
 
-from feedzero.feeds.models import Entry
+from feedzero.feeds.models import Entry, Feed
+from feedzero.rules.engine import CompiledRules
 from feedzero.rules.models import Rule
 
 
@@ -12,15 +15,34 @@ User = get_user_model()
 
 @job
 def process_rules_for_user(user: User):
-    entries = Entry.user_state.unread(user)
-    rules = Rule.objects.active().filter(user=user)
-    for entry in entries:
-        apply_rules(entry, rules)
-
-
-def apply_rules(entry: Entry, rules: List[Rule]):
-    for rule in rules:
-        concrete_rule = rule.specific()
-        if not concrete_rule.match(entry):
-            continue
-        concrete_rule.apply(entry)
+    """Apply the user's active rules to all of their unread entries.
+
+    Rules are applied to new entries as they are ingested, so this is only needed
+    to backfill, e.g. after a rule is created.
+    """
+    rules = CompiledRules(user)
+    if not rules:
+        return
+    rules.apply(Entry.user_state.unread(user))
+
+
+@job
+def apply_rules_to_new_entries(feed_id: int, entry_ids: List[int]):
+    """Apply the rules of each user watching the feed to its newly ingested entries."""
+    users = User.objects.filter(
+        watching=feed_id, rules__in=Rule.objects.active()
+    ).distinct()
+    for user in users:
+        rules = CompiledRules(user)
+        rules.apply(Entry.user_state.unread(user).filter(pk__in=entry_ids))
+
+
+def queue_rule_application(feed: Feed, entry_ids: List[int]):
+    """Apply rules to the new entries once the transaction inserting them commits."""
+    entry_ids = list(entry_ids)
+    if settings.RQ_ENABLED:
+        transaction.on_commit(
+            lambda: apply_rules_to_new_entries.delay(feed.pk, entry_ids)
+        )
+    else:
+        transaction.on_commit(lambda: apply_rules_to_new_entries(feed.pk, entry_ids))
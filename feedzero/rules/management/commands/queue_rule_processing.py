@@ -8,7 +8,7 @@ User = get_user_model()
 
 
 class Command(BaseCommand):
-    help = "Enqueue rule processing"
+    help = "Backfill rules over the unread entries of every active user"
 
     def handle(self, *args, **options):
         for user in User.objects.filter(is_active=True):
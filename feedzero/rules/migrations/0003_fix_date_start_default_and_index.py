@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:01
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("rules", "0002_rule_content_type")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="rule",
+            name="date_start",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="rule",
+            index=models.Index(
+                fields=["user", "date_start", "date_end"], name="rule_user_active_idx"
+            ),
+        ),
+    ]
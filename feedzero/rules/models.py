@@ -1,9 +1,11 @@
+from typing import List, Union
+
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
 from django.utils.functional import cached_property
-import maya
 
 from feedzero.feeds.models import Entry, EntryState, Feed
 
@@ -14,11 +16,31 @@ User = get_user_model()
 class RuleManager(models.Manager):
     def active(self):
         """Filter for only active rules."""
-        now = maya.now().datetime()
+        now = timezone.now()
         return self.filter(
             Q(date_start__lte=now), Q(date_end__gte=now) | Q(date_end__isnull=True)
         )
 
+    def get_subclasses(self) -> List[type]:
+        """Get the concrete rule types, or the model itself if it has none."""
+        return [
+            relation.related_model
+            for relation in self.model._meta.related_objects
+            if relation.parent_link
+        ] or [self.model]
+
+    def for_user(self, user: Union[User, int], *filters: Q) -> List["Rule"]:
+        """Load the user's rules matching any filters as their concrete subclasses.
+
+        Each subclass is queried directly, so there's a query per rule type rather
+        than a content type lookup per rule. Rules of the base type can't match
+        anything and are left out.
+        """
+        rules = []
+        for subclass in self.get_subclasses():
+            rules += subclass.objects.filter(*filters, user=user)
+        return sorted(rules, key=lambda rule: rule.pk)
+
 
 class Rule(models.Model):
     """Base rule model, used to configure logic for user automation of entry processing."""
@@ -29,7 +51,7 @@ class Rule(models.Model):
     ]
     action = models.CharField(choices=ACTION_CHOICES, max_length=30)
 
-    date_start = models.DateTimeField(default=maya.now().datetime())
+    date_start = models.DateTimeField(default=timezone.now)
     date_end = models.DateTimeField(blank=True, null=True)
 
     content_type = models.ForeignKey(
@@ -56,13 +78,23 @@ class Rule(models.Model):
 
     @cached_property
     def specific(self):
-        """Get the concrete subclass of the Rule to apply specific match functions against etc."""
+        """Get the concrete subclass of the Rule to apply specific match functions against etc.
+
+        Costs a query per rule, use `Rule.objects.for_user` to load many rules.
+        """
         content_type = ContentType.objects.get_for_id(self.content_type_id)
         model_class = content_type.model_class()
         if isinstance(self, model_class) or model_class is None:
             return self
         return content_type.get_object_for_this_type(id=self.id)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "date_start", "date_end"], name="rule_user_active_idx"
+            )
+        ]
+
 
 class FeedRule(Rule):
     """Direct match against feed Rule."""
@@ -71,7 +103,7 @@ class FeedRule(Rule):
 
     def match(self, entry: Entry) -> bool:
         """The entry should share the same feed."""
-        return self.feed == entry.feed
+        return self.feed_id == entry.feed_id
 
 
 class TextMatchRule(Rule):
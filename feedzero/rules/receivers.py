@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+
+from feedzero.rules.models import Rule
+from feedzero.rules.snapshot import invalidate_snapshot
+
+
+def invalidate_rules(sender, instance, **kwargs):
+    """Invalidate the user's cached rules when any type of rule changes."""
+    invalidate_snapshot(instance.user_id)
+
+
+# a subclass signals as itself rather than as Rule, so each type is connected. Only
+# rules are listened to, as delete listeners stop Django fast deleting a model.
+for model in [Rule] + Rule.objects.get_subclasses():
+    post_save.connect(
+        invalidate_rules, sender=model, dispatch_uid=f"invalidate_{model.__name__}_save"
+    )
+    post_delete.connect(
+        invalidate_rules,
+        sender=model,
+        dispatch_uid=f"invalidate_{model.__name__}_delete",
+    )
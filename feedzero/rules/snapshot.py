@@ -0,0 +1,89 @@
+from collections import namedtuple
+from datetime import datetime
+import pickle
+from typing import List
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+import django_rq
+from loguru import logger
+from redis.exceptions import RedisError
+
+from feedzero.rules.models import Rule
+
+# A rule reduced to what matching needs, feed_id or text is set depending on its type.
+RuleSnapshot = namedtuple(
+    "RuleSnapshot", ["action", "feed_id", "text", "date_start", "date_end"]
+)
+
+
+def get_redis():
+    return django_rq.get_connection()
+
+
+def get_cache_key(user_id: int) -> str:
+    return f"rules:snapshot:{user_id}"
+
+
+def build_snapshot(user_id: int) -> List[RuleSnapshot]:
+    """Load the user's rules which haven't ended, with a query per rule type.
+
+    Rules which are yet to start are included so the snapshot stays correct as
+    they become active.
+    """
+    not_ended = Q(date_end__gte=timezone.now()) | Q(date_end__isnull=True)
+    return [
+        RuleSnapshot(
+            rule.action,
+            getattr(rule, "feed_id", None),
+            getattr(rule, "text", None),
+            rule.date_start,
+            rule.date_end,
+        )
+        for rule in Rule.objects.for_user(user_id, not_ended)
+    ]
+
+
+def get_active_rules(user_id: int, now: datetime = None) -> List[RuleSnapshot]:
+    """Return the user's active rules, building the cached snapshot if required.
+
+    Snapshots are kept in the Redis shared by every worker, so one built by any
+    process is reused by the rest and invalidating it reaches all of them. Failing
+    to reach Redis builds the snapshot each time rather than failing.
+    """
+    connection = get_redis()
+    key = get_cache_key(user_id)
+    try:
+        cached = connection.get(key)
+    except RedisError:
+        logger.warning(f"Unable to read the rules of user {user_id}", exc_info=True)
+        cached = None
+
+    if cached is not None:
+        snapshot = pickle.loads(cached)
+    else:
+        snapshot = build_snapshot(user_id)
+        try:
+            connection.set(
+                key, pickle.dumps(snapshot), ex=settings.RULES_SNAPSHOT_TIMEOUT
+            )
+        except RedisError:
+            logger.warning(
+                f"Unable to cache the rules of user {user_id}", exc_info=True
+            )
+
+    now = now or timezone.now()
+    return [
+        rule
+        for rule in snapshot
+        if rule.date_start <= now and (rule.date_end is None or rule.date_end >= now)
+    ]
+
+
+def invalidate_snapshot(user_id: int):
+    """Drop the user's cached rules, so they're rebuilt on next use."""
+    try:
+        get_redis().delete(get_cache_key(user_id))
+    except RedisError:
+        logger.error(f"Unable to invalidate the rules of user {user_id}", exc_info=True)
@@ -0,0 +1,129 @@
+from django.db import connection
+import pytest
+
+from feedzero.feeds.models import Entry, EntryState
+from feedzero.rules.engine import CompiledRules
+
+
+DELETED = EntryState.STATE_DELETED
+HIDDEN = EntryState.STATE_HIDDEN
+
+
+@pytest.mark.django_db
+class TestCompiledRules:
+    def test_compiles_feed_rules_to_ids(self, user, feed_rule_factory):
+        """Should collect the feeds of feed rules by action."""
+        rules = [feed_rule_factory(user=user, action=DELETED) for _ in range(2)]
+        compiled = CompiledRules(user)
+        assert compiled.feed_ids[DELETED] == {rule.feed_id for rule in rules}
+
+    def test_ignores_other_users_rules(self, user, feed_rule_factory):
+        """Should only compile rules belonging to the user."""
+        feed_rule_factory(action=DELETED)
+        assert not CompiledRules(user)
+
+    def deleted(self, user, mode):
+        CompiledRules(user).apply(Entry.objects.all(), mode=mode)
+        return set(Entry.user_state.deleted(user))
+
+    @pytest.mark.parametrize("mode", ["sql", "python"])
+    @pytest.mark.parametrize(
+        "text, title, should_match",
+        [
+            ["only", "This is only a test.", True],
+            ["ONLY", "This is only a test.", True],
+            ["cowsay", "This is only a test.", False],
+            ["a.test", "This is only a test.", False],
+            ["(test)", "A (test) title", True],
+        ],
+    )
+    def test_matches_text_rules(
+        self,
+        mode,
+        text,
+        title,
+        should_match,
+        user,
+        text_match_rule_factory,
+        entry_factory,
+    ):
+        """Should match titles containing the text, ignoring case and regex syntax."""
+        text_match_rule_factory(user=user, action=DELETED, text=text)
+        entry = entry_factory(title=title)
+        assert (entry in self.deleted(user, mode)) == should_match
+
+    @pytest.mark.parametrize("mode", ["sql", "python"])
+    def test_matches_any_text_rule(
+        self, mode, user, text_match_rule_factory, entry_factory
+    ):
+        """Should match against every text rule."""
+        for text in ["cowsay", "test", "other"]:
+            text_match_rule_factory(user=user, action=DELETED, text=text)
+        entry = entry_factory(title="This is only a test.")
+        assert self.deleted(user, mode) == {entry}
+
+    @pytest.mark.parametrize("mode", ["sql", "python"])
+    def test_matches_feed_rules(self, mode, user, feed_rule_factory, entry_factory):
+        """Should only match entries of the rule's feed."""
+        rule = feed_rule_factory(user=user, action=DELETED)
+        matched = entry_factory(feed=rule.feed)
+        entry_factory()
+        assert self.deleted(user, mode) == {matched}
+
+    @pytest.mark.parametrize("mode", ["sql", "python"])
+    def test_does_not_apply_hidden(self, mode, user, feed_rule_factory, entry_factory):
+        """Should leave rules with the hidden action unapplied."""
+        rule = feed_rule_factory(user=user, action=HIDDEN)
+        entry_factory(feed=rule.feed)
+        assert self.deleted(user, mode) == set()
+        assert not EntryState.objects.filter(user=user).exists()
+
+    @pytest.mark.parametrize("mode", ["sql", "python"])
+    def test_apply_marks_matching_entries(
+        self, mode, user, feed_rule_factory, text_match_rule_factory, entry_factory
+    ):
+        """Should mark every matching entry deleted, leaving the rest."""
+        rule = feed_rule_factory(user=user, action=DELETED)
+        text_match_rule_factory(user=user, action=DELETED, text="spoiler")
+        by_feed = entry_factory(feed=rule.feed)
+        by_text = entry_factory(title="Major SPOILERS ahead")
+        unmatched = entry_factory(title="Nothing to see")
+
+        CompiledRules(user).apply(Entry.objects.all(), mode=mode)
+        deleted = set(Entry.user_state.deleted(user))
+        assert deleted == {by_feed, by_text}
+        assert unmatched not in deleted
+
+    def test_sql_matches_like_python(
+        self, user, feed_rule_factory, text_match_rule_factory, entry_factory
+    ):
+        """Should select the same entries in SQL as when matching in python."""
+        rule = feed_rule_factory(user=user, action=DELETED)
+        for text in ["100%", "under_score", "CaSe"]:
+            text_match_rule_factory(user=user, action=DELETED, text=text)
+        titles = ["100% real", "1000 real", "under_score", "underXscore", "case", "x"]
+        [entry_factory(title=title) for title in titles]
+        entry_factory(feed=rule.feed)
+
+        compiled = CompiledRules(user)
+        entries = Entry.objects.all()
+        in_sql = compiled.get_matching_entries(entries, DELETED)
+        in_python = compiled.get_matching_ids(entries, DELETED)
+        assert set(in_sql.values_list("pk", flat=True)) == in_python
+        assert len(in_python) == 4
+
+    def test_sql_without_rules_matches_nothing(self, user, entry):
+        """Should not match any entries if the user has no rules for the action."""
+        compiled = CompiledRules(user)
+        assert not compiled.get_matching_entries(Entry.objects.all(), DELETED).exists()
+
+    def test_text_predicate_uses_trigram_index(self, user, text_match_rule_factory):
+        """The text predicate should be able to use the title trigram index."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                pytest.skip("pg_trgm is not installed")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        text_match_rule_factory(user=user, action=DELETED, text="spoiler")
+        matched = CompiledRules(user).get_matching_entries(Entry.objects.all(), DELETED)
+        assert "entry_title_trgm_idx" in matched.explain()
@@ -0,0 +1,114 @@
+from django.db import transaction
+import pytest
+
+from feedzero.feeds.models import Entry, EntryState
+from feedzero.rules.jobs import (
+    apply_rules_to_new_entries,
+    process_rules_for_user,
+    queue_rule_application,
+)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode", ["sql", "python"])
+class TestProcessRulesForUser:
+    @pytest.fixture(autouse=True)
+    def execution_mode(self, settings, mode):
+        settings.RULES_EXECUTION_MODE = mode
+
+    def test_applies_rules_to_unread_entries(
+        self, watched_feed, entry_factory, text_match_rule_factory
+    ):
+        """Should delete the user's unread entries matching their rules."""
+        (feed, user) = watched_feed
+        text_match_rule_factory(user=user, action=EntryState.STATE_DELETED, text="ads")
+        matching = entry_factory(feed=feed, title="Sponsored: ads")
+        kept = entry_factory(feed=feed, title="An article")
+        process_rules_for_user(user)
+        assert list(Entry.user_state.unread(user)) == [kept]
+        assert list(Entry.user_state.deleted(user)) == [matching]
+
+    def test_constant_queries(
+        self,
+        mode,
+        watched_feed,
+        entry_factory,
+        feed_rule_factory,
+        text_match_rule_factory,
+        django_assert_num_queries,
+    ):
+        """Should not query per rule or per entry."""
+        (feed, user) = watched_feed
+        for i in range(25):
+            feed_rule_factory(user=user, action=EntryState.STATE_DELETED)
+            text_match_rule_factory(
+                user=user, action=EntryState.STATE_DELETED, text=f"topic{i}:"
+            )
+        for i in range(40):
+            entry_factory(feed=feed, title=f"entry on topic{i}: details")
+        # loading each type of rule, then in python mode matching by feed and
+        # scanning titles, then finding unread entries, adjusting the feed's count,
+        # removing replaced states, listing the entry ids and inserting their states
+        with django_assert_num_queries(9 if mode == "python" else 7):
+            process_rules_for_user(user)
+        assert Entry.user_state.deleted(user).count() == 25
+
+    def test_no_rules_does_nothing(
+        self, watched_feed, entry_factory, django_assert_num_queries
+    ):
+        """Should not load entries if the user has no active rules."""
+        (feed, user) = watched_feed
+        entry_factory(feed=feed)
+        with django_assert_num_queries(2):
+            process_rules_for_user(user)
+
+
+@pytest.mark.django_db
+class TestApplyRulesToNewEntries:
+    def test_applies_rules_of_watchers(
+        self, watched_feed, entry_factory, feed_rule_factory
+    ):
+        """Should apply the rules of users watching the feed to the new entries."""
+        (feed, user) = watched_feed
+        feed_rule_factory(user=user, feed=feed, action=EntryState.STATE_DELETED)
+        entry = entry_factory(feed=feed)
+        apply_rules_to_new_entries(feed.pk, [entry.pk])
+        assert list(Entry.user_state.deleted(user)) == [entry]
+
+    def test_only_given_entries(self, watched_feed, entry_factory, feed_rule_factory):
+        """Should leave entries other than the new ones for the backfill."""
+        (feed, user) = watched_feed
+        feed_rule_factory(user=user, feed=feed, action=EntryState.STATE_DELETED)
+        existing = entry_factory(feed=feed)
+        new = entry_factory(feed=feed)
+        apply_rules_to_new_entries(feed.pk, [new.pk])
+        assert existing in Entry.user_state.unread(user)
+        assert new not in Entry.user_state.unread(user)
+
+    def test_ignores_users_not_watching(self, user, entry_factory, feed_rule_factory):
+        """Should not apply rules for users who don't watch the feed."""
+        entry = entry_factory()
+        feed_rule_factory(user=user, feed=entry.feed, action=EntryState.STATE_DELETED)
+        apply_rules_to_new_entries(entry.feed_id, [entry.pk])
+        assert not EntryState.objects.filter(user=user).exists()
+
+    def test_skips_watchers_without_rules(
+        self, watched_feed, entry_factory, django_assert_num_queries
+    ):
+        """Should only load rules for watchers who have active rules."""
+        (feed, user) = watched_feed
+        entry = entry_factory(feed=feed)
+        with django_assert_num_queries(1):
+            apply_rules_to_new_entries(feed.pk, [entry.pk])
+
+
+@pytest.mark.django_db(transaction=True)
+class TestQueueRuleApplication:
+    def test_applies_after_commit(self, settings, mocker, feed):
+        """Should only apply rules once the entries are committed."""
+        settings.RQ_ENABLED = False
+        mocked = mocker.patch("feedzero.rules.jobs.apply_rules_to_new_entries")
+        with transaction.atomic():
+            queue_rule_application(feed, [1, 2])
+            assert not mocked.called
+        mocked.assert_called_with(feed.pk, [1, 2])
@@ -1,10 +1,12 @@
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.utils import timezone
 import maya
 import pytest
 
 
 from feedzero.feeds.models import EntryState
-from feedzero.rules.models import Rule
+from feedzero.rules.models import FeedRule, Rule, TextMatchRule
 
 
 @pytest.mark.django_db
@@ -97,3 +99,57 @@ class TestTextMatchRule:
         """Should return a TextMatchRule object when called on underlying Rule class."""
         assert text_match_rule.specific == text_match_rule
         assert text_match_rule.rule_ptr.specific == text_match_rule
+
+
+@pytest.mark.django_db
+def test_date_start_defaults_to_creation_time(rule_factory):
+    """Should default the start of each rule to when it was created."""
+    before = timezone.now()
+    rule = rule_factory()
+    assert before <= rule.date_start <= timezone.now()
+
+
+@pytest.mark.django_db
+class TestRuleManagerForUser:
+    def test_returns_concrete_rules(
+        self, user, rule_factory, feed_rule_factory, text_match_rule_factory
+    ):
+        """Should return the user's rules as their subclasses, in creation order."""
+        feed_rule = feed_rule_factory(user=user)
+        text_rule = text_match_rule_factory(user=user)
+        rule_factory(user=user)
+        feed_rule_factory()
+
+        rules = Rule.objects.for_user(user)
+
+        assert rules == [feed_rule, text_rule]
+        assert isinstance(rules[0], FeedRule)
+        assert isinstance(rules[1], TextMatchRule)
+
+    def test_queries_once_per_rule_type(
+        self,
+        user,
+        feed_rule_factory,
+        text_match_rule_factory,
+        django_assert_num_queries,
+    ):
+        """Should resolve any number of rules with a query per subclass."""
+        for _ in range(3):
+            feed_rule_factory(user=user)
+            text_match_rule_factory(user=user)
+
+        with django_assert_num_queries(2):
+            rules = Rule.objects.for_user(user)
+            for rule in rules:
+                assert rule.specific is rule
+
+    def test_applies_filters(self, user, feed_rule_factory, text_match_rule_factory):
+        """Should only return the rules of each type matching the filters."""
+        feed_rule = feed_rule_factory(user=user)
+        text_match_rule_factory(user=user, date_end=timezone.now())
+        rules = Rule.objects.for_user(user, Q(date_end__isnull=True))
+        assert rules == [feed_rule]
+
+    def test_finds_subclasses(self):
+        """Should find every concrete rule type."""
+        assert set(Rule.objects.get_subclasses()) == {FeedRule, TextMatchRule}
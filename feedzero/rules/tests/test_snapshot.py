@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.utils import timezone
+import pytest
+from redis.exceptions import ConnectionError
+
+from feedzero.feeds.models import EntryState
+from feedzero.rules.snapshot import get_active_rules, get_cache_key
+
+
+DELETED = EntryState.STATE_DELETED
+
+
+@pytest.mark.django_db
+class TestGetActiveRules:
+    def test_resolves_rule_types(
+        self, user, feed_rule_factory, text_match_rule_factory
+    ):
+        """Should include feed and text rules with their specific fields."""
+        feed_rule = feed_rule_factory(user=user, action=DELETED)
+        text_match_rule_factory(user=user, action=DELETED, text="ads")
+        rules = get_active_rules(user.pk)
+        assert {(rule.feed_id, rule.text) for rule in rules} == {
+            (feed_rule.feed_id, None),
+            (None, "ads"),
+        }
+
+    def test_caches_snapshot(self, user, feed_rule_factory, django_assert_num_queries):
+        """Should not query again while the snapshot is cached."""
+        feed_rule_factory(user=user, action=DELETED)
+        with django_assert_num_queries(2):
+            get_active_rules(user.pk)
+        with django_assert_num_queries(0):
+            assert len(get_active_rules(user.pk)) == 1
+
+    def test_shares_snapshot_through_redis(self, fake_redis, user, feed_rule_factory):
+        """Should keep the snapshot in Redis, where every worker process can use it."""
+        feed_rule_factory(user=user, action=DELETED)
+        get_active_rules(user.pk)
+        assert fake_redis.ttl(get_cache_key(user.pk)) > 0
+
+    def test_builds_snapshot_without_redis(self, mocker, user, feed_rule_factory):
+        """Should still load the rules if Redis can't be reached."""
+        connection = mocker.patch("feedzero.rules.snapshot.get_redis").return_value
+        connection.get.side_effect = ConnectionError()
+        connection.set.side_effect = ConnectionError()
+        feed_rule_factory(user=user, action=DELETED)
+        assert len(get_active_rules(user.pk)) == 1
+
+    @pytest.mark.parametrize(
+        "factory", ["feed_rule_factory", "text_match_rule_factory"]
+    )
+    def test_saving_rule_invalidates(self, request, factory, user):
+        """Should rebuild the snapshot once a rule of any type is created."""
+        make_rule = request.getfixturevalue(factory)
+        get_active_rules(user.pk)
+        make_rule(user=user, action=DELETED)
+        assert len(get_active_rules(user.pk)) == 1
+
+    def test_updating_rule_invalidates(self, user, text_match_rule_factory):
+        """Should reflect changes to existing rules."""
+        rule = text_match_rule_factory(user=user, action=DELETED, text="ads")
+        get_active_rules(user.pk)
+        rule.text = "sponsored"
+        rule.save()
+        assert [rule.text for rule in get_active_rules(user.pk)] == ["sponsored"]
+
+    def test_deleting_rule_invalidates(self, user, feed_rule_factory):
+        """Should drop rules once they're deleted."""
+        rule = feed_rule_factory(user=user, action=DELETED)
+        get_active_rules(user.pk)
+        rule.delete()
+        assert get_active_rules(user.pk) == []
+
+    def test_deleting_feed_invalidates(self, user, feed_rule_factory):
+        """Should drop feed rules deleted along with their feed."""
+        rule = feed_rule_factory(user=user, action=DELETED)
+        get_active_rules(user.pk)
+        rule.feed.delete()
+        assert get_active_rules(user.pk) == []
+
+    def test_rules_activate_over_time(self, user, feed_rule_factory):
+        """Should start applying cached rules once their start date passes."""
+        now = timezone.now()
+        feed_rule_factory(
+            user=user, action=DELETED, date_start=now + timedelta(hours=1)
+        )
+        assert get_active_rules(user.pk, now=now) == []
+        later = now + timedelta(hours=2)
+        assert len(get_active_rules(user.pk, now=later)) == 1
+
+    def test_rules_expire_over_time(self, user, feed_rule_factory):
+        """Should stop applying cached rules once their end date passes."""
+        now = timezone.now()
+        feed_rule_factory(
+            user=user,
+            action=DELETED,
+            date_start=now - timedelta(hours=1),
+            date_end=now + timedelta(hours=1),
+        )
+        assert len(get_active_rules(user.pk, now=now)) == 1
+        later = now + timedelta(hours=2)
+        assert get_active_rules(user.pk, now=later) == []
+
+    def test_ignores_other_users(self, user, feed_rule_factory):
+        """Should only include the user's own rules."""
+        feed_rule_factory(action=DELETED)
+        assert get_active_rules(user.pk) == []
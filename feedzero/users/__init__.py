@@ -0,0 +1 @@
+default_app_config = "feedzero.users.apps.UsersConfig"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     name = "feedzero.users"
     label = "users"
+
+    def ready(self):
+        import feedzero.users.receivers  # noqa
@@ -0,0 +1,43 @@
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from feedzero.feeds.models import Entry, UnreadCount
+from feedzero.users.models import FeedZeroUser
+
+
+@receiver(
+    m2m_changed,
+    sender=FeedZeroUser.watching.through,
+    dispatch_uid="track_unread_counts",
+)
+def track_unread_counts(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Keep an unread count row for every feed a user watches.
+
+    Handles changes from either side of the relation, i.e. `user.watching.add(feed)`
+    as well as `feed.watched_by.add(user)`.
+    """
+    if action == "post_add":
+        if reverse:
+            for user in model.objects.filter(pk__in=pk_set):
+                UnreadCount.objects.track(user, [instance.pk])
+        else:
+            UnreadCount.objects.track(instance, list(pk_set))
+    elif action == "post_remove":
+        if reverse:
+            UnreadCount.objects.filter(feed=instance, user_id__in=pk_set).delete()
+        else:
+            UnreadCount.objects.filter(user=instance, feed_id__in=pk_set).delete()
+    elif action == "post_clear":
+        if reverse:
+            UnreadCount.objects.filter(feed=instance).delete()
+        else:
+            UnreadCount.objects.filter(user=instance).delete()
+
+
+@receiver(pre_delete, sender=Entry, dispatch_uid="uncount_deleted_entry")
+def uncount_deleted_entry(sender, instance, **kwargs):
+    """Take a deleted entry out of the unread counts of the users yet to read it.
+
+    Runs before the delete cascades to the entry's states, which say who has.
+    """
+    UnreadCount.objects.remove_entry(instance)
@@ -100,8 +100,8 @@ export const store = new Vuex.Store({
         async doneWithEntry({ dispatch }, entry) {
             await dispatch(ACTIONS.MARK_AS_DONE, [entry]);
         },
-        async fetchEntries({ commit, state }, page = 1) {
-            const response = await axios.get(`/api/v1/entries/?page=${page}`);
+        async fetchEntries({ commit, state }, next = "/api/v1/entries/") {
+            const response = await axios.get(next);
             if (response.status !== 200) {
                 throw "Non 200 response status received from API";
             }